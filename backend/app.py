@@ -1,11 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from config import Config
 from services.youtube_service import YouTubeService
 from services.openai_service import OpenAIService
 from services.pdf_service import PDFService
 from services.flashcard_service import FlashcardService
+from services.ingestion_service import SourceIngestionService
+from services.job_service import JobService
+from services.circuit_breaker import breaker_states
+from services.database_service import DatabaseService
+from services.search_service import get_search_index, DOC_TYPES
+from services.graph_service import GraphService, DIRECTIONS
+from services.knowledge_extraction_service import KnowledgeExtractionService
 import json
+import time
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -16,6 +24,12 @@ youtube_service = YouTubeService()
 openai_service = OpenAIService()
 pdf_service = PDFService()
 flashcard_service = FlashcardService()
+ingestion_service = SourceIngestionService(youtube_service, pdf_service)
+job_service = JobService()
+search_index = get_search_index()
+db_service = DatabaseService(Config.DATABASE_URL, search_index=search_index)
+graph_service = GraphService(db_service)
+knowledge_extraction_service = KnowledgeExtractionService(openai_service, graph_service)
 
 @app.route('/')
 def home():
@@ -24,42 +38,68 @@ def home():
         "endpoints": [
             "/api/youtube-to-notes",
             "/api/pdf-to-notes",
+            "/api/pdf-info",
             "/api/text-to-notes",
             "/api/unified-notes",
             "/api/generate-flashcards",
-            "/api/generate-quiz"
+            "/api/generate-quiz",
+            "/api/jobs",
+            "/api/notes",
+            "/api/search",
+            "/api/flashcards/duplicates",
+            "/api/reviews",
+            "/api/reviews/due",
+            "/api/graph/nodes",
+            "/api/graph/edges",
+            "/api/graph/path",
+            "/api/graph/extract",
+            "/api/text-to-notes/stream",
+            "/api/youtube-to-notes/stream",
+            "/api/unified-notes/stream"
         ]
     })
 
+def run_youtube_notes(data, progress=lambda stage, percent=None: None):
+    """YouTube → transcript → notes pipeline (shared by sync requests and jobs)"""
+    youtube_url = data.get('youtube_url')
+    detail_level = data.get('detail_level', 'medium')
+    language = data.get('language', 'zh-tw')
+    
+    # Get transcript
+    progress('transcript', 10)
+    video_info = youtube_service.get_transcript(youtube_url)
+    
+    # Generate notes with YouTube-specific content type
+    progress('generating_notes', 50)
+    notes = openai_service.generate_notes(
+        video_info['transcript'], 
+        detail_level,
+        language,
+        'youtube',
+        data.get('merge_chunks'),
+        use_cache=not data.get('bypass_cache')
+    )
+    
+    return {
+        "success": True,
+        "video_id": video_info['video_id'],
+        "notes": notes,
+        "transcript": video_info['transcript']
+    }
+
 @app.route('/api/youtube-to-notes', methods=['POST'])
 def youtube_to_notes():
     """Convert YouTube video to notes"""
     try:
         data = request.json
-        youtube_url = data.get('youtube_url')
-        detail_level = data.get('detail_level', 'medium')
-        language = data.get('language', 'zh-tw')
         
-        if not youtube_url:
+        if not data.get('youtube_url'):
             return jsonify({"error": "YouTube URL is required"}), 400
         
-        # Get transcript
-        video_info = youtube_service.get_transcript(youtube_url)
-        
-        # Generate notes with YouTube-specific content type
-        notes = openai_service.generate_notes(
-            video_info['transcript'], 
-            detail_level,
-            language,
-            'youtube'
-        )
+        if data.get('async'):
+            return submit_job('youtube-to-notes', data)
         
-        return jsonify({
-            "success": True,
-            "video_id": video_info['video_id'],
-            "notes": notes,
-            "transcript": video_info['transcript']
-        })
+        return jsonify(run_youtube_notes(data))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -86,11 +126,15 @@ def pdf_to_notes():
         if file_size > Config.MAX_FILE_SIZE:
             return jsonify({"error": "File too large (max 10MB)"}), 400
         
-        # Extract text from PDF
-        text = pdf_service.extract_text(file)
+        # Extract text from PDF (optionally only a page range / outline sections)
+        text = pdf_service.extract_text(file, request.form.get('pages'), request.form.get('sections'))
         
         # Generate notes with PDF-specific content type
-        notes = openai_service.generate_notes(text, detail_level, language, 'pdf')
+        merge_chunks = request.form.get('merge_chunks')
+        notes = openai_service.generate_notes(
+            text, detail_level, language, 'pdf', merge_chunks.lower() == 'true' if merge_chunks else None,
+            use_cache=request.form.get('bypass_cache', '').lower() != 'true'
+        )
         
         return jsonify({
             "success": True,
@@ -98,9 +142,43 @@ def pdf_to_notes():
             "original_text": text[:500] + "..."  # Send first 500 chars
         })
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/pdf-info', methods=['POST'])
+def pdf_info():
+    """Page count and outline, so pages can be selected before generating notes
+    
+    Per-page text lengths come from the page cache; pass page_chars to
+    extract the pages the cache does not hold.
+    """
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            file.seek(0, 2)
+            file_size = file.tell()
+            file.seek(0)
+            if file_size > Config.MAX_FILE_SIZE:
+                return jsonify({"error": "File too large (max 10MB)"}), 400
+            page_chars = request.form.get('page_chars', '').lower() == 'true'
+            spooled = pdf_service.spooled(file)
+        else:
+            data = request.json or {}
+            if not data.get('data'):
+                return jsonify({"error": "No file provided"}), 400
+            if pdf_service.base64_size(data['data']) > Config.MAX_FILE_SIZE:
+                return jsonify({"error": "File too large (max 10MB)"}), 400
+            page_chars = bool(data.get('page_chars'))
+            spooled = pdf_service.spooled_base64(data['data'])
+        
+        with spooled as path:
+            return jsonify({"success": True, **pdf_service.document_info(path, page_chars=page_chars)})
+        
+    except Exception as e:
+        return jsonify({"error": f"Failed to read PDF: {str(e)}"}), 500
+
 @app.route('/api/text-to-notes', methods=['POST'])
 def text_to_notes():
     """Convert plain text to notes"""
@@ -114,7 +192,10 @@ def text_to_notes():
             return jsonify({"error": "Text is required"}), 400
         
         # Generate notes with general content type (default)
-        notes = openai_service.generate_notes(text, detail_level, language, 'general')
+        notes = openai_service.generate_notes(
+            text, detail_level, language, 'general', data.get('merge_chunks'),
+            use_cache=not data.get('bypass_cache')
+        )
         
         return jsonify({
             "success": True,
@@ -135,7 +216,7 @@ def generate_quiz():
         if not notes:
             return jsonify({"error": "Notes are required"}), 400
         
-        quiz_json = openai_service.generate_quiz(notes, language)
+        quiz_json = openai_service.generate_quiz(notes, language, use_cache=not data.get('bypass_cache'))
         
         # Try to parse JSON, with fallback for malformed responses
         try:
@@ -181,7 +262,7 @@ def generate_flashcards_enhanced():
 
         # Generate flashcards using OpenAI
         flashcards = openai_service.generate_flashcards(
-            note_content, count, difficulty, types, language
+            note_content, count, difficulty, types, language, use_cache=not data.get('bypass_cache')
         )
 
         return jsonify({
@@ -193,132 +274,284 @@ def generate_flashcards_enhanced():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def unified_request_data():
+    """Unified-notes request body: JSON, or multipart with a `data` JSON field plus uploaded `files`"""
+    if not request.files:
+        return request.json or {}
+    
+    data = json.loads(request.form.get('data') or '{}')
+    file_infos = data.setdefault('sources', {}).setdefault('files', [])
+    try:
+        for file in request.files.getlist('files'):
+            if file.filename:
+                # Streamed to disk; ingestion reads the file by upload_id instead of a base64 copy in memory
+                file_infos.append(pdf_service.save_upload(file))
+    except ValueError:
+        pdf_service.discard_uploads(file_infos)
+        raise
+    return data
+
+def ingest_unified_sources(data):
+    """Fetch all unified-notes sources and build the generation context"""
+    # Fetch all sources concurrently; order of the request is preserved.
+    # Uploads are deleted only once every source has stopped reading them,
+    # including sources that timed out and are still running.
+    files = data.get('sources', {}).get('files')
+    ingestion = ingestion_service.ingest(
+        data.get('sources', {}), on_finished=lambda: pdf_service.discard_uploads(files)
+    )
+    
+    if not ingestion['contents']:
+        raise ValueError("No valid content found from sources")
+    
+    # Combine all content
+    combined_content = '\n\n'.join(ingestion['contents'])
+    
+    # Generate unified notes with enhanced context
+    context_info = {
+        'title': data.get('title', '未命名筆記'),
+        'exam_system': data.get('examSystem', ''),
+        'subject': data.get('subject', ''),
+        'topic': data.get('topic', ''),
+        'custom_topic': data.get('customTopic', ''),
+        'source_count': len(ingestion['sources']),
+        'sources': ingestion['sources']
+    }
+    
+    return ingestion, combined_content, context_info
+
+def unified_notes_metadata(context_info, ingestion, notes):
+    """Response fields describing a unified-notes result"""
+    return {
+        "title": context_info['title'],
+        "exam_system": context_info['exam_system'],
+        "subject": context_info['subject'],
+        "topic": context_info['topic'],
+        "custom_topic": context_info['custom_topic'],
+        "sources": context_info['sources'],
+        "word_count": len(notes.split()),
+        "processing_time": "calculated_on_frontend",
+        "source_timings": ingestion['timings'],
+        "ingestion_time_ms": ingestion['total_ms']
+    }
+
+def run_unified_notes(data, progress=lambda stage, percent=None: None):
+    """Multi-source → unified notes pipeline (shared by sync requests and jobs)"""
+    progress('ingesting_sources', 10)
+    ingestion, combined_content, context_info = ingest_unified_sources(data)
+    
+    progress('generating_notes', 50)
+    notes = openai_service.generate_unified_notes(
+        combined_content,
+        data.get('detailLevel', 'medium'),
+        data.get('language', 'zh-tw'),
+        context_info,
+        data.get('mergeChunks'),
+        use_cache=not data.get('bypassCache')
+    )
+    
+    return {
+        "success": True,
+        "notes": notes,
+        **unified_notes_metadata(context_info, ingestion, notes),
+        "knowledge_job_id": queue_knowledge_extraction(data, notes)
+    }
+
+def queue_knowledge_extraction(data, notes):
+    """Queue knowledge-graph extraction of freshly generated notes; returns the job ID, or None when disabled.
+    
+    The server setting wins over the request, and a failed submit is logged
+    rather than raised, so it never costs the caller the notes.
+    """
+    if not (Config.GRAPH_EXTRACTION_ENABLED and data.get('extractKnowledge', True)):
+        return None
+    try:
+        return job_service.submit('knowledge-graph-from-notes', {
+            'notes': [notes],
+            'user_id': data.get('user_id'),
+            'language': data.get('language', 'zh-tw'),
+            'bypassCache': data.get('bypassCache')
+        })
+    except Exception as e:
+        print(f"Failed to queue knowledge extraction: {str(e)}")
+        return None
+
 @app.route('/api/generate-notes', methods=['POST'])
 @app.route('/api/unified-notes', methods=['POST'])
 def unified_notes():
     """Generate notes from multiple sources (YouTube, PDF, text, webpages)"""
     try:
-        data = request.json
-        sources = data.get('sources', {})
-        title = data.get('title', '未命名筆記')
-        exam_system = data.get('examSystem', '')
-        subject = data.get('subject', '')
-        topic = data.get('topic', '')
-        custom_topic = data.get('customTopic', '')
-        detail_level = data.get('detailLevel', 'medium')
-        language = data.get('language', 'zh-tw')
+        data = unified_request_data()
         
-        all_content = []
-        source_info = []
-        
-        # Process YouTube sources
-        youtube_urls = sources.get('youtube', [])
-        for url in youtube_urls:
-            if url.strip():
-                try:
-                    video_info = youtube_service.get_transcript(url)
-                    all_content.append(video_info['transcript'])
-                    source_info.append({
-                        'type': 'youtube',
-                        'title': video_info.get('title', url),
-                        'url': url
-                    })
-                except Exception as e:
-                    print(f"YouTube processing error for {url}: {e}")
-                    continue
-        
-        # Process file sources
-        files = sources.get('files', [])
-        for file_info in files:
-            try:
-                file_content = pdf_service.extract_text_from_file(file_info)
-                all_content.append(file_content)
-                source_info.append({
-                    'type': 'file',
-                    'name': file_info.get('name', 'unknown'),
-                    'size': file_info.get('size', 0)
-                })
-            except Exception as e:
-                print(f"File processing error: {e}")
-                continue
-        
-        # Process text sources
-        text_contents = sources.get('text', [])
-        for text in text_contents:
-            if text.strip():
-                all_content.append(text)
-                source_info.append({
-                    'type': 'text',
-                    'preview': text[:100] + '...' if len(text) > 100 else text
-                })
-        
-        # Process webpage sources
-        webpage_urls = sources.get('webpages', [])
-        for url in webpage_urls:
-            if url.strip():
-                try:
-                    # Simple webpage content extraction (basic implementation)
-                    import requests
-                    from bs4 import BeautifulSoup
-                    
-                    response = requests.get(url, timeout=10)
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Extract text from paragraphs
-                    paragraphs = soup.find_all('p')
-                    webpage_text = ' '.join([p.get_text() for p in paragraphs])
-                    
-                    if webpage_text:
-                        all_content.append(webpage_text)
-                        source_info.append({
-                            'type': 'webpage',
-                            'url': url,
-                            'title': soup.title.string if soup.title else url
-                        })
-                except Exception as e:
-                    print(f"Webpage processing error for {url}: {e}")
-                    continue
-        
-        if not all_content:
-            return jsonify({"error": "No valid content found from sources"}), 400
-        
-        # Combine all content
-        combined_content = '\n\n'.join(all_content)
-        
-        # Generate unified notes with enhanced context
-        context_info = {
-            'title': title,
-            'exam_system': exam_system,
-            'subject': subject,
-            'topic': topic,
-            'custom_topic': custom_topic,
-            'source_count': len(source_info),
-            'sources': source_info
-        }
-        
-        notes = openai_service.generate_unified_notes(
-            combined_content,
-            detail_level,
-            language,
-            context_info
-        )
+        if data.get('async'):
+            return submit_job('unified-notes', data)
         
-        return jsonify({
-            "success": True,
-            "notes": notes,
-            "title": title,
-            "exam_system": exam_system,
-            "subject": subject,
-            "topic": topic,
-            "custom_topic": custom_topic,
-            "sources": source_info,
-            "word_count": len(notes.split()),
-            "processing_time": "calculated_on_frontend"
-        })
+        return jsonify(run_unified_notes(data))
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# =====================================================
+# STREAMING (Server-Sent Events)
+# =====================================================
+
+def sse_response(events):
+    """Relay (event, data) pairs as a text/event-stream response"""
+    def stream():
+        try:
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000)
+
+@app.route('/api/text-to-notes/stream', methods=['POST'])
+def text_to_notes_stream():
+    """Stream notes for plain text as they are generated"""
+    data = request.json or {}
+    text = data.get('text')
+    
+    if not text:
+        return jsonify({"error": "Text is required"}), 400
+    
+    def events():
+        start = time.perf_counter()
+        notes = yield from openai_service.generate_notes_stream(
+            text,
+            data.get('detail_level', 'medium'),
+            data.get('language', 'zh-tw'),
+            'general',
+            data.get('merge_chunks'),
+            use_cache=not data.get('bypass_cache')
+        )
+        yield 'done', {
+            "success": True,
+            "word_count": len(notes.split()),
+            "timings": {"generation_ms": elapsed_ms(start), "total_ms": elapsed_ms(start)}
+        }
+    
+    return sse_response(events())
+
+@app.route('/api/youtube-to-notes/stream', methods=['POST'])
+def youtube_to_notes_stream():
+    """Stream notes for a YouTube video as they are generated"""
+    data = request.json or {}
+    youtube_url = data.get('youtube_url')
+    
+    if not youtube_url:
+        return jsonify({"error": "YouTube URL is required"}), 400
+    
+    def events():
+        start = time.perf_counter()
+        yield 'progress', {'stage': 'transcript'}
+        video_info = youtube_service.get_transcript(youtube_url)
+        transcript_ms = elapsed_ms(start)
+        yield 'source', {'video_id': video_info['video_id'], 'method': video_info.get('method')}
+        
+        generation_start = time.perf_counter()
+        notes = yield from openai_service.generate_notes_stream(
+            video_info['transcript'],
+            data.get('detail_level', 'medium'),
+            data.get('language', 'zh-tw'),
+            'youtube',
+            data.get('merge_chunks'),
+            use_cache=not data.get('bypass_cache')
+        )
+        yield 'done', {
+            "success": True,
+            "video_id": video_info['video_id'],
+            "transcript": video_info['transcript'],
+            "word_count": len(notes.split()),
+            "timings": {
+                "transcript_ms": transcript_ms,
+                "generation_ms": elapsed_ms(generation_start),
+                "total_ms": elapsed_ms(start)
+            }
+        }
+    
+    return sse_response(events())
+
+@app.route('/api/unified-notes/stream', methods=['POST'])
+def unified_notes_stream():
+    """Stream unified notes from multiple sources as they are generated"""
+    try:
+        data = unified_request_data()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def events():
+        start = time.perf_counter()
+        yield 'progress', {'stage': 'ingesting_sources'}
+        ingestion, combined_content, context_info = ingest_unified_sources(data)
+        yield 'sources', {'sources': context_info['sources'], 'source_timings': ingestion['timings']}
+        
+        generation_start = time.perf_counter()
+        notes = yield from openai_service.generate_unified_notes_stream(
+            combined_content,
+            data.get('detailLevel', 'medium'),
+            data.get('language', 'zh-tw'),
+            context_info,
+            data.get('mergeChunks'),
+            use_cache=not data.get('bypassCache')
+        )
+        yield 'done', {
+            "success": True,
+            **unified_notes_metadata(context_info, ingestion, notes),
+            "knowledge_job_id": queue_knowledge_extraction(data, notes),
+            "timings": {
+                "ingestion_ms": ingestion['total_ms'],
+                "generation_ms": elapsed_ms(generation_start),
+                "total_ms": elapsed_ms(start)
+            }
+        }
+    
+    return sse_response(events())
+
+def run_flashcards_from_notes(data, progress=lambda stage, percent=None: None):
+    """筆記 → 閃卡生成流程（同步請求與背景任務共用）"""
+    progress('generating_flashcards', 10)
+    flashcards = flashcard_service.generate_flashcards_from_note(
+        content=data.get('content', ''),
+        title=data.get('title', ''),
+        card_count=data.get('cardCount', 10),
+        difficulty=data.get('difficulty', 'mixed'),
+        use_cache=not data.get('bypassCache')
+    )
+    
+    duplicates = []
+    if data.get('save'):
+        # 已有相近卡片的不再存入，只回報對應的既有卡片
+        progress('saving_flashcards', 90)
+        saved = db_service.save_flashcards_deduplicated(
+            data.get('noteId'),
+            [{'front': card['question'], 'back': card['answer']} for card in flashcards],
+            ai_generated=True,
+            user_id=data.get('user_id')
+        )
+        duplicates = [{'flashcard': flashcards[duplicate['index']], 'card_id': duplicate['card_id'],
+                       'similarity': duplicate['similarity']} for duplicate in saved['duplicates']]
+        skipped = {duplicate['index'] for duplicate in saved['duplicates']}
+        flashcards = [card for i, card in enumerate(flashcards) if i not in skipped]
+        for card, card_id in zip(flashcards, saved['card_ids']):
+            card['id'] = card_id
+    
+    return {
+        'success': True,
+        'flashcards': flashcards,
+        'total': len(flashcards),
+        'duplicates': duplicates
+    }
+
 @app.route('/api/generate-flashcards-from-notes', methods=['POST'])
 def generate_flashcards_from_notes():
     """從筆記內容生成閃卡"""
@@ -328,27 +561,14 @@ def generate_flashcards_from_notes():
         if not data:
             return jsonify({'error': '沒有提供數據'}), 400
         
-        content = data.get('content', '')
-        title = data.get('title', '')
-        card_count = data.get('cardCount', 10)
-        difficulty = data.get('difficulty', 'mixed')
-        
-        if not content:
+        if not data.get('content', ''):
             return jsonify({'error': '筆記內容不能為空'}), 400
         
-        # 生成閃卡
-        flashcards = flashcard_service.generate_flashcards_from_note(
-            content=content,
-            title=title,
-            card_count=card_count,
-            difficulty=difficulty
-        )
+        if data.get('async'):
+            return submit_job('flashcards-from-notes', data)
         
-        return jsonify({
-            'success': True,
-            'flashcards': flashcards,
-            'total': len(flashcards)
-        })
+        # 生成閃卡
+        return jsonify(run_flashcards_from_notes(data))
         
     except Exception as e:
         print(f"生成閃卡時發生錯誤: {str(e)}")
@@ -356,6 +576,306 @@ def generate_flashcards_from_notes():
             'error': f'生成閃卡失敗: {str(e)}'
         }), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """LLM response cache hit/miss counters and size"""
+    if not openai_service.cache:
+        return jsonify({"enabled": False})
+    
+    return jsonify({"enabled": True, **openai_service.cache.stats()})
+
+@app.route('/api/youtube/health', methods=['GET'])
+def youtube_health():
+    """Circuit breaker state for each YouTube upstream"""
+    return jsonify({"circuits": breaker_states()})
+
+# =====================================================
+# SAVED NOTES
+# =====================================================
+
+@app.route('/api/notes', methods=['GET'])
+def list_notes():
+    """Newest-first saved notes; pass next_cursor back as ?cursor= for the next page"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    try:
+        return jsonify(db_service.get_notes_page(limit=limit, cursor=request.args.get('cursor')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Ranked full-text search over notes, flashcards and cached transcripts"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    
+    types = [t for t in (request.args.get('types') or '').split(',') if t]
+    unknown = [t for t in types if t not in DOC_TYPES]
+    if unknown:
+        return jsonify({"error": f"Unknown types: {', '.join(unknown)}"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    start = time.perf_counter()
+    search_index.sync_transcripts()
+    results = search_index.search(query, types=types or None, limit=limit)
+    return jsonify({"query": query, "results": results, "took_ms": elapsed_ms(start)})
+
+@app.route('/api/flashcards/duplicates', methods=['POST'])
+def find_duplicate_flashcards():
+    """For each {front, back} card, the user's saved card it nearly duplicates (or null)"""
+    data = request.json or {}
+    cards = data.get('cards')
+    if not cards or not all(isinstance(card, dict) and card.get('front') and card.get('back') for card in cards):
+        return jsonify({"error": "cards must be a non-empty list of {front, back} objects"}), 400
+    try:
+        threshold = float(data['threshold']) if data.get('threshold') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "threshold must be a number"}), 400
+    
+    start = time.perf_counter()
+    matches = db_service.find_duplicate_flashcards(cards, user_id=data.get('user_id'), threshold=threshold)
+    return jsonify({"matches": matches, "took_ms": elapsed_ms(start)})
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Re-index all notes, flashcards and cached transcripts"""
+    counts = db_service.rebuild_search_index()
+    counts['transcript'] = search_index.sync_transcripts(full=True)
+    print(f"Indexed {counts}")
+
+@app.cli.command('rebuild-flashcard-signatures')
+def rebuild_flashcard_signatures():
+    """Recompute every flashcard's near-duplicate signature and LSH buckets"""
+    start = time.perf_counter()
+    result = db_service.rebuild_flashcard_signatures()
+    print(f"Signed {result['cards']} card(s) in {elapsed_ms(start)}ms")
+
+# =====================================================
+# SPACED REPETITION
+# =====================================================
+
+def optional_int_arg(name):
+    value = request.args.get(name)
+    return int(value) if value not in (None, '') else None
+
+@app.route('/api/reviews/due', methods=['GET'])
+def due_queue():
+    """Cards due for review now (most overdue first) plus new cards"""
+    try:
+        user_id = optional_int_arg('user_id')
+        limit = max(1, min(optional_int_arg('limit') or 50, 500))
+        new_limit = optional_int_arg('new_limit')
+    except ValueError:
+        return jsonify({"error": "user_id, limit and new_limit must be integers"}), 400
+    
+    return jsonify(db_service.get_due_queue(user_id=user_id, limit=limit, new_limit=new_limit))
+
+@app.route('/api/reviews', methods=['POST'])
+def record_review():
+    """Record a review rating (1 again, 2 hard, 3 good, 4 easy) and return the next schedule"""
+    data = request.json or {}
+    if 'card_id' not in data or 'rating' not in data:
+        return jsonify({"error": "card_id and rating are required"}), 400
+    
+    try:
+        schedule = db_service.record_review(
+            int(data['card_id']),
+            int(data['rating']),
+            user_id=data.get('user_id'),
+            review_time_ms=int(data.get('review_time_ms', 0)),
+            reviewed_at=data.get('reviewed_at')
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if schedule is None:
+        return jsonify({"error": "Card not found"}), 404
+    return jsonify(schedule), 201
+
+@app.cli.command('rebuild-card-state')
+def rebuild_card_state():
+    """Recompute every card's scheduling state from the review log"""
+    start = time.perf_counter()
+    result = db_service.rebuild_card_state()
+    print(f"Rebuilt state for {result['cards']} card(s) in {elapsed_ms(start)}ms")
+
+# =====================================================
+# KNOWLEDGE GRAPH
+# =====================================================
+
+@app.route('/api/graph/nodes', methods=['POST'])
+def add_graph_nodes():
+    """Create concept nodes from a list of labels"""
+    data = request.json or {}
+    labels = data.get('labels')
+    if not labels or not all(isinstance(label, str) and label.strip() for label in labels):
+        return jsonify({"error": "labels must be a non-empty list of strings"}), 400
+    
+    node_ids = graph_service.add_nodes([label.strip() for label in labels], user_id=data.get('user_id'))
+    return jsonify({"node_ids": node_ids}), 201
+
+@app.route('/api/graph/edges', methods=['POST'])
+def add_graph_edges():
+    """Create edges ({source_node_id, target_node_id, relation}) between existing nodes"""
+    data = request.json or {}
+    edges = data.get('edges')
+    if not edges or not all(isinstance(edge, dict) for edge in edges):
+        return jsonify({"error": "edges must be a non-empty list of objects"}), 400
+    
+    try:
+        edge_ids = graph_service.add_edges(edges, user_id=data.get('user_id'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"edge_ids": edge_ids}), 201
+
+@app.route('/api/graph/nodes/<int:node_id>/prerequisites', methods=['GET'])
+def graph_prerequisites(node_id):
+    """What to study before a node: its transitive prerequisites in study order"""
+    try:
+        user_id = optional_int_arg('user_id')
+    except ValueError:
+        return jsonify({"error": "user_id must be an integer"}), 400
+    
+    start = time.perf_counter()
+    try:
+        result = graph_service.prerequisites(node_id, user_id=user_id)
+    except KeyError:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify({"node_id": node_id, **result, "took_ms": elapsed_ms(start)})
+
+@app.route('/api/graph/nodes/<int:node_id>/neighborhood', methods=['GET'])
+def graph_neighborhood(node_id):
+    """Nodes within ?hops= edges of a node (?direction=out|in|both), nearest first"""
+    try:
+        user_id = optional_int_arg('user_id')
+        hops = max(1, min(optional_int_arg('hops') or 1, 6))
+        limit = max(1, min(optional_int_arg('limit') or 200, 5000))
+    except ValueError:
+        return jsonify({"error": "user_id, hops and limit must be integers"}), 400
+    direction = request.args.get('direction', 'both')
+    if direction not in DIRECTIONS:
+        return jsonify({"error": f"direction must be one of {', '.join(DIRECTIONS)}"}), 400
+    
+    start = time.perf_counter()
+    try:
+        nodes = graph_service.neighborhood(node_id, hops=hops, direction=direction, limit=limit, user_id=user_id)
+    except KeyError:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify({"node_id": node_id, "hops": hops, "nodes": nodes, "took_ms": elapsed_ms(start)})
+
+@app.route('/api/graph/path', methods=['GET'])
+def graph_path():
+    """Shortest path (fewest edges) between ?from= and ?to= node IDs"""
+    try:
+        user_id = optional_int_arg('user_id')
+        source_id, target_id = optional_int_arg('from'), optional_int_arg('to')
+    except ValueError:
+        return jsonify({"error": "user_id, from and to must be integers"}), 400
+    if source_id is None or target_id is None:
+        return jsonify({"error": "from and to are required"}), 400
+    direction = request.args.get('direction', 'both')
+    if direction not in DIRECTIONS:
+        return jsonify({"error": f"direction must be one of {', '.join(DIRECTIONS)}"}), 400
+    
+    start = time.perf_counter()
+    try:
+        path = graph_service.shortest_path(source_id, target_id, direction=direction, user_id=user_id)
+    except KeyError as e:
+        return jsonify({"error": f"Node not found: {e.args[0]}"}), 404
+    return jsonify({"path": path, "took_ms": elapsed_ms(start)})
+
+def run_knowledge_extraction(data, progress=lambda stage, percent=None: None):
+    """Notes → knowledge graph nodes and edges (shared by sync requests and jobs)"""
+    notes = data.get('notes') or []
+    notes = [notes] if isinstance(notes, str) else list(notes)
+    for note_id in data.get('note_ids') or []:
+        note = db_service.get_note(int(note_id))
+        if note is None:
+            raise ValueError(f"Note not found: {note_id}")
+        notes.append(note['content'])
+    if not notes:
+        raise ValueError("notes or note_ids are required")
+    
+    return knowledge_extraction_service.extract(
+        notes,
+        user_id=data.get('user_id'),
+        language=data.get('language', 'zh-tw'),
+        use_cache=not data.get('bypassCache'),
+        progress=progress
+    )
+
+@app.route('/api/graph/extract', methods=['POST'])
+def extract_knowledge_graph():
+    """Extract concepts and relations from Markdown notes (or saved note_ids) into the graph"""
+    try:
+        data = request.json or {}
+        
+        if data.get('async'):
+            return submit_job('knowledge-graph-from-notes', data)
+        
+        return jsonify(run_knowledge_extraction(data))
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# =====================================================
+# BACKGROUND JOBS
+# =====================================================
+
+job_service.register('youtube-to-notes', run_youtube_notes)
+job_service.register('unified-notes', run_unified_notes)
+job_service.register('flashcards-from-notes', run_flashcards_from_notes)
+job_service.register('knowledge-graph-from-notes', run_knowledge_extraction)
+
+@app.before_request
+def start_job_workers():
+    # Started by the process that serves requests, not at import: the debug
+    # reloader's watcher process and CLI commands import this module too
+    job_service.start()
+
+def submit_job(job_type, payload):
+    """Queue a pipeline as a background job and return 202 with its ID"""
+    job_id = job_service.submit(job_type, payload)
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Submit a generation pipeline as a background job"""
+    try:
+        data = request.json or {}
+        job_type = data.get('type')
+        
+        if job_type not in job_service.handlers:
+            return jsonify({"error": f"Unknown job type: {job_type}"}), 400
+        
+        return submit_job(job_type, data.get('payload', {}))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a background job for status, progress stages and result"""
+    job = job_service.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(
         host='0.0.0.0',
@@ -0,0 +1,121 @@
+"""Write-throughput benchmark for DatabaseService bulk APIs.
+
+Times the per-row write paths (one transaction per flashcard, deck link and
+scheduled review) against save_flashcards_bulk, add_cards_to_deck_bulk and
+record_reviews_bulk on a file-backed SQLite database. That both paths leave
+the same rows behind is covered by backend/tests/test_bulk_writes.py.
+
+    cd backend && python benchmarks/bulk_writes.py [--rows 2000] [--batch 50]
+
+Exits non-zero if a bulk path is not faster.
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import harness
+
+from services.database_service import DatabaseService
+
+
+def make_cards(count):
+    return [{'front': f'Question {i}?', 'back': f'Answer {i}', 'difficulty': random.randint(1, 5)}
+            for i in range(count)]
+
+
+def make_reviews(card_ids, count):
+    now = datetime.utcnow()
+    return [{
+        'card_id': random.choice(card_ids),
+        'rating': random.randint(1, 4),
+        'review_time_ms': random.randint(500, 20000),
+        'reviewed_at': now - timedelta(minutes=count - i)
+    } for i in range(count)]
+
+
+def batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def per_row(db, note_id, deck_id, cards, reviews):
+    """Today's path: one call, and one transaction, per row"""
+    timings = {}
+
+    start = time.perf_counter()
+    card_ids = [db.save_flashcard(note_id, card['front'], card['back'], ai_generated=True) for card in cards]
+    timings['flashcards'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for card_id in card_ids:
+        db.add_card_to_deck(deck_id, card_id)
+    timings['deck links'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for review in reviews:
+        db.record_review(review['card_id'], review['rating'], review_time_ms=review['review_time_ms'],
+                         reviewed_at=review['reviewed_at'])
+    timings['reviews'] = time.perf_counter() - start
+    return timings
+
+
+def bulk(db, note_id, deck_id, cards, reviews, batch):
+    """Bulk APIs, one transaction per batch (e.g. one generation run or sync)"""
+    timings = {}
+
+    start = time.perf_counter()
+    card_ids = []
+    for chunk in batches(cards, batch):
+        card_ids.extend(db.save_flashcards_bulk(note_id, chunk, ai_generated=True))
+    timings['flashcards'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in batches(card_ids, batch):
+        db.add_cards_to_deck_bulk(deck_id, chunk)
+    timings['deck links'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in batches(reviews, batch):
+        db.record_reviews_bulk(chunk)
+    timings['reviews'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--rows', type=int, default=2000, help='flashcards, deck links and reviews to write')
+    parser.add_argument('--batch', type=int, default=50, help='rows per bulk call')
+    args = parser.parse_args()
+    random.seed(42)
+
+    workdir = tempfile.mkdtemp(prefix='nexlearn-bulk-')
+    cards = make_cards(args.rows)
+
+    row_db = DatabaseService(f"sqlite:///{os.path.join(workdir, 'per_row.db')}")
+    bulk_db = DatabaseService(f"sqlite:///{os.path.join(workdir, 'bulk.db')}")
+    for db in (row_db, bulk_db):
+        db.save_note('Benchmark', 'content')
+        db.create_deck('Benchmark')
+
+    # Card IDs line up in both databases, so the same reviews apply to each
+    reviews = make_reviews(list(range(1, args.rows + 1)), args.rows)
+
+    print(f"Writing {args.rows:,} rows per table (bulk batches of {args.batch})...")
+    row_times = per_row(row_db, 1, 1, cards, reviews)
+    bulk_times = bulk(bulk_db, 1, 1, cards, reviews, args.batch)
+
+    budget = harness.Budget()
+    print(f"\n{'table':<14}{'per-row rows/s':>16}{'bulk rows/s':>14}{'speedup':>10}")
+    for name in row_times:
+        row_rate = args.rows / row_times[name]
+        bulk_rate = args.rows / bulk_times[name]
+        print(f"{name:<14}{row_rate:>16,.0f}{bulk_rate:>14,.0f}{bulk_rate / row_rate:>9.1f}x")
+        budget.check(bulk_rate > row_rate, f"{name}: bulk path is not faster")
+
+    budget.finish("Bulk paths are faster for every table.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Token-window splitting benchmark for unpunctuated CJK text.
+
+Splits long runs of CJK text with no sentence punctuation (so TextChunker
+has to fall back to hard token windows) at several window sizes and times
+it. That windows never end inside a multi-byte character and reassemble
+the input is covered by backend/tests/test_text_chunker.py.
+
+    cd backend && python benchmarks/chunking.py [--chars 200000]
+"""
+import random
+import time
+
+import harness
+
+from services.text_chunker import TextChunker, count_tokens
+
+# Common and rare ideographs (rare ones span several tokens), kana, hangul and a supplementary-plane character
+ALPHABET = '的是了我你他在有這個學習筆記測試鬱龘齉罍贔屭ひらがなカタカナ한국어𠀀𩸽'
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--chars', type=int, default=200_000)
+    parser.add_argument('--windows', default='7,64,512,2000', help='comma-separated max_tokens values')
+    args = parser.parse_args()
+    random.seed(42)
+
+    text = ''.join(random.choices(ALPHABET, k=args.chars))
+
+    print(f"{'max_tokens':>10}{'chunks':>10}{'largest':>10}{'ms':>10}")
+    for max_tokens in (int(value) for value in args.windows.split(',')):
+        chunker = TextChunker(max_tokens=max_tokens, overlap_tokens=0)
+        start = time.perf_counter()
+        chunks = chunker.split(text)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        largest = max(count_tokens(chunk) for chunk in chunks)
+        print(f"{max_tokens:>10}{len(chunks):>10}{largest:>10}{elapsed_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Concurrent read/write stress test for the database engine profile.
+
+Runs reader and writer threads against the same SQLite file, first with a
+default create_engine() (rollback journal, no busy handling) and then with
+create_db_engine()'s production profile, and reports throughput, latency
+and "database is locked" errors for each.
+
+    cd backend && python benchmarks/db_stress.py [--readers 8] [--writers 4] [--seconds 10]
+
+Exits non-zero if the production profile raises any errors.
+"""
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import harness
+
+from sqlalchemy import create_engine, text
+from services.database_service import DatabaseService, create_db_engine
+
+SEED_NOTES = 200
+CARDS_PER_NOTE = 10
+
+
+def seed(db):
+    for i in range(SEED_NOTES):
+        note_id = db.save_note(f'Note {i}', 'x' * 500, {'sources': [{'type': 'text'}]})
+        card_ids = db.save_flashcards_bulk(note_id, [
+            {'front': f'Q{i}.{j}', 'back': f'A{i}.{j}'} for j in range(CARDS_PER_NOTE)
+        ])
+        if i % 20 == 0:
+            deck_id = db.create_deck(f'Deck {i}')
+        db.add_cards_to_deck_bulk(deck_id, card_ids)
+
+
+def reader(db, stop, stats):
+    reads = [
+        lambda: db.get_decks(),
+        lambda: db.get_notes_list(limit=20),
+        lambda: db.get_note(random.randint(1, SEED_NOTES)),
+        lambda: db.get_flashcards_by_note(random.randint(1, SEED_NOTES)),
+    ]
+    while not stop.is_set():
+        _timed(random.choice(reads), stats)
+
+
+def writer(db, stop, stats):
+    card_count = SEED_NOTES * CARDS_PER_NOTE
+    writes = [
+        lambda: db.record_reviews_bulk([
+            {'card_id': random.randint(1, card_count), 'rating': random.randint(1, 4)} for _ in range(10)
+        ]),
+        lambda: db.save_flashcard(random.randint(1, SEED_NOTES), 'Q', 'A'),
+        lambda: db.update_note(random.randint(1, SEED_NOTES), content='y' * 500),
+    ]
+    while not stop.is_set():
+        _timed(random.choice(writes), stats)
+
+
+def _timed(operation, stats):
+    start = time.perf_counter()
+    try:
+        operation()
+        stats['latencies'].append((time.perf_counter() - start) * 1000)
+    except Exception as e:
+        stats['errors'].append(type(e).__name__)
+
+
+def run(label, engine, args):
+    db = DatabaseService(engine=engine)
+    seed(db)
+    with db.engine.connect() as conn:
+        journal_mode = conn.execute(text('PRAGMA journal_mode')).scalar()
+
+    stop = threading.Event()
+    read_stats = {'latencies': [], 'errors': []}
+    write_stats = {'latencies': [], 'errors': []}
+    threads = [threading.Thread(target=reader, args=(db, stop, read_stats)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(db, stop, write_stats)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.engine.dispose()
+
+    print(f"\n{label} (journal_mode={journal_mode})")
+    print(f"  {'':<8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, stats in (('reads', read_stats), ('writes', write_stats)):
+        latencies = stats['latencies'] or [0.0]
+        print(f"  {name:<8}{len(stats['latencies']) / args.seconds:>10,.0f}{statistics.median(latencies):>10.1f}"
+              f"{harness.p95(latencies):>10.1f}{max(latencies):>10.1f}{len(stats['errors']):>8}")
+    return read_stats['errors'] + write_stats['errors']
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    random.seed(42)
+
+    workdir = tempfile.mkdtemp(prefix='nexlearn-stress-')
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile")
+
+    # Plain pysqlite connections: rollback journal and a 5s lock wait
+    run('default engine', create_engine(f"sqlite:///{os.path.join(workdir, 'default.db')}"), args)
+    errors = run('production profile', create_db_engine(f"sqlite:///{os.path.join(workdir, 'tuned.db')}"), args)
+
+    budget = harness.Budget()
+    budget.check(not errors, f"production profile raised {len(errors)} error(s): {sorted(set(errors))}")
+    budget.finish("Production profile ran without lock errors.")
+
+
+if __name__ == '__main__':
+    main()
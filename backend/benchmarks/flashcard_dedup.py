@@ -0,0 +1,112 @@
+"""Near-duplicate flashcard detection benchmark.
+
+Seeds one user's deck with generated zh-tw/English cards, then times
+find_duplicate_flashcards on edited copies of saved cards (punctuation,
+width, a few changed characters) and on unrelated new cards, at a tenth of
+the corpus and at the full corpus, to show that lookup latency barely grows
+with the corpus (no pairwise scan). Which cards are reported as duplicates
+is covered by backend/tests/test_flashcard_dedup.py.
+
+    cd backend && python benchmarks/flashcard_dedup.py [--cards 20000] [--queries 200]
+
+Exits non-zero if lookup time grows more than --max-growth.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import harness
+
+from services.database_service import DatabaseService
+
+USER_ID = 1
+HAN = [chr(code) for code in range(0x4E00, 0x4E00 + 800)]
+WORDS = ['gradient', 'matrix', 'entropy', 'vector', 'kernel', 'bayes', 'prior', 'tensor', 'loss', 'norm',
+         'eigen', 'descent', 'margin', 'sample', 'variance', 'bias', 'layer', 'softmax', 'sigmoid', 'graph']
+
+
+def phrase(length):
+    return ''.join(random.choices(HAN, k=length))
+
+
+def make_card():
+    term = random.choice(WORDS) + ' ' + random.choice(WORDS)
+    return {
+        'front': f'什麼是{phrase(4)}（{term}）？',
+        'back': f'{phrase(random.randint(20, 40))}，例如 {term} {random.choice(WORDS)}。{phrase(random.randint(10, 30))}'
+    }
+
+
+def edit(card):
+    """The same card as another generation might phrase it"""
+    back = list(card['back'])
+    for _ in range(random.randint(0, 3)):
+        back[random.randrange(len(back))] = random.choice(HAN)
+    return {
+        'front': random.choice(['請問', '']) + card['front'].replace('？', '?').replace('（', ' (').replace('）', ')'),
+        'back': ''.join(back).replace('，', ', ').upper()
+    }
+
+
+def seed(db, cards, batch=1000):
+    card_ids = []
+    for i in range(0, len(cards), batch):
+        card_ids += db.save_flashcards_bulk(None, cards[i:i + batch], ai_generated=True, user_id=USER_ID)
+    return card_ids
+
+
+def lookups(db, queries):
+    """p50 ms of looking up each query on its own"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        db.find_duplicate_flashcards([query], user_id=USER_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--cards', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=200, help='edited copies and new cards looked up')
+    parser.add_argument('--max-growth', type=float, default=3.0,
+                        help='allowed lookup time ratio between the full corpus and a tenth of it')
+    args = parser.parse_args()
+    random.seed(42)
+
+    db = DatabaseService(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='nexlearn-dedup-'), 'dedup.db')}")
+    corpus = [make_card() for _ in range(args.cards)]
+    budget = harness.Budget()
+
+    small = args.cards // 10
+    start = time.perf_counter()
+    card_ids = seed(db, corpus[:small])
+    seed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{'corpus':>8}{'p50 edited ms':>16}{'p50 new ms':>14}")
+    medians = []
+    for size in (small, args.cards):
+        if size > len(card_ids):
+            start = time.perf_counter()
+            card_ids += seed(db, corpus[len(card_ids):size])
+            seed_ms += (time.perf_counter() - start) * 1000
+        edited = [edit(corpus[i]) for i in random.sample(range(size), args.queries)]
+        fresh = [make_card() for _ in range(args.queries)]
+        edited_ms = lookups(db, edited)
+        fresh_ms = lookups(db, fresh)
+        medians.append(edited_ms + fresh_ms)
+        print(f"{size:>8,}{edited_ms:>16.2f}{fresh_ms:>14.2f}")
+
+    print(f"\nSaved and signed {args.cards:,} cards in {seed_ms / 1000:.1f}s "
+          f"({seed_ms / args.cards:.2f}ms per card)")
+    growth = medians[1] / medians[0]
+    print(f"Lookup time grew {growth:.2f}x for a {args.cards // small}x larger corpus")
+    budget.check(growth <= args.max_growth, f"lookup time grew {growth:.1f}x (allowed {args.max_growth:g}x)")
+
+    budget.finish("Near-duplicate lookups do not scan the corpus.")
+
+
+if __name__ == '__main__':
+    main()
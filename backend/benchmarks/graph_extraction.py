@@ -0,0 +1,97 @@
+"""Cost benchmark for knowledge-graph extraction from generated notes.
+
+Generates synthetic zh-tw/English Markdown notes (headings, bold terms,
+bullet lists) and runs KnowledgeExtractionService over them with a
+recording stand-in for the LLM, reporting time per note and how many LLM
+requests and concept pairs the runs needed. The request cap, label
+deduplication and idempotent re-runs are covered by
+backend/tests/test_knowledge_extraction.py.
+
+    cd backend && python benchmarks/graph_extraction.py [--notes 200] [--sections 8]
+"""
+import os
+import random
+import tempfile
+import time
+import zlib
+
+import harness
+
+from sqlalchemy import func, select
+from models import KnowledgeNode, KnowledgeEdge
+from services.database_service import DatabaseService
+from services.graph_service import GraphService
+from services.knowledge_extraction_service import KnowledgeExtractionService
+
+TOPICS = ['機器學習', '深度學習', '線性代數', '微積分', '機率', '統計', '最佳化', '資料結構']
+TERMS = ['梯度下降', '反向傳播', '矩陣', '特徵值', '導數', '積分', '貝氏定理', '期望值', '變異數', '損失函數',
+         'Gradient Descent', 'Backpropagation', 'Eigenvalue', 'Chain Rule', 'Regularization', 'Overfitting']
+# Same concepts as they come back from different generations
+VARIANTS = {'Gradient Descent': ['gradient descent', 'Gradient  Descent', 'Ｇradient Descent'],
+            '梯度下降': ['梯度下降：', '「梯度下降」']}
+
+
+def spell(term):
+    return random.choice(VARIANTS.get(term, [term]) + [term])
+
+
+def make_note(sections):
+    topic = random.choice(TOPICS)
+    lines = [f'# {topic}筆記', '']
+    for s in range(sections):
+        lines += [f'## {s + 1}. {random.choice(TOPICS)}：第 {s} 節', '']
+        for _ in range(random.randint(2, 4)):
+            a, b = random.sample(TERMS, 2)
+            lines.append(f'- **{spell(a)}** 與 **{spell(b)}** 的關係，例如 **定義：** 說明文字。')
+        lines += ['', f'### {spell(random.choice(TERMS))}', '', f'這段介紹 **{spell(random.choice(TERMS))}**。', '']
+    return '\n'.join(lines)
+
+
+class RecordingLLM:
+    """Stands in for OpenAIService: answers relation requests without the API and counts them"""
+
+    def __init__(self):
+        self.calls = 0
+        self.pairs = 0
+
+    def classify_concept_relations(self, pairs, language='zh-tw', use_cache=True):
+        self.calls += 1
+        self.pairs += len(pairs)
+        # Deterministic per pair, as a cached response would be
+        return [('a_before_b', 'b_before_a', 'related', 'none')[zlib.crc32(f'{a}|{b}'.encode()) % 4]
+                for a, b, _ in pairs]
+
+
+def counts(db):
+    with db.get_session() as session:
+        return (session.scalar(select(func.count(KnowledgeNode.id))),
+                session.scalar(select(func.count(KnowledgeEdge.id))))
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--notes', type=int, default=200)
+    parser.add_argument('--sections', type=int, default=8, help='H2 sections per note')
+    parser.add_argument('--batch', type=int, default=20, help='notes per extraction run')
+    args = parser.parse_args()
+    random.seed(42)
+
+    db = DatabaseService(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='nexlearn-extract-'), 'graph.db')}")
+    llm = RecordingLLM()
+    extractor = KnowledgeExtractionService(llm, GraphService(db))
+    notes = [make_note(args.sections) for _ in range(args.notes)]
+
+    runs = [notes[i:i + args.batch] for i in range(0, len(notes), args.batch)]
+    start = time.perf_counter()
+    results = [extractor.extract(batch) for batch in runs]
+    elapsed = time.perf_counter() - start
+
+    nodes, edges = counts(db)
+    print(f"{args.notes} notes in {len(runs)} runs: {elapsed * 1000 / args.notes:.2f}ms per note, "
+          f"{nodes} nodes, {edges} edges")
+    print(f"LLM: {llm.calls} requests for {llm.pairs} concept pairs "
+          f"({sum(r['pairs_skipped'] for r in results)} lower-frequency pairs skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Latency benchmark for the knowledge graph service.
+
+Seeds one user's graph (100k edges by default: a layered prerequisite DAG
+plus random "related_to" edges), then times the cold load into CSR arrays
+and prerequisites, k-hop neighbourhoods and shortest paths over it.
+Traversal results are checked against a plain-Python reference in
+backend/tests/test_graph_service.py.
+
+    cd backend && python benchmarks/graph_queries.py [--nodes 20000] [--edges 100000]
+
+Exits non-zero if a query exceeds --budget-ms at p95.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+
+import harness
+
+from services.database_service import DatabaseService
+from services.graph_service import GraphService, RELATION_PREREQUISITE
+
+USER_ID = 1
+LAYERS = 12
+
+
+def seed(db_path, args):
+    """Nodes in LAYERS layers; prerequisite edges only point to later layers, so they form a DAG"""
+    layer = {node_id: (node_id - 1) * LAYERS // args.nodes for node_id in range(1, args.nodes + 1)}
+    by_layer = defaultdict(list)
+    for node_id, depth in layer.items():
+        by_layer[depth].append(node_id)
+
+    edges = set()
+    while len(edges) < args.edges * 0.6:
+        target = random.randint(1, args.nodes)
+        if layer[target]:
+            source = random.choice(by_layer[random.randrange(max(0, layer[target] - 2), layer[target])])
+            edges.add((source, target, RELATION_PREREQUISITE))
+    while len(edges) < args.edges:
+        source, target = random.randint(1, args.nodes), random.randint(1, args.nodes)
+        if source != target:
+            edges.add((source, target, 'related_to'))
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO users (id, email) VALUES (?, ?)', (USER_ID, 'bench@example.com'))
+    conn.executemany('INSERT INTO knowledge_nodes (id, user_id, label) VALUES (?, ?, ?)',
+                     [(node_id, USER_ID, f'concept {node_id}') for node_id in range(1, args.nodes + 1)])
+    conn.executemany('INSERT INTO knowledge_edges (user_id, source_node_id, target_node_id, relation) '
+                     'VALUES (?, ?, ?, ?)', [(USER_ID, *edge) for edge in edges])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--nodes', type=int, default=20_000)
+    parser.add_argument('--edges', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20, help='executions per query')
+    parser.add_argument('--budget-ms', type=float, default=20.0, help='maximum p95 latency per query')
+    args = parser.parse_args()
+    random.seed(42)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='nexlearn-graph-'), 'graph.db')
+    db = DatabaseService(f'sqlite:///{db_path}')
+    seed(db_path, args)
+    graphs = GraphService(db, sync_seconds=3600)
+
+    start = time.perf_counter()
+    graph = graphs.get_graph(USER_ID)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"Loaded {graph.node_count:,} nodes and {graph.edge_count:,} edges in {load_ms:.0f}ms")
+
+    last_layer = [node_id for node_id in range(args.nodes * (LAYERS - 1) // LAYERS + 2, args.nodes + 1)]
+    queries = {
+        'prerequisites (deepest layer)': lambda node_id, _: graphs.prerequisites(node_id, user_id=USER_ID),
+        '2-hop neighborhood': lambda node_id, _: graphs.neighborhood(node_id, hops=2, user_id=USER_ID),
+        'shortest path': lambda node_id, other: graphs.shortest_path(node_id, other, user_id=USER_ID),
+    }
+
+    budget = harness.Budget()
+    print(f"\n{'query':<32}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, query in queries.items():
+        pending = [(random.choice(last_layer), random.randint(1, args.nodes)) for _ in range(args.repeat)]
+        _, p50, p95 = harness.timed(lambda: query(*pending.pop()), args.repeat)
+        print(f"{name:<32}{p50:>10.2f}{p95:>10.2f}")
+        budget.check(p95 <= args.budget_ms, f"{name}: p95 {p95:.1f}ms over the {args.budget_ms:g}ms budget")
+
+    budget.finish(f"All queries run within {args.budget_ms:g}ms at p95.")
+
+
+if __name__ == '__main__':
+    main()
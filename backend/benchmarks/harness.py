@@ -0,0 +1,55 @@
+"""Shared setup and reporting for the benchmark scripts.
+
+Importing this module puts backend/ on sys.path, so a script run as
+`python benchmarks/<name>.py` can import the app's modules after it.
+Correctness is covered by the tests in backend/tests; the scripts only time
+things and exit non-zero when a timing is over its budget.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def parser(doc):
+    """ArgumentParser described by the first line of a script's docstring"""
+    return argparse.ArgumentParser(description=doc.splitlines()[0])
+
+
+def p95(timings):
+    ordered = sorted(timings)
+    return ordered[max(0, int(len(ordered) * 0.95) - 1)]
+
+
+def timed(fn, repeat):
+    """(last result, p50 ms, p95 ms) over `repeat` calls of fn"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings), p95(timings)
+
+
+class Budget:
+    """Collects timings that are over budget and reports them at the end"""
+
+    def __init__(self):
+        self.failures = []
+
+    def check(self, within, message):
+        if not within:
+            self.failures.append(message)
+
+    def finish(self, message):
+        """Exit non-zero listing every failure, otherwise print `message`"""
+        if self.failures:
+            print("\nFAILED:\n  " + "\n  ".join(self.failures))
+            sys.exit(1)
+        print(f"\n{message}")
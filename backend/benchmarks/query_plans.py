@@ -0,0 +1,198 @@
+"""Index benchmark for the models layer.
+
+Builds a pre-index SQLite database (the schema as it was before indexes were
+added to models.py), seeds it with 100k cards and 1M reviews, times the hot
+read queries, then lets DatabaseService migrate it and times them again,
+printing each query's plan. That every query uses its index is covered by
+backend/tests/test_query_plans.py.
+
+    cd backend && python benchmarks/query_plans.py [--cards 100000] [--reviews 1000000]
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import harness
+
+from sqlalchemy import create_engine
+from models import Base
+from services.database_service import DatabaseService
+
+BATCH = 50_000
+NOW = datetime(2025, 1, 1)
+
+# (name, sql, params(args) -> tuple)
+QUERIES = [
+    ('due queue',
+     'SELECT id, card_id, due_at FROM reviews WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT 50',
+     lambda a: (random.randint(1, a.users), _ts(NOW))),
+    ('card history',
+     'SELECT rating, reviewed_at FROM reviews WHERE card_id = ? ORDER BY reviewed_at DESC',
+     lambda a: (random.randint(1, a.cards),)),
+    ('cards by note',
+     'SELECT id, front FROM flashcards WHERE note_id = ?',
+     lambda a: (random.randint(1, a.notes),)),
+    ('sources by note',
+     'SELECT type, url FROM sources WHERE note_id = ?',
+     lambda a: (random.randint(1, a.notes),)),
+    ('notes list',
+     'SELECT id, title FROM notes ORDER BY created_at DESC, id DESC LIMIT 20',
+     lambda a: ()),
+    ('notes page (keyset)',
+     'SELECT id, title, substr(content, 1, 201) FROM notes WHERE (created_at, id) < (?, ?) '
+     'ORDER BY created_at DESC, id DESC LIMIT 21',
+     lambda a: (_ts(NOW - timedelta(days=180)), a.notes)),
+    ('deck list',
+     'SELECT id, name FROM decks ORDER BY created_at DESC LIMIT 50',
+     lambda a: ()),
+    ('decks containing card',
+     'SELECT deck_id FROM deck_cards WHERE card_id = ?',
+     lambda a: (random.randint(1, a.cards),)),
+    ('quiz results',
+     'SELECT score FROM quiz_results WHERE quiz_id = ?',
+     lambda a: (random.randint(1, a.notes),)),
+    ('outgoing edges',
+     'SELECT target_node_id FROM knowledge_edges WHERE source_node_id = ?',
+     lambda a: (random.randint(1, a.notes),)),
+]
+
+
+def _ts(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _random_time(days=365):
+    return _ts(NOW - timedelta(seconds=random.randint(0, days * 86400)))
+
+
+def create_legacy_schema(db_path):
+    """Current tables without any of the secondary indexes"""
+    Base.metadata.create_all(create_engine(f'sqlite:///{db_path}'))
+    conn = sqlite3.connect(db_path)
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex_%'"
+    )]
+    for name in names:
+        conn.execute(f'DROP INDEX {name}')
+    conn.commit()
+    conn.close()
+
+
+def _insert(conn, sql, rows, total):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+    conn.commit()
+    table = sql.split(' INTO ')[1].split()[0]
+    print(f"  {table:<16} {total:>10,} rows")
+
+
+def seed(db_path, args):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    start = time.perf_counter()
+
+    _insert(conn, 'INSERT INTO users (id, email, created_at) VALUES (?, ?, ?)',
+            ((i, f'user{i}@example.com', _random_time()) for i in range(1, args.users + 1)), args.users)
+    _insert(conn, 'INSERT INTO notes (id, user_id, title, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            ((i, random.randint(1, args.users), f'Note {i}', 'x' * 400, _random_time(), _random_time())
+             for i in range(1, args.notes + 1)), args.notes)
+    _insert(conn, 'INSERT INTO sources (note_id, type, url) VALUES (?, ?, ?)',
+            ((random.randint(1, args.notes), 'youtube', 'https://youtu.be/x') for _ in range(args.notes * 2)),
+            args.notes * 2)
+    _insert(conn, 'INSERT INTO flashcards (id, user_id, note_id, front, back, created_at, updated_at) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((i, random.randint(1, args.users), random.randint(1, args.notes), f'Q{i}', f'A{i}',
+              _random_time(), _random_time()) for i in range(1, args.cards + 1)), args.cards)
+    _insert(conn, 'INSERT INTO decks (id, user_id, name, created_at) VALUES (?, ?, ?, ?)',
+            ((i, random.randint(1, args.users), f'Deck {i}', _random_time()) for i in range(1, args.decks + 1)),
+            args.decks)
+    _insert(conn, 'INSERT OR IGNORE INTO deck_cards (deck_id, card_id) VALUES (?, ?)',
+            ((random.randint(1, args.decks), card_id) for card_id in range(1, args.cards + 1)), args.cards)
+    _insert(conn, 'INSERT INTO reviews (card_id, user_id, rating, review_time_ms, due_at, reviewed_at) '
+                  'VALUES (?, ?, ?, ?, ?, ?)',
+            ((random.randint(1, args.cards), random.randint(1, args.users), random.randint(1, 4),
+              random.randint(500, 20000), _ts(NOW + timedelta(days=random.uniform(-30, 60))), _random_time())
+             for _ in range(args.reviews)), args.reviews)
+    _insert(conn, 'INSERT INTO quizzes (id, note_id, payload_json, created_at) VALUES (?, ?, ?, ?)',
+            ((i, i, '[]', _random_time()) for i in range(1, args.notes + 1)), args.notes)
+    _insert(conn, 'INSERT INTO quiz_results (quiz_id, score, taken_at) VALUES (?, ?, ?)',
+            ((random.randint(1, args.notes), random.random() * 100, _random_time()) for _ in range(args.notes * 2)),
+            args.notes * 2)
+    _insert(conn, 'INSERT INTO knowledge_nodes (id, label, created_at) VALUES (?, ?, ?)',
+            ((i, f'concept {i}', _random_time()) for i in range(1, args.notes + 1)), args.notes)
+    _insert(conn, 'INSERT INTO knowledge_edges (source_node_id, target_node_id, relation, created_at) '
+                  'VALUES (?, ?, ?, ?)',
+            ((random.randint(1, args.notes), random.randint(1, args.notes), 'related_to', _random_time())
+             for _ in range(args.notes * 4)), args.notes * 4)
+
+    conn.close()
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+
+def measure(db_path, args):
+    """{query name: (mean ms, plan text)}"""
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for name, sql, params in QUERIES:
+        plan = ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params(args)))
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            conn.execute(sql, params(args)).fetchall()
+        results[name] = ((time.perf_counter() - start) * 1000 / args.repeat, plan)
+    conn.close()
+    return results
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--reviews', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=20, help='executions per query when timing')
+    parser.add_argument('--db', help='database file to use (default: a temporary file)')
+    args = parser.parse_args()
+    args.notes = max(1, args.cards // 10)
+    args.decks = max(1, args.cards // 100)
+    random.seed(42)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='nexlearn-bench-'), 'bench.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    print(f"Creating pre-index schema at {db_path}")
+    create_legacy_schema(db_path)
+    seed(db_path, args)
+
+    print("Timing queries without indexes...")
+    before = measure(db_path, args)
+
+    # DatabaseService migrates the existing file on construction
+    start = time.perf_counter()
+    DatabaseService(f'sqlite:///{db_path}')
+    conn = sqlite3.connect(db_path)
+    conn.execute('ANALYZE')
+    conn.close()
+    print(f"Migration finished in {time.perf_counter() - start:.1f}s")
+
+    after = measure(db_path, args)
+
+    print(f"\n{'query':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}  plan")
+    for name, _, _ in QUERIES:
+        before_ms, _ = before[name]
+        after_ms, plan = after[name]
+        speedup = before_ms / after_ms if after_ms else float('inf')
+        print(f"{name:<24}{before_ms:>12.3f}{after_ms:>12.3f}{speedup:>9.1f}x  {plan}")
+
+
+if __name__ == '__main__':
+    main()
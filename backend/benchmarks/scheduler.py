@@ -0,0 +1,132 @@
+"""Benchmark for the vectorized spaced-repetition scheduler.
+
+Seeds one user with 50k cards and their review history, then times:
+- FSRSScheduler.replay against a per-review Python loop (same model),
+- a full DatabaseService.reschedule() of the user and a
+  rebuild_card_state() of every card,
+- get_due_queue() and record_review().
+That replay and card_state agree with the loop is covered by
+backend/tests/test_scheduler.py.
+
+    cd backend && python benchmarks/scheduler.py [--cards 50000] [--reviews-per-card 10]
+
+Exits non-zero if the due queue is over budget.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import harness
+
+from services.database_service import DatabaseService
+from services.scheduler_service import FSRSScheduler, to_days
+
+NOW = datetime(2025, 6, 1)
+USER_ID = 1
+
+
+def seed(db_path, args):
+    """Cards for USER_ID, each reviewed 1..2n times at growing intervals"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO users (id, email) VALUES (?, ?)', (USER_ID, 'bench@example.com'))
+    conn.executemany(
+        'INSERT INTO flashcards (id, user_id, front, back, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(i, USER_ID, f'Q{i}', f'A{i}', NOW, NOW) for i in range(1, args.cards + 1)]
+    )
+    reviews = []
+    for card_id in range(1, args.cards + 1):
+        when = NOW - timedelta(days=random.uniform(30, 365))
+        gap = 1.0
+        for _ in range(random.randint(1, 2 * args.reviews_per_card - 1)):
+            if when >= NOW:
+                break
+            rating = random.choices((1, 2, 3, 4), weights=(10, 15, 60, 15))[0]
+            reviews.append((card_id, USER_ID, rating, when.strftime('%Y-%m-%d %H:%M:%S.%f')))
+            gap = 1.0 if rating == 1 else gap * random.uniform(1.5, 3.0)
+            when += timedelta(days=gap)
+    conn.executemany('INSERT INTO reviews (card_id, user_id, rating, reviewed_at) VALUES (?, ?, ?, ?)', reviews)
+    conn.commit()
+    conn.close()
+    return len(reviews)
+
+
+def load(db_path):
+    conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    rows = conn.execute('SELECT card_id, reviewed_at, rating FROM reviews ORDER BY card_id, reviewed_at').fetchall()
+    conn.close()
+    cards, reviewed_at, ratings = zip(*rows)
+    return np.array(cards), to_days([datetime.fromisoformat(value) for value in reviewed_at]), np.array(ratings)
+
+
+def loop_replay(scheduler, cards, days, ratings):
+    """One Python iteration per review row: {card_id: (stability, difficulty, due)}"""
+    state = {}
+    for index in np.lexsort((days, cards)):
+        card, day, rating = int(cards[index]), float(days[index]), int(ratings[index])
+        if card not in state:
+            stability = float(scheduler.initial_stability(rating))
+            difficulty = float(scheduler.initial_difficulty(rating))
+        else:
+            stability, difficulty, last = state[card][:3]
+            recall = scheduler.retrievability(max(day - last, 0), stability)
+            stability = float(scheduler.next_stability(difficulty, stability, recall, np.int64(rating)))
+            difficulty = float(scheduler.next_difficulty(difficulty, rating))
+        state[card] = (stability, difficulty, day)
+    return {card: (s, d, day + float(scheduler.interval(s))) for card, (s, d, day) in state.items()}
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--cards', type=int, default=50_000)
+    parser.add_argument('--reviews-per-card', type=int, default=10, help='mean reviews per card')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='maximum median due-queue latency')
+    args = parser.parse_args()
+    random.seed(42)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='nexlearn-srs-'), 'srs.db')
+    db = DatabaseService(f'sqlite:///{db_path}')
+    start = time.perf_counter()
+    total = seed(db_path, args)
+    print(f"Seeded {args.cards:,} cards and {total:,} reviews in {time.perf_counter() - start:.1f}s")
+
+    scheduler = FSRSScheduler()
+    cards, days, ratings = load(db_path)
+    _, vector_ms, _ = harness.timed(lambda: scheduler.replay(cards, days, ratings), 5)
+    start = time.perf_counter()
+    loop_replay(scheduler, cards, days, ratings)
+    loop_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    db.reschedule(user_id=USER_ID)
+    reschedule_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    db.rebuild_card_state()
+    rebuild_ms = (time.perf_counter() - start) * 1000
+
+    queue, queue_ms, _ = harness.timed(lambda: db.get_due_queue(user_id=USER_ID, now=NOW, limit=100), args.repeat)
+    pending = random.sample(range(1, args.cards + 1), args.repeat)
+    _, review_ms, _ = harness.timed(
+        lambda: db.record_review(pending.pop(), 3, user_id=USER_ID, reviewed_at=NOW), args.repeat)
+
+    print(f"\n{'operation':<40}{'ms':>10}")
+    print(f"{'replay, Python loop per review':<40}{loop_ms:>10.1f}")
+    print(f"{'replay, vectorized':<40}{vector_ms:>10.1f}  ({loop_ms / vector_ms:.0f}x)")
+    print(f"{'reschedule user (load + replay + write)':<40}{reschedule_ms:>10.1f}")
+    print(f"{'rebuild_card_state (all cards)':<40}{rebuild_ms:>10.1f}")
+    print(f"{'due queue (100 of ' + format(queue['due_count'], ',') + ' due)':<40}{queue_ms:>10.2f}")
+    print(f"{'record_review':<40}{review_ms:>10.2f}")
+
+    budget = harness.Budget()
+    budget.check(queue_ms <= args.budget_ms, f"due queue took {queue_ms:.1f}ms (budget {args.budget_ms:g}ms)")
+    budget.finish(f"The due queue is served within {args.budget_ms:g}ms.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Latency benchmark for the full-text search index.
+
+Fills a SearchIndex with synthetic zh-tw/English notes (100k by default) and
+flashcards, then times a mix of CJK, Latin, prefix and multi-term queries.
+
+    cd backend && python benchmarks/search_latency.py [--notes 100000] [--repeat 20]
+
+Exits non-zero if the p95 latency of any query exceeds --budget-ms.
+"""
+import os
+import random
+import tempfile
+import time
+
+import harness
+
+from services.search_service import SearchIndex, DOC_NOTE, DOC_FLASHCARD
+
+BATCH = 2000
+
+ZH_TERMS = ['機器學習', '深度學習', '神經網路', '梯度下降', '資料結構', '演算法', '微積分', '線性代數', '統計', '機率',
+            '量子力學', '熱力學', '有機化學', '細胞生物', '經濟學', '會計', '憲法', '民法', '台灣歷史', '地理']
+ZH_FILLER = '這是一段關於課程內容的說明文字我們將會介紹基本概念並且提供例題與練習'
+EN_TERMS = ['regression', 'classifier', 'backpropagation', 'transformer', 'eigenvalue', 'derivative', 'integral',
+            'entropy', 'photosynthesis', 'mitochondria', 'inflation', 'constitution', 'algorithm', 'recursion']
+
+QUERIES = ['機器學習', '梯度下降', '量子', '學', 'transformer', 'back', 'regression 演算法', '台灣歷史 憲法',
+           '不存在的詞彙', 'nonexistentterm']
+
+
+def make_note(i):
+    """A note about a few topics; each topic term ends up in roughly 10-15% of notes"""
+    terms = random.sample(ZH_TERMS, 3) + random.sample(EN_TERMS, 2)
+    paragraphs = []
+    for _ in range(random.randint(5, 15)):
+        start = random.randint(0, len(ZH_FILLER) - 20)
+        paragraphs.append(f"{ZH_FILLER[start:start + 20]}{random.choice(terms)}，see example {random.randint(1, 10**6)}.")
+    return (DOC_NOTE, i, f"{terms[0]}筆記 {i}", '## ' + '\n\n'.join(paragraphs))
+
+
+def seed(index, notes):
+    start = time.perf_counter()
+    batch = []
+    for i in range(1, notes + 1):
+        batch.append(make_note(i))
+        batch.append((DOC_FLASHCARD, i, f"什麼是{random.choice(ZH_TERMS)}？", f"Answer {i}"))
+        if len(batch) >= BATCH:
+            index.upsert_many(batch)
+            batch = []
+    if batch:
+        index.upsert_many(batch)
+    print(f"Indexed {notes:,} notes and {notes:,} flashcards in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = harness.parser(__doc__)
+    parser.add_argument('--notes', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20, help='executions per query')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='maximum p95 latency per query')
+    args = parser.parse_args()
+    random.seed(42)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='nexlearn-search-'), 'search.db')
+    index = SearchIndex(db_path, transcript_sync_seconds=0)
+    seed(index, args.notes)
+
+    budget = harness.Budget()
+    print(f"\n{'query':<24}{'hits':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for query in QUERIES:
+        results, p50, p95 = harness.timed(lambda: index.search(query, limit=20), args.repeat)
+        print(f"{query:<24}{len(results):>6}{p50:>10.2f}{p95:>10.2f}")
+        budget.check(p95 <= args.budget_ms, f"{query}: p95 {p95:.1f}ms over the {args.budget_ms:g}ms budget")
+
+    budget.finish(f"All {len(QUERIES)} queries within {args.budget_ms:g}ms at p95.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -25,12 +26,98 @@ class Config:
     ALLOWED_EXTENSIONS = {'pdf', 'txt'}
     
     # Database settings
-    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///nexlearn.db')
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///nexlearn.db')  # postgresql://... uses the same pool settings
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # persistent connections per process
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))  # extra connections under burst load
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))  # SQLite busy_timeout / PostgreSQL lock_timeout
+    DB_SQLITE_SYNCHRONOUS = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')  # safe with WAL; FULL for extra durability
+    DB_SQLITE_CACHE_SIZE_KB = int(os.getenv('DB_SQLITE_CACHE_SIZE_KB', 64 * 1024))  # page cache per connection
     
     # OpenAI settings
     OPENAI_MODEL = "gpt-3.5-turbo"
     OPENAI_MAX_TOKENS = 6000  # Further increased for comprehensive notes
     OPENAI_TEMPERATURE = 0.3
+    OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500))  # 0 disables the limit
+    OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 200000))  # 0 disables the limit
+    OPENAI_CHUNK_CONCURRENCY = int(os.getenv('OPENAI_CHUNK_CONCURRENCY', 4))  # parallel chunk requests
+    OPENAI_MERGE_CHUNKS = os.getenv('OPENAI_MERGE_CHUNKS', 'False').lower() == 'true'  # reduce pass over chunk notes
+    
+    # LLM response cache settings
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+    LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', 'llm_cache.db')
+    LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60))
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 256))
+    LLM_CACHE_MEMORY_MAX_BYTES = int(os.getenv('LLM_CACHE_MEMORY_MAX_BYTES', 32 * 1024 * 1024))
+    LLM_CACHE_DISK_MAX_BYTES = int(os.getenv('LLM_CACHE_DISK_MAX_BYTES', 200 * 1024 * 1024))
+    
+    # Chunking settings (token counts, shared by all LLM entry points)
+    CHUNK_THRESHOLD_TOKENS = int(os.getenv('CHUNK_THRESHOLD_TOKENS', 4000))  # above this, content is chunked
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 3000))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 150))
+    
+    # Transcript store settings (shared by all YouTube services)
+    TRANSCRIPT_DB_PATH = os.getenv('TRANSCRIPT_DB_PATH', 'transcripts.db')
+    TRANSCRIPT_TTL_SECONDS = int(os.getenv('TRANSCRIPT_TTL_SECONDS', 30 * 24 * 60 * 60))
+    TRANSCRIPT_MAX_BYTES = int(os.getenv('TRANSCRIPT_MAX_BYTES', 500 * 1024 * 1024))
+    TRANSCRIPT_LANGUAGES = os.getenv('TRANSCRIPT_LANGUAGES', 'en,en-US,en-GB,zh-TW,zh,zh-CN').split(',')  # Caption track preference order
+    TRANSCRIPT_RACE_STRATEGIES = os.getenv('TRANSCRIPT_RACE_STRATEGIES', 'True').lower() == 'true'  # Run caption strategies concurrently
+    TRANSCRIPT_NEGATIVE_TTL_SECONDS = int(os.getenv('TRANSCRIPT_NEGATIVE_TTL_SECONDS', 10 * 60))  # How long a failed lookup is remembered
+    
+    # Circuit breakers for YouTube upstreams (transcript API, yt-dlp, timedtext)
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))  # consecutive failures before opening
+    CIRCUIT_RESET_SECONDS = int(os.getenv('CIRCUIT_RESET_SECONDS', 60))  # how long an open circuit fails fast
+    
+    # Search settings
+    SEARCH_DB_PATH = os.getenv('SEARCH_DB_PATH', 'search.db')
+    SEARCH_TRANSCRIPT_SYNC_SECONDS = int(os.getenv('SEARCH_TRANSCRIPT_SYNC_SECONDS', 60))  # how often searches pick up new transcripts
+    SEARCH_RANK_WINDOW = int(os.getenv('SEARCH_RANK_WINDOW', 5000))  # newest matches ranked per query
+    
+    # Spaced repetition settings
+    SRS_DESIRED_RETENTION = float(os.getenv('SRS_DESIRED_RETENTION', 0.9))  # target recall probability at the due date
+    SRS_MAXIMUM_INTERVAL = int(os.getenv('SRS_MAXIMUM_INTERVAL', 36500))  # days
+    SRS_NEW_CARDS_PER_QUEUE = int(os.getenv('SRS_NEW_CARDS_PER_QUEUE', 20))  # unreviewed cards added to a due queue
+    
+    # Flashcard near-duplicate detection (changing bands/rows needs `flask rebuild-flashcard-signatures`)
+    DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', 0.7))  # estimated Jaccard similarity of card text shingles
+    DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', 20))  # LSH buckets per card
+    DEDUP_BAND_ROWS = int(os.getenv('DEDUP_BAND_ROWS', 6))  # MinHash values per bucket; signature length is bands * rows
+    
+    # Knowledge graph settings
+    GRAPH_CACHE_USERS = int(os.getenv('GRAPH_CACHE_USERS', 32))  # users whose graphs stay loaded in memory
+    GRAPH_SYNC_SECONDS = int(os.getenv('GRAPH_SYNC_SECONDS', 30))  # how often a cached graph picks up rows written elsewhere
+    GRAPH_EXTRACTION_ENABLED = os.getenv('GRAPH_EXTRACTION_ENABLED', 'True').lower() == 'true'  # queue graph extraction after unified notes
+    GRAPH_EXTRACTION_PAIRS_PER_CALL = int(os.getenv('GRAPH_EXTRACTION_PAIRS_PER_CALL', 40))  # concept pairs classified per LLM request
+    GRAPH_EXTRACTION_MAX_CALLS = int(os.getenv('GRAPH_EXTRACTION_MAX_CALLS', 3))  # LLM requests per extraction run
+    
+    # Source ingestion settings (unified notes)
+    INGESTION_MAX_WORKERS = int(os.getenv('INGESTION_MAX_WORKERS', 4))
+    INGESTION_SOURCE_TIMEOUT = int(os.getenv('INGESTION_SOURCE_TIMEOUT', 300))  # seconds from submission until every source of a request must be done
+    
+    # Background job settings
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs.db')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))  # a running job whose process stops renewing this is resumed elsewhere
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))  # starts before an abandoned job is failed
+    JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 7 * 24 * 60 * 60))  # finished jobs are deleted after this
+    
+    # Long-audio transcription settings
+    WHISPER_MAX_UPLOAD_MB = int(os.getenv('WHISPER_MAX_UPLOAD_MB', 25))  # Whisper API upload limit
+    WHISPER_SEGMENT_SECONDS = int(os.getenv('WHISPER_SEGMENT_SECONDS', 600))  # Target length of each audio segment
+    WHISPER_SILENCE_WINDOW_SECONDS = int(os.getenv('WHISPER_SILENCE_WINDOW_SECONDS', 45))  # How far a cut may move to land on silence
+    WHISPER_SEGMENT_BITRATE = os.getenv('WHISPER_SEGMENT_BITRATE', '64k')
+    WHISPER_CONCURRENCY = int(os.getenv('WHISPER_CONCURRENCY', 3))  # Segments transcribed in parallel
+    
+    # PDF extraction settings
+    PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))  # extraction processes
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 16))  # smaller documents are extracted in-process
+    PDF_PAGE_BATCH = int(os.getenv('PDF_PAGE_BATCH', 8))  # pages per worker task
+    PDF_CACHE_ENABLED = os.getenv('PDF_CACHE_ENABLED', 'True').lower() == 'true'
+    PDF_CACHE_DB_PATH = os.getenv('PDF_CACHE_DB_PATH', 'pdf_cache.db')
+    PDF_CACHE_TTL_SECONDS = int(os.getenv('PDF_CACHE_TTL_SECONDS', 30 * 24 * 60 * 60))
+    PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'nexlearn-uploads'))  # multipart uploads awaiting ingestion
     
     # Note generation settings
     NOTE_DETAIL_LEVELS = {
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Float, UniqueConstraint
+from sqlalchemy import (Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, JSON, Float,
+                        LargeBinary, UniqueConstraint, Index)
 from datetime import datetime
 
 Base = declarative_base()
@@ -15,7 +16,7 @@ class User(Base):
 class Note(Base):
     __tablename__ = 'notes'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     language = Column(String(16), default='zh-tw')
@@ -24,12 +25,19 @@ class Note(Base):
     topic = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # Newest-first listing with a stable tiebreaker
+        Index('ix_notes_created_at_id', 'created_at', 'id'),
+    )
+    
+    # Sources are deleted explicitly by DatabaseService.delete_note
+    sources = relationship('Source', order_by='Source.id', passive_deletes=True)
 
 
 class Source(Base):
     __tablename__ = 'sources'
     id = Column(Integer, primary_key=True)
-    note_id = Column(Integer, ForeignKey('notes.id'), nullable=False)
+    note_id = Column(Integer, ForeignKey('notes.id'), nullable=False, index=True)
     type = Column(String(32), nullable=False)  # youtube/pdf/text/webpage
     url = Column(String(1024), nullable=True)
     meta = Column(JSON, nullable=True)
@@ -38,17 +46,17 @@ class Source(Base):
 class Deck(Base):
     __tablename__ = 'decks'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class Flashcard(Base):
     __tablename__ = 'flashcards'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    note_id = Column(Integer, ForeignKey('notes.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    note_id = Column(Integer, ForeignKey('notes.id'), nullable=True, index=True)
     front = Column(Text, nullable=False)
     back = Column(Text, nullable=False)
     ai_generated = Column(Boolean, default=False)
@@ -58,12 +66,34 @@ class Flashcard(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
 
 
+class FlashcardSignature(Base):
+    # MinHash signature of each card's front and back, for near-duplicate checks
+    __tablename__ = 'flashcard_signatures'
+    card_id = Column(Integer, ForeignKey('flashcards.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    minhash = Column(LargeBinary, nullable=False)
+
+
+class FlashcardBucket(Base):
+    # One row per LSH band of each signature; cards sharing a bucket are duplicate candidates
+    __tablename__ = 'flashcard_buckets'
+    id = Column(Integer, primary_key=True)
+    card_id = Column(Integer, ForeignKey('flashcards.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    bucket = Column(BigInteger, nullable=False)
+    __table_args__ = (
+        # Bucket lookups per user, answered from the index alone
+        Index('ix_flashcard_buckets_user_bucket', 'user_id', 'bucket', 'card_id'),
+    )
+
+
 class DeckCard(Base):
     __tablename__ = 'deck_cards'
     id = Column(Integer, primary_key=True)
     deck_id = Column(Integer, ForeignKey('decks.id'), nullable=False)
-    card_id = Column(Integer, ForeignKey('flashcards.id'), nullable=False)
+    card_id = Column(Integer, ForeignKey('flashcards.id'), nullable=False, index=True)
     __table_args__ = (
+        # Also serves deck_id lookups (leftmost column)
         UniqueConstraint('deck_id', 'card_id', name='uq_deck_card'),
     )
 
@@ -79,13 +109,38 @@ class Review(Base):
     state = Column(Integer, nullable=True)
     due_at = Column(DateTime, nullable=True)
     reviewed_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # Due queue per user, and review history per card (also covers card_id lookups)
+        Index('ix_reviews_user_due', 'user_id', 'due_at'),
+        Index('ix_reviews_card_reviewed', 'card_id', 'reviewed_at'),
+    )
+
+
+class CardState(Base):
+    # Latest scheduler state per card, written with each review and rebuildable from reviews
+    __tablename__ = 'card_state'
+    card_id = Column(Integer, ForeignKey('flashcards.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    stability = Column(Float, nullable=False)
+    difficulty = Column(Float, nullable=False)
+    state = Column(Integer, nullable=False)
+    reps = Column(Integer, nullable=False, default=0)
+    lapses = Column(Integer, nullable=False, default=0)
+    last_rating = Column(Integer, nullable=True)
+    last_review = Column(DateTime, nullable=False)
+    scheduled_days = Column(Float, nullable=False)
+    due_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        # Per-user due queue
+        Index('ix_card_state_user_due', 'user_id', 'due_at'),
+    )
 
 
 class Quiz(Base):
     __tablename__ = 'quizzes'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    note_id = Column(Integer, ForeignKey('notes.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    note_id = Column(Integer, ForeignKey('notes.id'), nullable=True, index=True)
     payload_json = Column(JSON, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -93,8 +148,8 @@ class Quiz(Base):
 class QuizResult(Base):
     __tablename__ = 'quiz_results'
     id = Column(Integer, primary_key=True)
-    quiz_id = Column(Integer, ForeignKey('quizzes.id'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    quiz_id = Column(Integer, ForeignKey('quizzes.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     score = Column(Float, nullable=True)
     answers_json = Column(JSON, nullable=True)
     taken_at = Column(DateTime, default=datetime.utcnow)
@@ -103,7 +158,7 @@ class QuizResult(Base):
 class KnowledgeNode(Base):
     __tablename__ = 'knowledge_nodes'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     label = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -111,8 +166,8 @@ class KnowledgeNode(Base):
 class KnowledgeEdge(Base):
     __tablename__ = 'knowledge_edges'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    source_node_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False)
-    target_node_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    source_node_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False, index=True)
+    target_node_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False, index=True)
     relation = Column(String(64), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
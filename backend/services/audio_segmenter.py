@@ -0,0 +1,167 @@
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+import openai
+from config import Config
+
+_SILENCE_START = re.compile(r'silence_start:\s*(-?[\d.]+)')
+_SILENCE_END = re.compile(r'silence_end:\s*(-?[\d.]+)')
+
+
+class AudioSegmenter:
+    """Cut long audio into Whisper-sized segments without decoding it into memory.
+
+    ffmpeg streams the file twice: once through `silencedetect` to find quiet
+    spots, then through the segment muxer to write mono low-bitrate MP3
+    segments. Cut points are moved to the nearest silence within
+    `silence_window` seconds of each target boundary, so words are not split
+    across segments.
+    """
+
+    def __init__(self, segment_seconds=None, silence_window=None, bitrate=None):
+        self.segment_seconds = segment_seconds or Config.WHISPER_SEGMENT_SECONDS
+        self.silence_window = Config.WHISPER_SILENCE_WINDOW_SECONDS if silence_window is None else silence_window
+        self.bitrate = bitrate or Config.WHISPER_SEGMENT_BITRATE
+
+    @staticmethod
+    def _ffmpeg(binary='ffmpeg'):
+        path = shutil.which(binary)
+        if not path:
+            raise Exception(f"{binary} is required to split long audio files. Please install FFmpeg.")
+        return path
+
+    def probe_duration(self, audio_path):
+        """Duration in seconds as reported by ffprobe"""
+        result = subprocess.run(
+            [self._ffmpeg('ffprobe'), '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
+            capture_output=True, text=True, check=True
+        )
+        return float(result.stdout.strip() or 0)
+
+    def detect_silences(self, audio_path, noise_db=-30, min_silence=0.5):
+        """Midpoints (seconds) of silent stretches, streamed through ffmpeg silencedetect"""
+        process = subprocess.Popen(
+            [self._ffmpeg(), '-hide_banner', '-nostats', '-i', audio_path,
+             '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}', '-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace'
+        )
+        midpoints = []
+        start = None
+        for line in process.stderr:
+            match = _SILENCE_START.search(line)
+            if match:
+                start = float(match.group(1))
+                continue
+            match = _SILENCE_END.search(line)
+            if match and start is not None:
+                midpoints.append((max(start, 0.0) + float(match.group(1))) / 2)
+                start = None
+        process.wait()
+        return midpoints
+
+    def plan_boundaries(self, duration, silences):
+        """Cut points near every `segment_seconds`, snapped to the closest silence in the window"""
+        boundaries = []
+        previous = 0.0
+        target = self.segment_seconds
+        while target < duration - self.silence_window:
+            candidates = [s for s in silences
+                          if abs(s - target) <= self.silence_window and s > previous + 1]
+            cut = min(candidates, key=lambda s: abs(s - target)) if candidates else target
+            boundaries.append(round(cut, 3))
+            previous = cut
+            target = cut + self.segment_seconds
+        return boundaries
+
+    def split(self, audio_path, output_dir):
+        """Write segments to output_dir; returns [(segment_path, start_offset_seconds)] in order
+
+        If ffmpeg does not write one segment per planned cut (e.g. a cut past
+        the real end of a stream whose duration was misreported), the audio is
+        re-split at a fixed length and offsets are taken from the durations of
+        the segments actually written, so no transcript is placed at the
+        wrong time or dropped.
+        """
+        duration = self.probe_duration(audio_path)
+        boundaries = self.plan_boundaries(duration, self.detect_silences(audio_path))
+        if boundaries:
+            paths = self._write_segments(audio_path, output_dir, ['-segment_times', ','.join(str(b) for b in boundaries)])
+        else:
+            paths = self._write_segments(audio_path, output_dir, ['-segment_time', str(self.segment_seconds + self.silence_window)])
+        offsets = [0.0] + boundaries
+
+        if len(paths) != len(offsets):
+            print(f"Expected {len(offsets)} segment(s) but ffmpeg wrote {len(paths)}; re-splitting at fixed length")
+            paths = self._write_segments(audio_path, output_dir, ['-segment_time', str(self.segment_seconds)])
+            offsets = list(accumulate((self.probe_duration(path) for path in paths[:-1]), initial=0.0))
+
+        print(f"Split {duration:.0f}s of audio into {len(paths)} segment(s)")
+        return list(zip(paths, offsets))
+
+    def _write_segments(self, audio_path, output_dir, segment_args):
+        """Run the segment muxer into an emptied output_dir; returns the segment paths in order"""
+        for name in os.listdir(output_dir):
+            if name.startswith('segment_') and name.endswith('.mp3'):
+                os.remove(os.path.join(output_dir, name))
+
+        command = [self._ffmpeg(), '-hide_banner', '-loglevel', 'error', '-y', '-i', audio_path,
+                   '-vn', '-ac', '1', '-ar', '16000', '-c:a', 'libmp3lame', '-b:a', self.bitrate,
+                   '-f', 'segment', '-reset_timestamps', '1', *segment_args]
+        subprocess.run(command + [os.path.join(output_dir, 'segment_%04d.mp3')], capture_output=True, check=True)
+
+        return sorted(
+            os.path.join(output_dir, name) for name in os.listdir(output_dir)
+            if name.startswith('segment_') and name.endswith('.mp3')
+        )
+
+
+def _transcribe_segment(path, offset):
+    with open(path, 'rb') as f:
+        response = openai.Audio.transcribe(model="whisper-1", file=f, response_format="verbose_json")
+
+    segments = [
+        {
+            'start': round(segment['start'] + offset, 2),
+            'end': round(segment['end'] + offset, 2),
+            'text': segment['text'].strip()
+        }
+        for segment in response.get('segments') or []
+    ]
+    return response.get('text', '').strip(), segments
+
+
+def transcribe_segments(segments, max_workers=None):
+    """Transcribe [(path, offset)] concurrently and stitch the results back in order.
+
+    Returns {'transcript', 'segments'} where segment timestamps are relative to
+    the start of the original audio.
+    """
+    max_workers = max(1, min(max_workers or Config.WHISPER_CONCURRENCY, len(segments) or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_transcribe_segment, path, offset) for path, offset in segments]
+        results = []
+        for i, future in enumerate(futures):
+            results.append(future.result())
+            print(f"Transcribed segment {i + 1}/{len(futures)}")
+
+    return {
+        'transcript': ' '.join(text for text, _ in results if text),
+        'segments': [segment for _, timed in results for segment in timed]
+    }
+
+
+def transcribe_long_audio(audio_path, work_dir, max_workers=None):
+    """Split audio that exceeds the Whisper upload limit and transcribe the pieces in parallel"""
+    segment_dir = os.path.join(work_dir, 'segments')
+    os.makedirs(segment_dir, exist_ok=True)
+    try:
+        segments = AudioSegmenter().split(audio_path, segment_dir)
+        if not segments:
+            raise Exception("Audio splitting produced no segments")
+        return transcribe_segments(segments, max_workers)
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
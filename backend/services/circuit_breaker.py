@@ -0,0 +1,125 @@
+import threading
+import time
+import requests
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because its upstream's breaker is open"""
+
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker.
+
+    After `failure_threshold` consecutive upstream failures the breaker opens
+    and calls fail fast for `reset_timeout` seconds. It then lets a single
+    trial call through (half-open): success closes it again, failure re-opens
+    it for another timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or Config.CIRCUIT_RESET_SECONDS
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go to the upstream right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"Circuit '{self.name}' opened after {self._failures} failure(s)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """Run fn through the breaker.
+
+        `is_failure(exc)` decides whether an exception counts against the
+        upstream (e.g. throttling) or is specific to the request (e.g. a video
+        without captions); by default every exception counts.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open)")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            state = self._state
+            if state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                state = self.HALF_OPEN
+            return {'state': state, 'consecutive_failures': self._failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Process-wide breaker for an upstream, created on first use"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def http_get(upstream, url, **kwargs):
+    """requests.get through an upstream's breaker; 429 and 5xx responses count as failures"""
+    breaker = get_breaker(upstream)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{upstream} is temporarily unavailable (circuit open)")
+
+    try:
+        response = requests.get(url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+
+    if response.status_code == 429 or response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
@@ -1,20 +1,193 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from models import Base, Note, Source, Flashcard, Quiz, QuizResult, Deck, DeckCard, Review
+from sqlalchemy import create_engine, inspect, event, func, insert, select, tuple_, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import sessionmaker, Session, joinedload
+import base64
+import threading
+import numpy as np
+from config import Config
+from models import (Base, Note, Source, Flashcard, FlashcardSignature, FlashcardBucket, Quiz, QuizResult, Deck,
+                    DeckCard, Review, CardState, KnowledgeNode, KnowledgeEdge)
+from .search_service import DOC_NOTE, DOC_FLASHCARD
+from .scheduler_service import FSRSScheduler, to_days, from_days
+from .graph_service import normalize_label
+from .minhash import MinHasher, is_empty
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Iterable
+
+# Rows per multi-VALUES statement; keeps deck_cards inserts under SQLite's
+# 999 bound-parameter limit on older builds
+BULK_CHUNK_ROWS = 400
+
+NOTE_PREVIEW_CHARS = 200
+
+
+def create_db_engine(database_url: str) -> Engine:
+    """Engine with the production profile for the database behind `database_url`
+    
+    SQLite files get WAL (readers no longer block the writer), the configured
+    synchronous level and page cache, and a busy timeout so concurrent Flask
+    threads wait for the write lock instead of failing with "database is
+    locked". Server databases (PostgreSQL) get the same pool sizing plus
+    pre-ping/recycle, and the busy timeout becomes lock_timeout.
+    """
+    url = make_url(database_url)
+    
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # In-memory databases live in a single connection; keep SQLAlchemy's pool
+            return create_engine(url)
+        
+        engine = create_engine(
+            url,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            connect_args={'check_same_thread': False, 'timeout': Config.DB_BUSY_TIMEOUT_MS / 1000}
+        )
+        
+        @event.listens_for(engine, 'connect')
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute(f'PRAGMA synchronous={Config.DB_SQLITE_SYNCHRONOUS}')
+            cursor.execute(f'PRAGMA cache_size={-Config.DB_SQLITE_CACHE_SIZE_KB}')
+            cursor.execute(f'PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT_MS}')
+            cursor.close()
+        
+        return engine
+    
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        connect_args['options'] = f'-c lock_timeout={Config.DB_BUSY_TIMEOUT_MS}'
+    return create_engine(
+        url,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args=connect_args
+    )
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine (per thread) while active.
+    
+        with db.count_queries() as counter:
+            db.get_decks()
+        assert counter.count <= 1
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+        self._thread = threading.get_ident()
+    
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+            self.statements.append(statement)
+    
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+    
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
 
 
 class DatabaseService:
-    def __init__(self, database_url: str = "sqlite:///nexlearn.db"):
-        self.engine = create_engine(database_url)
-        Base.metadata.create_all(self.engine)
+    def __init__(self, database_url: str = None, engine: Engine = None, search_index=None):
+        self.engine = engine or create_db_engine(database_url or Config.DATABASE_URL)
+        # Optional SearchIndex kept in step with note and flashcard writes
+        self.search_index = search_index
+        self.scheduler = FSRSScheduler()
+        self.minhasher = MinHasher()
+        self.ensure_schema()
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
     
+    def ensure_schema(self):
+        """Create missing tables and indexes; a no-op beyond one inspection when the schema is current"""
+        inspector = inspect(self.engine)
+        missing = set(Base.metadata.tables) - set(inspector.get_table_names())
+        if missing:
+            Base.metadata.create_all(self.engine)
+            # New tables come with their indexes; re-inspect for the rest
+            inspector = inspect(self.engine)
+        self.ensure_indexes(inspector)
+    
+    def ensure_indexes(self, inspector=None) -> List[str]:
+        """Create any model index missing from an existing database; returns the names created.
+        
+        create_all() only builds indexes together with new tables, so databases
+        created before an index was added to models.py are migrated here.
+        """
+        existing = {}
+        inspector = inspector or inspect(self.engine)
+        for table_name in inspector.get_table_names():
+            existing[table_name] = {index['name'] for index in inspector.get_indexes(table_name)}
+        
+        created = []
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing.get(table.name, set()):
+                    index.create(bind=self.engine, checkfirst=True)
+                    created.append(index.name)
+        if created:
+            print(f"Created {len(created)} missing index(es): {', '.join(created)}")
+        return created
+    
     def get_session(self) -> Session:
         return self.SessionLocal()
     
+    def count_queries(self) -> QueryCounter:
+        """Context manager counting the statements issued inside it"""
+        return QueryCounter(self.engine)
+    
+    # =====================================================
+    # SEARCH INDEX MAINTENANCE
+    # =====================================================
+    
+    def _index(self, doc_type: str, docs: List[tuple]):
+        """Index [(id, title, body)] after a commit; search failures never fail the write"""
+        if not self.search_index or not docs:
+            return
+        try:
+            self.search_index.upsert_many((doc_type, doc_id, title, body) for doc_id, title, body in docs)
+        except Exception as e:
+            print(f"Search index update failed: {e}")
+    
+    def _unindex(self, doc_type: str, doc_ids: List[int]):
+        if not self.search_index or not doc_ids:
+            return
+        try:
+            self.search_index.delete(doc_type, doc_ids)
+        except Exception as e:
+            print(f"Search index update failed: {e}")
+    
+    def rebuild_search_index(self, batch_size: int = 1000) -> Dict:
+        """Re-index every note and flashcard from scratch; returns the counts indexed"""
+        counts = {}
+        for doc_type, columns in ((DOC_NOTE, (Note.id, Note.title, Note.content)),
+                                  (DOC_FLASHCARD, (Flashcard.id, Flashcard.front, Flashcard.back))):
+            self.search_index.clear(doc_type)
+            counts[doc_type], last_id = 0, 0
+            while True:
+                with self.get_session() as session:
+                    rows = session.execute(
+                        select(*columns).where(columns[0] > last_id).order_by(columns[0]).limit(batch_size)
+                    ).all()
+                if not rows:
+                    break
+                self.search_index.upsert_many((doc_type, *row) for row in rows)
+                counts[doc_type] += len(rows)
+                last_id = rows[-1][0]
+        return counts
+    
     # =====================================================
     # NOTES MANAGEMENT
     # =====================================================
@@ -31,33 +204,31 @@ class DatabaseService:
                 topic=metadata.get('topic') if metadata else None
             )
             session.add(note)
-            session.commit()
-            session.refresh(note)
+            # Flush for the note ID; note and sources commit together
+            session.flush()
             
             # Save sources if provided
             if metadata and 'sources' in metadata:
-                for source_info in metadata['sources']:
-                    source = Source(
-                        note_id=note.id,
-                        type=source_info.get('type', 'unknown'),
-                        url=source_info.get('url'),
-                        meta=source_info
-                    )
-                    session.add(source)
-                session.commit()
+                session.add_all([Source(
+                    note_id=note.id,
+                    type=source_info.get('type', 'unknown'),
+                    url=source_info.get('url'),
+                    meta=source_info
+                ) for source_info in metadata['sources']])
             
-            return note.id
+            note_id = note.id
+            session.commit()
+            self._index(DOC_NOTE, [(note_id, title, content)])
+            return note_id
     
     def get_note(self, note_id: int) -> Optional[Dict]:
         """Get a note by ID"""
         with self.get_session() as session:
-            note = session.query(Note).filter(Note.id == note_id).first()
+            # Sources come back in the same round trip
+            note = session.query(Note).options(joinedload(Note.sources)).filter(Note.id == note_id).first()
             if not note:
                 return None
             
-            # Get sources
-            sources = session.query(Source).filter(Source.note_id == note_id).all()
-            
             return {
                 'id': note.id,
                 'title': note.title,
@@ -68,22 +239,79 @@ class DatabaseService:
                 'topic': note.topic,
                 'created_at': note.created_at.isoformat(),
                 'updated_at': note.updated_at.isoformat(),
-                'sources': [{'type': s.type, 'url': s.url, 'meta': s.meta} for s in sources]
+                'sources': [{'type': s.type, 'url': s.url, 'meta': s.meta} for s in note.sources]
             }
     
     def get_notes_list(self, limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Get a list of notes with basic info"""
+        """Get a list of notes with basic info
+        
+        OFFSET paging cost grows with the offset; prefer get_notes_page.
+        """
         with self.get_session() as session:
-            notes = session.query(Note).order_by(Note.created_at.desc()).offset(offset).limit(limit).all()
-            
-            return [{
-                'id': note.id,
-                'title': note.title,
-                'subject': note.subject,
-                'topic': note.topic,
-                'created_at': note.created_at.isoformat(),
-                'content_preview': note.content[:200] + '...' if len(note.content) > 200 else note.content
-            } for note in notes]
+            rows = session.execute(
+                self._note_summary_query().order_by(Note.created_at.desc(), Note.id.desc()).offset(offset).limit(limit)
+            ).all()
+            return [self._note_summary(row) for row in rows]
+    
+    def get_notes_page(self, limit: int = 20, cursor: str = None) -> Dict:
+        """Newest-first page of notes using keyset pagination on (created_at, id)
+        
+        Returns {'notes': [...], 'next_cursor': str or None}; pass next_cursor
+        back to get the following page. Every page costs the same index seek
+        however deep it is. Raises ValueError for a malformed cursor.
+        """
+        query = self._note_summary_query()
+        if cursor:
+            created_at, note_id = self.decode_cursor(cursor)
+            query = query.where(tuple_(Note.created_at, Note.id) < tuple_(created_at, note_id))
+        
+        with self.get_session() as session:
+            # One extra row tells us whether there is a next page
+            rows = session.execute(
+                query.order_by(Note.created_at.desc(), Note.id.desc()).limit(limit + 1)
+            ).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1].created_at, rows[-1].id)
+        return {'notes': [self._note_summary(row) for row in rows], 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def _note_summary_query():
+        # Only the listed columns, and just enough of content for the preview,
+        # so large Markdown bodies never leave the database
+        return select(
+            Note.id, Note.title, Note.subject, Note.topic, Note.created_at,
+            func.substr(Note.content, 1, NOTE_PREVIEW_CHARS + 1).label('preview')
+        )
+    
+    @staticmethod
+    def _note_summary(row) -> Dict:
+        preview = row.preview or ''
+        return {
+            'id': row.id,
+            'title': row.title,
+            'subject': row.subject,
+            'topic': row.topic,
+            'created_at': row.created_at.isoformat(),
+            'content_preview': preview[:NOTE_PREVIEW_CHARS] + '...' if len(preview) > NOTE_PREVIEW_CHARS else preview
+        }
+    
+    @staticmethod
+    def encode_cursor(created_at: datetime, note_id: int) -> str:
+        raw = f"{created_at.isoformat()}|{note_id}".encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """(created_at, id) from an encode_cursor() value"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            created_at, note_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(note_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
     
     def update_note(self, note_id: int, title: str = None, content: str = None) -> bool:
         """Update a note"""
@@ -97,8 +325,10 @@ class DatabaseService:
             if content:
                 note.content = content
             note.updated_at = datetime.utcnow()
+            indexed = (note.id, note.title, note.content)
             
             session.commit()
+            self._index(DOC_NOTE, [indexed])
             return True
     
     def delete_note(self, note_id: int) -> bool:
@@ -112,11 +342,16 @@ class DatabaseService:
             session.query(Source).filter(Source.note_id == note_id).delete()
             
             # Delete related flashcards
+            card_ids = session.scalars(select(Flashcard.id).where(Flashcard.note_id == note_id)).all()
+            session.query(CardState).filter(CardState.card_id.in_(card_ids)).delete(synchronize_session=False)
+            self._delete_signatures(session, card_ids)
             session.query(Flashcard).filter(Flashcard.note_id == note_id).delete()
             
             # Delete the note
             session.delete(note)
             session.commit()
+            self._unindex(DOC_NOTE, [note_id])
+            self._unindex(DOC_FLASHCARD, card_ids)
             return True
     
     # =====================================================
@@ -135,10 +370,96 @@ class DatabaseService:
                 user_approved=user_approved
             )
             session.add(flashcard)
+            session.flush()
+            self._store_signatures(session, [flashcard.id], [None], *self._sign_cards([{'front': front, 'back': back}]))
             session.commit()
             session.refresh(flashcard)
+            self._index(DOC_FLASHCARD, [(flashcard.id, front, back)])
             return flashcard.id
     
+    def save_flashcards_bulk(self, note_id: int, cards: List[Dict], ai_generated: bool = False,
+                             user_approved: bool = False, user_id: int = None) -> List[int]:
+        """Save many flashcards in one transaction; returns their IDs in input order
+        
+        Each card is a dict with 'front' and 'back' (extra keys such as the
+        ones FlashcardService adds are ignored); per-card 'ai_generated' and
+        'user_approved' override the defaults. Cards are saved as given; see
+        save_flashcards_deduplicated to skip near-duplicates.
+        """
+        if not cards:
+            return []
+        
+        rows = self._flashcard_rows(note_id, cards, ai_generated, user_approved, user_id)
+        with self.get_session() as session:
+            card_ids = self._insert_flashcards(session, rows, self._sign_cards(rows))
+            session.commit()
+        
+        self._index(DOC_FLASHCARD, [(card_id, row['front'], row['back']) for card_id, row in zip(card_ids, rows)])
+        return card_ids
+    
+    def save_flashcards_deduplicated(self, note_id: int, cards: List[Dict], ai_generated: bool = False,
+                                     user_approved: bool = False, user_id: int = None,
+                                     threshold: float = None) -> Dict:
+        """Save the cards that are not near-duplicates of the user's existing cards or of each other
+        
+        Near-duplicates are cards whose front and back shingles have an
+        estimated Jaccard similarity of at least `threshold` (default
+        DEDUP_THRESHOLD); candidates come from the LSH bucket index, so the
+        check costs the same however many cards the user has. Returns the
+        new 'card_ids' in input order and 'duplicates', one
+        {'index', 'card_id', 'similarity'} per skipped card, pointing at the
+        card it duplicates.
+        """
+        if not cards:
+            return {'card_ids': [], 'duplicates': []}
+        threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+        
+        rows = self._flashcard_rows(note_id, cards, ai_generated, user_approved, user_id)
+        signatures, keys = self._sign_cards(rows)
+        with self.get_session() as session:
+            stored = self._near_duplicates(session, signatures, keys, user_id, threshold)
+            fresh = [i for i, match in enumerate(stored) if match is None]
+            within = self.minhasher.duplicates_within(signatures[fresh], keys[fresh], threshold)
+            kept = [i for i, match in zip(fresh, within) if match is None]
+            card_ids = self._insert_flashcards(session, [rows[i] for i in kept], (signatures[kept], keys[kept]))
+            session.commit()
+        
+        new_ids = dict(zip(kept, card_ids))
+        duplicates = [(i, *match) for i, match in enumerate(stored) if match is not None]
+        for i, match in zip(fresh, within):
+            if match is not None:
+                duplicates.append((i, new_ids[fresh[match[0]]], match[1]))
+        self._index(DOC_FLASHCARD, [(new_ids[i], rows[i]['front'], rows[i]['back']) for i in kept])
+        return {
+            'card_ids': card_ids,
+            'duplicates': [{'index': i, 'card_id': card_id, 'similarity': round(similarity, 3)}
+                           for i, card_id, similarity in sorted(duplicates)]
+        }
+    
+    @staticmethod
+    def _flashcard_rows(note_id: int, cards: List[Dict], ai_generated: bool, user_approved: bool,
+                        user_id: int) -> List[Dict]:
+        return [{
+            'user_id': user_id,
+            'note_id': note_id,
+            'front': card['front'],
+            'back': card['back'],
+            'ai_generated': card.get('ai_generated', ai_generated),
+            'user_approved': card.get('user_approved', user_approved),
+            'quality_score': card.get('quality_score')
+        } for card in cards]
+    
+    def _insert_flashcards(self, session, rows: List[Dict], signed: tuple) -> List[int]:
+        """Insert flashcard rows with their (signatures, band keys); returns IDs in row order"""
+        if not rows:
+            return []
+        result = session.execute(
+            insert(Flashcard).returning(Flashcard.id, sort_by_parameter_order=True), rows
+        )
+        card_ids = list(result.scalars())
+        self._store_signatures(session, card_ids, [row['user_id'] for row in rows], *signed)
+        return card_ids
+    
     def get_flashcards_by_note(self, note_id: int) -> List[Dict]:
         """Get all flashcards for a note"""
         with self.get_session() as session:
@@ -171,8 +492,13 @@ class DatabaseService:
             if quality_score is not None:
                 card.quality_score = quality_score
             card.updated_at = datetime.utcnow()
+            indexed = (card.id, card.front, card.back)
+            if front or back:
+                self._delete_signatures(session, [card.id])
+                self._store_signatures(session, [card.id], [card.user_id], *self._sign_cards([{'front': card.front, 'back': card.back}]))
             
             session.commit()
+            self._index(DOC_FLASHCARD, [indexed])
             return True
     
     def delete_flashcard(self, card_id: int) -> bool:
@@ -182,10 +508,130 @@ class DatabaseService:
             if not card:
                 return False
             
+            session.query(CardState).filter(CardState.card_id == card_id).delete()
+            self._delete_signatures(session, [card_id])
             session.delete(card)
             session.commit()
+            self._unindex(DOC_FLASHCARD, [card_id])
             return True
     
+    # =====================================================
+    # FLASHCARD NEAR-DUPLICATE INDEX
+    # =====================================================
+    
+    def _sign_cards(self, cards: List[Dict]) -> tuple:
+        """(MinHash signatures, LSH band keys) of each card's front and back"""
+        signatures = self.minhasher.signatures([f"{card['front']}\n{card['back']}" for card in cards])
+        return signatures, self.minhasher.band_keys(signatures)
+    
+    def _store_signatures(self, session, card_ids: List[int], user_ids: List[Optional[int]],
+                          signatures: np.ndarray, keys: np.ndarray):
+        """Add cards to the duplicate index; cards without any text to compare are left out"""
+        indexed = [i for i in range(len(card_ids)) if not is_empty(signatures[i])]
+        if not indexed:
+            return
+        session.execute(insert(FlashcardSignature), [
+            {'card_id': card_ids[i], 'user_id': user_ids[i], 'minhash': self.minhasher.to_bytes(signatures[i])}
+            for i in indexed
+        ])
+        session.execute(insert(FlashcardBucket), [
+            {'card_id': card_ids[i], 'user_id': user_ids[i], 'bucket': key}
+            for i in indexed for key in keys[i].tolist()
+        ])
+    
+    def _delete_signatures(self, session, card_ids: List[int]):
+        for i in range(0, len(card_ids), BULK_CHUNK_ROWS):
+            chunk = card_ids[i:i + BULK_CHUNK_ROWS]
+            session.execute(FlashcardSignature.__table__.delete().where(FlashcardSignature.card_id.in_(chunk)))
+            session.execute(FlashcardBucket.__table__.delete().where(FlashcardBucket.card_id.in_(chunk)))
+    
+    def _near_duplicates(self, session, signatures: np.ndarray, keys: np.ndarray, user_id: int,
+                         threshold: float) -> List[Optional[tuple]]:
+        """For each signature, (card ID, similarity) of the user's most similar indexed card at or above threshold
+        
+        Only cards sharing at least one bucket are compared: one index scan
+        per BULK_CHUNK_ROWS bucket keys, then one signature load for the
+        candidates.
+        """
+        rows_by_key = {}
+        for i, row_keys in enumerate(keys.tolist()):
+            if not is_empty(signatures[i]):
+                for key in row_keys:
+                    rows_by_key.setdefault(key, []).append(i)
+        
+        candidates = [set() for _ in range(len(signatures))]
+        bucket_keys = list(rows_by_key)
+        for start in range(0, len(bucket_keys), BULK_CHUNK_ROWS):
+            for card_id, bucket in session.execute(
+                select(FlashcardBucket.card_id, FlashcardBucket.bucket)
+                .where(self._user_filter(FlashcardBucket.user_id, user_id),
+                       FlashcardBucket.bucket.in_(bucket_keys[start:start + BULK_CHUNK_ROWS]))
+            ):
+                for i in rows_by_key[bucket]:
+                    candidates[i].add(card_id)
+        
+        card_ids = sorted(set().union(*candidates))
+        stored = {}
+        for start in range(0, len(card_ids), BULK_CHUNK_ROWS):
+            stored.update(session.execute(
+                select(FlashcardSignature.card_id, FlashcardSignature.minhash)
+                .where(FlashcardSignature.card_id.in_(card_ids[start:start + BULK_CHUNK_ROWS]))
+            ).all())
+        position = {card_id: n for n, card_id in enumerate(stored)}
+        stored_signatures = self.minhasher.from_bytes(list(stored.values()))
+        
+        result = []
+        for i, matched in enumerate(candidates):
+            matched = sorted(card_id for card_id in matched if card_id in position)
+            if not matched:
+                result.append(None)
+                continue
+            similarities = self.minhasher.similarity(
+                signatures[i], stored_signatures[[position[card_id] for card_id in matched]]
+            )
+            best = int(similarities.argmax())
+            result.append((matched[best], float(similarities[best])) if similarities[best] >= threshold else None)
+        return result
+    
+    def find_duplicate_flashcards(self, cards: List[Dict], user_id: int = None,
+                                  threshold: float = None) -> List[Optional[Dict]]:
+        """For each {'front', 'back'} card, {'card_id', 'similarity'} of the user's closest stored card
+        at or above `threshold` (default DEDUP_THRESHOLD), else None"""
+        if not cards:
+            return []
+        threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+        with self.get_session() as session:
+            matches = self._near_duplicates(session, *self._sign_cards(cards), user_id, threshold)
+        return [None if match is None else {'card_id': match[0], 'similarity': round(match[1], 3)}
+                for match in matches]
+    
+    def rebuild_flashcard_signatures(self, batch_size: int = 2000) -> Dict:
+        """Re-sign every flashcard (after changing DEDUP_BANDS/DEDUP_BAND_ROWS, or for cards saved before
+        the index existed), one batch of cards per transaction"""
+        cards, last_id = 0, 0
+        while True:
+            with self.get_session() as session:
+                rows = session.execute(
+                    select(Flashcard.id, Flashcard.user_id, Flashcard.front, Flashcard.back)
+                    .where(Flashcard.id > last_id).order_by(Flashcard.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    # Signatures left behind by cards deleted outside DatabaseService
+                    for model in (FlashcardSignature, FlashcardBucket):
+                        session.execute(model.__table__.delete().where(
+                            ~exists().where(Flashcard.id == model.card_id)
+                        ))
+                    session.commit()
+                    break
+                card_ids = [row.id for row in rows]
+                self._delete_signatures(session, card_ids)
+                self._store_signatures(session, card_ids, [row.user_id for row in rows],
+                                       *self._sign_cards([{'front': row.front, 'back': row.back} for row in rows]))
+                session.commit()
+            cards += len(rows)
+            last_id = rows[-1].id
+        return {'cards': cards}
+    
     # =====================================================
     # QUIZ MANAGEMENT
     # =====================================================
@@ -262,20 +708,425 @@ class DatabaseService:
             session.commit()
             return True
     
-    def get_decks(self) -> List[Dict]:
-        """Get all decks"""
+    def add_cards_to_deck_bulk(self, deck_id: int, card_ids: Iterable[int]) -> int:
+        """Add many flashcards to a deck in one transaction; returns how many were new
+        
+        Cards already in the deck are skipped via ON CONFLICT DO NOTHING on
+        uq_deck_card where the dialect supports it.
+        """
+        card_ids = list(dict.fromkeys(card_ids))
+        if not card_ids:
+            return 0
+        
         with self.get_session() as session:
-            decks = session.query(Deck).order_by(Deck.created_at.desc()).all()
+            dialect = self.engine.dialect.name
+            if dialect not in ('sqlite', 'postgresql'):
+                existing = set(session.scalars(
+                    select(DeckCard.card_id).where(DeckCard.deck_id == deck_id, DeckCard.card_id.in_(card_ids))
+                ))
+                card_ids = [card_id for card_id in card_ids if card_id not in existing]
             
-            result = []
-            for deck in decks:
-                card_count = session.query(DeckCard).filter(DeckCard.deck_id == deck.id).count()
-                result.append({
-                    'id': deck.id,
-                    'name': deck.name,
-                    'description': deck.description,
-                    'card_count': card_count,
-                    'created_at': deck.created_at.isoformat()
-                })
+            added = 0
+            for i in range(0, len(card_ids), BULK_CHUNK_ROWS):
+                rows = [{'deck_id': deck_id, 'card_id': card_id} for card_id in card_ids[i:i + BULK_CHUNK_ROWS]]
+                if dialect == 'sqlite':
+                    stmt = sqlite.insert(DeckCard).values(rows).on_conflict_do_nothing(
+                        index_elements=['deck_id', 'card_id']
+                    )
+                elif dialect == 'postgresql':
+                    stmt = postgresql.insert(DeckCard).values(rows).on_conflict_do_nothing(
+                        constraint='uq_deck_card'
+                    )
+                else:
+                    stmt = insert(DeckCard).values(rows)
+                added += session.execute(stmt).rowcount
             
-            return result
+            session.commit()
+            return added
+    
+    def get_decks(self, now: datetime = None) -> List[Dict]:
+        """Get all decks, with how many of their cards are due at `now` (default: current time)"""
+        now = now or datetime.utcnow()
+        with self.get_session() as session:
+            # One grouped count over deck_cards instead of a COUNT per deck;
+            # due cards come from card_state by primary key, no history replay
+            card_counts = session.query(
+                DeckCard.deck_id,
+                func.count(DeckCard.id).label('card_count'),
+                func.count(CardState.card_id).label('due_count')
+            ).outerjoin(
+                CardState, (CardState.card_id == DeckCard.card_id) & (CardState.due_at <= now)
+            ).group_by(DeckCard.deck_id).subquery()
+            
+            rows = session.query(
+                Deck, func.coalesce(card_counts.c.card_count, 0), func.coalesce(card_counts.c.due_count, 0)
+            ).outerjoin(
+                card_counts, card_counts.c.deck_id == Deck.id
+            ).order_by(Deck.created_at.desc()).all()
+            
+            return [{
+                'id': deck.id,
+                'name': deck.name,
+                'description': deck.description,
+                'card_count': card_count,
+                'due_count': due_count,
+                'created_at': deck.created_at.isoformat()
+            } for deck, card_count, due_count in rows]
+    
+    # =====================================================
+    # REVIEWS
+    # =====================================================
+    
+    def record_review(self, card_id: int, rating: int, user_id: int = None,
+                      review_time_ms: int = 0, reviewed_at: datetime = None) -> Optional[Dict]:
+        """Record one review and schedule the card's next one; None if the card doesn't exist
+        
+        The card's card_state row is stepped by the new rating and saved in
+        the same transaction as the Review, so no history is read. A card
+        without a state row, or a review older than the card's last one, is
+        rescheduled from its full history instead.
+        """
+        if rating not in (1, 2, 3, 4):
+            raise ValueError("rating must be 1-4")
+        reviewed_at = self._parse_timestamp(reviewed_at) or datetime.utcnow()
+        
+        with self.get_session() as session:
+            if session.get(Flashcard, card_id) is None:
+                return None
+            card_state = session.get(CardState, card_id)
+            review = Review(
+                card_id=card_id,
+                user_id=user_id,
+                rating=rating,
+                review_time_ms=review_time_ms,
+                reviewed_at=reviewed_at
+            )
+            session.add(review)
+            
+            if card_state is not None and reviewed_at >= card_state.last_review:
+                schedule = self.scheduler.next_state({
+                    'stability': card_state.stability,
+                    'difficulty': card_state.difficulty,
+                    'reps': card_state.reps,
+                    'lapses': card_state.lapses,
+                    'last_review': card_state.last_review
+                }, reviewed_at, rating)
+                for key, value in schedule.items():
+                    setattr(card_state, key, value)
+                card_state.user_id = user_id
+            else:
+                session.flush()
+                self._reschedule(session, card_ids=[card_id])
+                card_state = session.get(CardState, card_id, populate_existing=True)
+            
+            # The review row logs the schedule it produced; a back-dated review
+            # changes the card's state but didn't produce it
+            if card_state.last_review == reviewed_at:
+                review.state = card_state.state
+                review.scheduled_days = card_state.scheduled_days
+                review.due_at = card_state.due_at
+            result = self._card_state_dict(card_state)
+            session.commit()
+        
+        return result
+    
+    def record_reviews_bulk(self, reviews: List[Dict]) -> int:
+        """Insert a batch of reviews (e.g. an offline sync) in one transaction
+        
+        Each review needs 'card_id' and a 'rating' of 1..4; 'user_id',
+        'review_time_ms' and 'reviewed_at' are optional. Timestamps may be
+        datetimes or ISO strings. The affected cards are rescheduled in the
+        same transaction. The whole batch is rejected with ValueError if any
+        review is invalid or names a card that doesn't exist.
+        """
+        rows = []
+        for i, review in enumerate(reviews):
+            rating = review.get('rating')
+            if review.get('card_id') is None or rating not in (1, 2, 3, 4):
+                raise ValueError(f"Review {i} needs a card_id and a rating of 1-4")
+            rows.append({
+                'card_id': review['card_id'],
+                'user_id': review.get('user_id'),
+                'rating': rating,
+                'review_time_ms': review.get('review_time_ms', 0),
+                'reviewed_at': self._parse_timestamp(review.get('reviewed_at')) or datetime.utcnow()
+            })
+        if not rows:
+            return 0
+        
+        card_ids = sorted({row['card_id'] for row in rows})
+        with self.get_session() as session:
+            existing = set()
+            for i in range(0, len(card_ids), BULK_CHUNK_ROWS):
+                existing.update(session.scalars(
+                    select(Flashcard.id).where(Flashcard.id.in_(card_ids[i:i + BULK_CHUNK_ROWS]))
+                ))
+            unknown = [card_id for card_id in card_ids if card_id not in existing]
+            if unknown:
+                raise ValueError(f"Unknown card_id(s): {', '.join(map(str, unknown))}")
+            
+            session.execute(insert(Review), rows)
+            self._reschedule(session, card_ids=card_ids)
+            session.commit()
+        return len(rows)
+    
+    def reschedule(self, user_id: int = None, card_ids: Iterable[int] = None) -> Dict:
+        """Recompute the card_state of a user's cards (or just `card_ids`) from the full review log"""
+        with self.get_session() as session:
+            cards = self._reschedule(session, user_id=user_id, card_ids=card_ids)
+            session.commit()
+        return {'cards': cards}
+    
+    def rebuild_card_state(self, batch_size: int = 5000) -> Dict:
+        """Rebuild card_state for every card by replaying the reviews table, one batch of cards per transaction"""
+        cards, last_id = 0, 0
+        while True:
+            with self.get_session() as session:
+                card_ids = session.scalars(
+                    select(Flashcard.id).where(Flashcard.id > last_id).order_by(Flashcard.id).limit(batch_size)
+                ).all()
+                if not card_ids:
+                    # States left behind by cards deleted outside DatabaseService
+                    session.execute(CardState.__table__.delete().where(
+                        ~exists().where(Flashcard.id == CardState.card_id)
+                    ))
+                    session.commit()
+                    break
+                cards += self._reschedule(session, card_ids=card_ids)
+                session.commit()
+            last_id = card_ids[-1]
+        return {'cards': cards}
+    
+    def _reschedule(self, session, user_id: int = None, card_ids: Iterable[int] = None) -> int:
+        """Replay review histories in bulk and replace the matching card_state rows"""
+        if card_ids is not None:
+            card_ids = list(card_ids)
+            scopes = [(Review.card_id.in_(chunk), CardState.card_id.in_(chunk))
+                      for chunk in (card_ids[i:i + BULK_CHUNK_ROWS] for i in range(0, len(card_ids), BULK_CHUNK_ROWS))]
+        else:
+            scopes = [(self._user_filter(Review.user_id, user_id), self._user_filter(CardState.user_id, user_id))]
+        
+        rows = []
+        for review_scope, _ in scopes:
+            rows += session.execute(
+                select(Review.card_id, Review.user_id, Review.reviewed_at, Review.rating)
+                .where(review_scope).order_by(Review.card_id, Review.reviewed_at)
+            ).all()
+        for _, state_scope in scopes:
+            session.execute(CardState.__table__.delete().where(state_scope))
+        if not rows:
+            return 0
+        
+        cards, users, reviewed_at, ratings = zip(*rows)
+        result = self.scheduler.replay(np.array(cards), to_days(reviewed_at), np.array(ratings))
+        session.execute(insert(CardState), [{
+            'card_id': int(result['card_id'][i]),
+            'user_id': users[row],
+            'stability': float(result['stability'][i]),
+            'difficulty': float(result['difficulty'][i]),
+            'state': int(result['state'][i]),
+            'reps': int(result['reps'][i]),
+            'lapses': int(result['lapses'][i]),
+            'last_review': reviewed_at[row],
+            'last_rating': int(result['last_rating'][i]),
+            'scheduled_days': float(result['interval'][i]),
+            'due_at': from_days(result['due'][i])
+        } for i, row in enumerate(result['latest_row'])])
+        return len(result['card_id'])
+    
+    def get_due_queue(self, user_id: int = None, now: datetime = None, limit: int = 50,
+                      new_limit: int = None) -> Dict:
+        """Cards due for review (most overdue first) plus a few never-reviewed cards
+        
+        Due cards come from one range scan on ix_card_state_user_due; new cards
+        are the oldest flashcards without a card_state row.
+        """
+        now = now or datetime.utcnow()
+        new_limit = Config.SRS_NEW_CARDS_PER_QUEUE if new_limit is None else new_limit
+        due_filter = (self._user_filter(CardState.user_id, user_id), CardState.due_at <= now)
+        
+        with self.get_session() as session:
+            due = session.execute(
+                select(CardState.card_id, CardState.due_at, CardState.state, CardState.scheduled_days,
+                       Flashcard.front, Flashcard.back)
+                .join(Flashcard, Flashcard.id == CardState.card_id)
+                .where(*due_filter).order_by(CardState.due_at).limit(limit)
+            ).all()
+            due_count = session.scalar(select(func.count()).select_from(CardState).where(*due_filter))
+            new = session.execute(
+                select(Flashcard.id, Flashcard.front, Flashcard.back)
+                .where(self._user_filter(Flashcard.user_id, user_id),
+                       ~exists().where(CardState.card_id == Flashcard.id))
+                .order_by(Flashcard.id).limit(new_limit)
+            ).all() if new_limit else []
+        
+        return {
+            'due': [{
+                'card_id': row.card_id,
+                'front': row.front,
+                'back': row.back,
+                'due_at': row.due_at.isoformat(),
+                'state': row.state,
+                'scheduled_days': row.scheduled_days
+            } for row in due],
+            'due_count': due_count,
+            'new': [{'card_id': row.id, 'front': row.front, 'back': row.back} for row in new]
+        }
+    
+    @staticmethod
+    def _card_state_dict(card_state: CardState) -> Dict:
+        return {
+            'card_id': card_state.card_id,
+            'stability': round(card_state.stability, 4),
+            'difficulty': round(card_state.difficulty, 4),
+            'state': card_state.state,
+            'reps': card_state.reps,
+            'lapses': card_state.lapses,
+            'scheduled_days': card_state.scheduled_days,
+            'due_at': card_state.due_at.isoformat()
+        }
+    
+    # =====================================================
+    # KNOWLEDGE GRAPH
+    # =====================================================
+    
+    def add_knowledge_nodes(self, labels: List[str], user_id: int = None) -> List[int]:
+        """Create concept nodes in one transaction; returns their IDs in input order"""
+        if not labels:
+            return []
+        
+        with self.get_session() as session:
+            result = session.execute(
+                insert(KnowledgeNode).returning(KnowledgeNode.id, sort_by_parameter_order=True),
+                [{'user_id': user_id, 'label': label} for label in labels]
+            )
+            node_ids = list(result.scalars())
+            session.commit()
+        return node_ids
+    
+    def add_knowledge_edges(self, edges: List[Dict], user_id: int = None) -> List[int]:
+        """Create edges in one transaction; returns their IDs in input order
+        
+        Each edge needs 'source_node_id', 'target_node_id' and a 'relation'.
+        The whole batch is rejected with ValueError if any edge is invalid.
+        """
+        rows = []
+        for i, edge in enumerate(edges):
+            if edge.get('source_node_id') is None or edge.get('target_node_id') is None or not edge.get('relation'):
+                raise ValueError(f"Edge {i} needs a source_node_id, target_node_id and relation")
+            rows.append({
+                'user_id': user_id,
+                'source_node_id': edge['source_node_id'],
+                'target_node_id': edge['target_node_id'],
+                'relation': edge['relation']
+            })
+        if not rows:
+            return []
+        
+        with self.get_session() as session:
+            result = session.execute(
+                insert(KnowledgeEdge).returning(KnowledgeEdge.id, sort_by_parameter_order=True), rows
+            )
+            edge_ids = list(result.scalars())
+            session.commit()
+        return edge_ids
+    
+    def upsert_knowledge_graph(self, labels: Dict[str, str], edges: Iterable[tuple], user_id: int = None) -> Dict:
+        """Merge nodes and edges into a user's graph in one transaction
+        
+        `labels` maps caller keys to display labels; `edges` are
+        (source key, target key, relation). A label whose normalized form
+        (see normalize_label) the user already has reuses that node, and an
+        existing (source, target, relation) edge is not inserted again.
+        Returns 'node_ids' (key -> node ID) and the 'created_nodes' and
+        'created_edges' rows, shaped like get_knowledge_graph's.
+        """
+        with self.get_session() as session:
+            existing = {}
+            for node_id, label in session.execute(
+                select(KnowledgeNode.id, KnowledgeNode.label)
+                .where(self._user_filter(KnowledgeNode.user_id, user_id)).order_by(KnowledgeNode.id)
+            ):
+                existing.setdefault(normalize_label(label), node_id)
+            
+            normalized = {key: normalize_label(label) for key, label in labels.items()}
+            new_labels = {}
+            for key, label in labels.items():
+                if normalized[key] and normalized[key] not in existing:
+                    new_labels.setdefault(normalized[key], label)
+            created_nodes = []
+            if new_labels:
+                result = session.execute(
+                    insert(KnowledgeNode).returning(KnowledgeNode.id, sort_by_parameter_order=True),
+                    [{'user_id': user_id, 'label': label} for label in new_labels.values()]
+                )
+                created_nodes = list(zip(result.scalars(), new_labels.values()))
+                existing.update(zip(new_labels, (node_id for node_id, _ in created_nodes)))
+            node_ids = {key: existing[value] for key, value in normalized.items() if value}
+            
+            wanted = list(dict.fromkeys(
+                (node_ids[source], node_ids[target], relation) for source, target, relation in edges
+                if source in node_ids and target in node_ids and node_ids[source] != node_ids[target]
+            ))
+            sources = list({edge[0] for edge in wanted})
+            present = set()
+            for i in range(0, len(sources), BULK_CHUNK_ROWS):
+                present.update(session.execute(
+                    select(KnowledgeEdge.source_node_id, KnowledgeEdge.target_node_id, KnowledgeEdge.relation)
+                    .where(self._user_filter(KnowledgeEdge.user_id, user_id),
+                           KnowledgeEdge.source_node_id.in_(sources[i:i + BULK_CHUNK_ROWS]))
+                ).tuples())
+            new_edges = [edge for edge in wanted if edge not in present]
+            created_edges = []
+            if new_edges:
+                result = session.execute(
+                    insert(KnowledgeEdge).returning(KnowledgeEdge.id, sort_by_parameter_order=True),
+                    [{'user_id': user_id, 'source_node_id': source, 'target_node_id': target, 'relation': relation}
+                     for source, target, relation in new_edges]
+                )
+                created_edges = [(edge_id, *edge) for edge_id, edge in zip(result.scalars(), new_edges)]
+            
+            session.commit()
+        return {'node_ids': node_ids, 'created_nodes': created_nodes, 'created_edges': created_edges}
+    
+    def get_knowledge_graph(self, user_id: int = None, after_node_id: int = 0, after_edge_id: int = 0) -> Dict:
+        """A user's graph rows with IDs past the given watermarks (all rows by default)
+        
+        Returns (id, label) 'nodes', (id, source, target, relation) 'edges'
+        and 'edge_count', the user's total number of edges, so callers holding
+        an earlier load can tell whether edges were deleted since.
+        """
+        with self.get_session() as session:
+            nodes = session.execute(
+                select(KnowledgeNode.id, KnowledgeNode.label)
+                .where(self._user_filter(KnowledgeNode.user_id, user_id), KnowledgeNode.id > after_node_id)
+            ).all()
+            edges = session.execute(
+                select(KnowledgeEdge.id, KnowledgeEdge.source_node_id, KnowledgeEdge.target_node_id,
+                       KnowledgeEdge.relation)
+                .where(self._user_filter(KnowledgeEdge.user_id, user_id), KnowledgeEdge.id > after_edge_id)
+            ).all()
+            edge_count = session.scalar(
+                select(func.count()).select_from(KnowledgeEdge)
+                .where(self._user_filter(KnowledgeEdge.user_id, user_id))
+            )
+        return {'nodes': nodes, 'edges': edges, 'edge_count': edge_count}
+    
+    @staticmethod
+    def _user_filter(column, user_id):
+        # Without accounts every row has user_id NULL
+        return column.is_(None) if user_id is None else column == user_id
+    
+    @staticmethod
+    def _parse_timestamp(value) -> Optional[datetime]:
+        """ISO 8601 string or datetime -> naive UTC datetime (offsets are converted, not dropped)"""
+        if value is None:
+            return None
+        if not isinstance(value, datetime):
+            try:
+                value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError(f"Invalid timestamp: {value!r}")
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
@@ -7,17 +7,22 @@ import json
 import re
 from typing import List, Dict, Any, Optional
 from .openai_service import OpenAIService
+from .text_chunker import TextChunker, count_tokens
+from .minhash import MinHasher
 
 class FlashcardService:
     def __init__(self):
         self.openai_service = OpenAIService()
+        self.chunker = TextChunker()
+        self.minhasher = MinHasher()
     
     def generate_flashcards_from_note(
         self, 
         content: str, 
         title: str = "", 
         card_count: int = 10,
-        difficulty: str = "mixed"
+        difficulty: str = "mixed",
+        use_cache: bool = True
     ) -> List[Dict[str, Any]]:
         """
         從筆記內容生成閃卡
@@ -27,13 +32,14 @@ class FlashcardService:
             title: 筆記標題
             card_count: 要生成的卡片數量
             difficulty: 難度設定 (easy/mixed/hard)
+            use_cache: 是否使用 LLM 回應快取（False 時強制重新生成）
             
         Returns:
             生成的閃卡列表
         """
         try:
             # 使用自定義高質量 prompt 生成閃卡
-            response = self._generate_with_custom_prompt(content, title, card_count, difficulty)
+            response = self._generate_with_custom_prompt(content, title, card_count, difficulty, use_cache)
             
             # 解析和轉換為統一格式
             if isinstance(response, str):
@@ -176,12 +182,17 @@ class FlashcardService:
                 cleaned_card['hint'] = None
             
             validated.append(cleaned_card)
-            
-            # 達到目標數量就停止
-            if len(validated) >= target_count:
-                break
         
-        return validated
+        # 重疊切塊常產生近似重複的卡片，先去重再截取目標數量
+        return self._drop_near_duplicates(validated)[:target_count]
+    
+    def _drop_near_duplicates(self, flashcards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """移除與前面卡片近似重複的卡片（MinHash/LSH，只比較同桶的候選）"""
+        if len(flashcards) < 2:
+            return flashcards
+        signatures = self.minhasher.signatures([f"{card['question']}\n{card['answer']}" for card in flashcards])
+        duplicates = self.minhasher.duplicates_within(signatures, self.minhasher.band_keys(signatures))
+        return [card for card, duplicate in zip(flashcards, duplicates) if duplicate is None]
     
     def _normalize_difficulty(self, difficulty: Any) -> int:
         """標準化難度值"""
@@ -232,18 +243,25 @@ class FlashcardService:
         
         return flashcards
     
-    def _generate_with_custom_prompt(self, content: str, title: str, card_count: int, difficulty: str) -> str:
+    def _generate_with_custom_prompt(
+        self, content: str, title: str, card_count: int, difficulty: str, use_cache: bool = True
+    ) -> str:
         """使用自定義高質量 prompt 生成閃卡"""
         
         # 構建高質量的專業 prompt
         prompt = self._build_enhanced_flashcard_prompt(content, title, card_count, difficulty)
         
         try:
+            # 長筆記按 token 切塊，各塊並行生成後依序合併
+            if self.chunker.needs_chunking(content):
+                return self._generate_chunked(content, card_count, difficulty, use_cache)
+            
             # 直接使用現有的 OpenAI 閃卡生成方法
             response = self.openai_service.generate_flashcards(
                 notes=content,
                 count=card_count,
-                difficulty=difficulty
+                difficulty=difficulty,
+                use_cache=use_cache
             )
             return response
             
@@ -252,6 +270,44 @@ class FlashcardService:
             # 生成備用閃卡
             return self._generate_fallback_cards(content, card_count)
     
+    def _generate_chunked(
+        self, content: str, card_count: int, difficulty: str, use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        """將長筆記切塊，按各塊 token 比例分配卡片數量並行生成"""
+        chunks = self.chunker.split(content)
+        counts = self._allocate_card_counts([count_tokens(c) for c in chunks], card_count)
+        
+        def generate(i):
+            if counts[i] == 0:
+                return []
+            try:
+                cards = self.openai_service.generate_flashcards(
+                    notes=chunks[i],
+                    count=counts[i],
+                    difficulty=difficulty,
+                    use_cache=use_cache
+                )
+                return cards if isinstance(cards, list) else []
+            except Exception as e:
+                print(f"第 {i+1} 塊閃卡生成失敗: {str(e)}")
+                return []
+        
+        flashcards = []
+        for cards in self.openai_service.map_concurrently(generate, len(chunks)):
+            flashcards.extend(cards)
+        return flashcards
+    
+    @staticmethod
+    def _allocate_card_counts(chunk_tokens: List[int], card_count: int) -> List[int]:
+        """按 token 比例分配卡片數量（最大餘數法，總數不變）"""
+        total = sum(chunk_tokens) or 1
+        shares = [card_count * t / total for t in chunk_tokens]
+        counts = [int(share) for share in shares]
+        remainder = card_count - sum(counts)
+        for i in sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)[:remainder]:
+            counts[i] += 1
+        return counts
+    
     def _build_enhanced_flashcard_prompt(self, content: str, title: str, card_count: int, difficulty: str) -> str:
         """構建增強的閃卡生成 prompt"""
         
@@ -1,7 +1,8 @@
 import google.generativeai as genai
-import requests
 import re
 from config import Config
+from .transcript_store import get_transcript_store
+from .circuit_breaker import http_get
 
 class GeminiService:
     def __init__(self):
@@ -17,6 +18,11 @@ class GeminiService:
         try:
             print(f"GeminiService: Trying smart extraction for video {video_id}")
             
+            store = get_transcript_store()
+            cached = store.get(video_id)
+            if cached:
+                return cached['transcript']
+            
             # Method 1: Try different YouTube transcript endpoints
             transcript_endpoints = [
                 f"https://www.youtube.com/api/timedtext?v={video_id}&lang=en&fmt=json3",
@@ -40,7 +46,7 @@ class GeminiService:
             for endpoint in transcript_endpoints:
                 try:
                     print(f"Trying endpoint: {endpoint}")
-                    response = requests.get(endpoint, headers=headers, timeout=10)
+                    response = http_get('timedtext', endpoint, headers=headers, timeout=10)
                     
                     if response.status_code == 200 and response.content:
                         content = response.text
@@ -50,7 +56,7 @@ class GeminiService:
                         
                         if transcript_text and len(transcript_text.strip()) > 50:
                             print(f"Success with endpoint: {endpoint}")
-                            return transcript_text.strip()
+                            return GeminiService._remember(store, video_id, transcript_text)
                             
                 except Exception as e:
                     print(f"Endpoint failed: {endpoint}, error: {e}")
@@ -60,7 +66,7 @@ class GeminiService:
             video_url = f"https://www.youtube.com/watch?v={video_id}"
             try:
                 print(f"Trying video page: {video_url}")
-                response = requests.get(video_url, headers=headers, timeout=15)
+                response = http_get('timedtext', video_url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     content = response.text
@@ -70,11 +76,11 @@ class GeminiService:
                     
                     for url in transcript_urls:
                         try:
-                            transcript_response = requests.get(url, headers=headers, timeout=10)
+                            transcript_response = http_get('timedtext', url, headers=headers, timeout=10)
                             if transcript_response.status_code == 200:
                                 transcript_text = GeminiService._extract_text_from_response(transcript_response.text)
                                 if transcript_text and len(transcript_text.strip()) > 50:
-                                    return transcript_text.strip()
+                                    return GeminiService._remember(store, video_id, transcript_text)
                         except:
                             continue
                             
@@ -87,6 +93,19 @@ class GeminiService:
             print(f"GeminiService smart extraction failed: {e}")
             return None
     
+    @staticmethod
+    def _remember(store, video_id, transcript_text):
+        """Store an extracted transcript so other services can reuse it"""
+        transcript_text = transcript_text.strip()
+        store.put(video_id, {
+            'video_id': video_id,
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'transcript': transcript_text,
+            'duration': 0,
+            'method': 'gemini_smart'
+        })
+        return transcript_text
+    
     @staticmethod
     def _extract_text_from_response(content):
         """Extract text from various transcript formats"""
@@ -0,0 +1,340 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from config import Config
+
+# KnowledgeEdge.relation values
+RELATION_PREREQUISITE = 'prerequisite_of'  # source should be studied before target
+RELATION_SUBTOPIC = 'has_subtopic'  # source heading contains target heading
+RELATION_MENTIONS = 'mentions'  # source heading's section introduces target term
+RELATION_RELATED = 'related_to'
+DIRECTIONS = ('out', 'in', 'both')
+
+_LABEL_EDGE_PUNCTUATION = re.compile(r'^[\s:;,.!?*_`~"\'、，。：；！？「」『』]+|[\s:;,.!?*_`~"\'、，。：；！？「」『』]+$')
+
+
+def normalize_label(label):
+    """Key under which node labels are deduplicated: width/case-folded, single-spaced, edge punctuation stripped"""
+    label = unicodedata.normalize('NFKC', label).casefold()
+    return _LABEL_EDGE_PUNCTUATION.sub('', ' '.join(label.split()))
+
+
+def _csr(rows, cols, n):
+    """(indptr, indices) adjacency of the edges rows[i] -> cols[i] over n nodes"""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[order]
+
+
+def _gather(adjacency, frontier):
+    """Neighbours of every frontier node, concatenated, and the frontier node each came from"""
+    indptr, indices = adjacency
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return indices[offsets], np.repeat(frontier, counts)
+
+
+class KnowledgeGraph:
+    """Immutable snapshot of one user's knowledge graph in CSR form.
+
+    Nodes are addressed by their position in the sorted `node_ids` array.
+    Outgoing, incoming and prerequisite-only edges each get an
+    (indptr, indices) pair, so one BFS step over a whole frontier is a few
+    array operations rather than a query per hop. Edges whose endpoints are
+    not in the graph (another user's nodes, or deleted ones) are ignored.
+    """
+
+    def __init__(self, node_ids, labels, edge_ids, sources, targets, relations):
+        order = np.argsort(node_ids, kind='stable')
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)[order]
+        self.labels = np.asarray(labels, dtype=object)[order]
+        self.edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.relations = np.asarray(relations, dtype=object)
+
+        n = len(self.node_ids)
+        src, dst = self._positions(self.sources), self._positions(self.targets)
+        known = (src >= 0) & (dst >= 0)
+        prerequisite = known & (self.relations == RELATION_PREREQUISITE)
+        self.out = _csr(src[known], dst[known], n)
+        self.inc = _csr(dst[known], src[known], n)
+        self.prerequisites_of = _csr(dst[prerequisite], src[prerequisite], n)
+        self.required_by = _csr(src[prerequisite], dst[prerequisite], n)
+
+    @classmethod
+    def from_rows(cls, nodes=(), edges=()):
+        """Graph from (id, label) node rows and (id, source, target, relation) edge rows"""
+        nodes, edges = list(nodes), list(edges)
+        node_ids, labels = zip(*nodes) if nodes else ((), ())
+        edge_columns = zip(*edges) if edges else ((), (), (), ())
+        return cls(np.asarray(node_ids, dtype=np.int64), labels, *edge_columns)
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_ids)
+
+    @property
+    def max_node_id(self):
+        return int(self.node_ids[-1]) if self.node_count else 0
+
+    @property
+    def max_edge_id(self):
+        return int(self.edge_ids.max()) if self.edge_count else 0
+
+    def extended(self, nodes=(), edges=()):
+        """New snapshot with extra (id, label) nodes and (id, source, target, relation) edges"""
+        added = KnowledgeGraph.from_rows(nodes, edges)
+        return KnowledgeGraph(
+            np.concatenate([self.node_ids, added.node_ids]),
+            np.concatenate([self.labels, added.labels]),
+            np.concatenate([self.edge_ids, added.edge_ids]),
+            np.concatenate([self.sources, added.sources]),
+            np.concatenate([self.targets, added.targets]),
+            np.concatenate([self.relations, added.relations])
+        )
+
+    def _positions(self, node_ids):
+        """Positions of node_ids in the graph, -1 where absent"""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if not self.node_count:
+            return np.full(len(node_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.node_ids, node_ids), self.node_count - 1)
+        return np.where(self.node_ids[positions] == node_ids, positions, -1)
+
+    def has_node(self, node_id):
+        return self._positions([node_id])[0] >= 0
+
+    def index_of(self, node_id):
+        position = int(self._positions([node_id])[0])
+        if position < 0:
+            raise KeyError(node_id)
+        return position
+
+    def _nodes(self, positions, **columns):
+        """[{'id', 'label', **columns}] for node positions; columns are arrays indexed by position"""
+        keys = ['id', 'label', *columns]
+        values = [self.node_ids[positions].tolist(), self.labels[positions].tolist(),
+                  *(column[positions].tolist() for column in columns.values())]
+        return [dict(zip(keys, row)) for row in zip(*values)]
+
+    def _adjacency(self, direction):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        return {'out': [self.out], 'in': [self.inc], 'both': [self.out, self.inc]}[direction]
+
+    # =====================================================
+    # TRAVERSALS
+    # =====================================================
+
+    def bfs(self, start, adjacency, max_depth=None, stop_at=None):
+        """Level-synchronous BFS from position `start`: (distance, parent) arrays, -1 where unreached"""
+        distance = np.full(self.node_count, -1, dtype=np.int64)
+        parent = np.full(self.node_count, -1, dtype=np.int64)
+        distance[start] = 0
+        frontier = np.array([start], dtype=np.int64)
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            if stop_at is not None and distance[stop_at] >= 0:
+                break
+            depth += 1
+            gathered = [_gather(csr, frontier) for csr in adjacency]
+            neighbours = np.concatenate([found for found, _ in gathered])
+            via = np.concatenate([source for _, source in gathered])
+            fresh = distance[neighbours] < 0
+            frontier, first = np.unique(neighbours[fresh], return_index=True)
+            distance[frontier] = depth
+            parent[frontier] = via[fresh][first]
+        return distance, parent
+
+    def neighborhood(self, node_id, hops=1, direction='both', limit=None):
+        """Nodes within `hops` edges of node_id, nearest first"""
+        distance, _ = self.bfs(self.index_of(node_id), self._adjacency(direction), max_depth=hops)
+        reached = np.flatnonzero(distance > 0)
+        reached = reached[np.lexsort((self.node_ids[reached], distance[reached]))][:limit]
+        return self._nodes(reached, distance=distance)
+
+    def shortest_path(self, source_id, target_id, direction='both'):
+        """Fewest-edges path from source_id to target_id as a list of nodes, or None if unreachable"""
+        source, target = self.index_of(source_id), self.index_of(target_id)
+        distance, parent = self.bfs(source, self._adjacency(direction), stop_at=target)
+        if distance[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parent[path[-1]]))
+        return self._nodes(np.array(path[::-1], dtype=np.int64))
+
+    def prerequisites(self, node_id):
+        """Everything to study before node_id, in a valid study order
+
+        Collects node_id's transitive prerequisites with a BFS over incoming
+        prerequisite edges, then orders them with Kahn's algorithm one level
+        at a time: level 0 needs nothing else, level k only needs levels
+        below k. Prerequisites caught in a cycle cannot be ordered and are
+        returned separately.
+        """
+        start = self.index_of(node_id)
+        distance, _ = self.bfs(start, [self.prerequisites_of])
+        members = np.flatnonzero(distance > 0)
+        in_scope = np.zeros(self.node_count, dtype=bool)
+        in_scope[members] = True
+
+        # Unmet prerequisites of each member, counting only members
+        required, owner = _gather(self.prerequisites_of, members)
+        indegree = np.bincount(owner[in_scope[required]], minlength=self.node_count)
+
+        level = np.full(self.node_count, -1, dtype=np.int64)
+        frontier = members[indegree[members] == 0]
+        depth = 0
+        while len(frontier):
+            level[frontier] = depth
+            unlocked, _ = _gather(self.required_by, frontier)
+            unlocked = unlocked[in_scope[unlocked]]
+            np.subtract.at(indegree, unlocked, 1)
+            unlocked = np.unique(unlocked)
+            frontier = unlocked[(indegree[unlocked] == 0) & (level[unlocked] < 0)]
+            depth += 1
+
+        ordered = members[level[members] >= 0]
+        ordered = ordered[np.lexsort((self.node_ids[ordered], level[ordered]))]
+        cyclic = members[level[members] < 0]
+        return {
+            'order': self._nodes(ordered, level=level, distance=distance),
+            'cyclic': self._nodes(cyclic, distance=distance)
+        }
+
+
+class GraphService:
+    """Per-user KnowledgeGraph cache in front of DatabaseService.
+
+    A user's first query loads their nodes and edges in two statements.
+    Nodes and edges added through this service are applied to the cached
+    snapshot without going back to the database. Every `sync_seconds` a
+    cached graph also picks up rows written elsewhere, past its node and
+    edge ID watermarks. If the user's edge count no longer adds up (edges
+    were deleted), the graph is reloaded in full.
+    """
+
+    def __init__(self, db_service, max_graphs=None, sync_seconds=None):
+        self.db_service = db_service
+        self.max_graphs = max_graphs or Config.GRAPH_CACHE_USERS
+        self.sync_seconds = sync_seconds if sync_seconds is not None else Config.GRAPH_SYNC_SECONDS
+        self._graphs = OrderedDict()  # user_id -> (graph, synced_at)
+        self._lock = threading.Lock()
+        # Serializes label-deduplicated merges, which read then insert
+        self._merge_lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'syncs': 0, 'extends': 0}
+
+    def get_graph(self, user_id=None, sync=False):
+        """The user's cached graph, loaded or synced first as needed (sync=True forces a sync)"""
+        with self._lock:
+            entry = self._graphs.get(user_id)
+            if entry is None:
+                graph = self._load(user_id)
+            elif sync or time.time() - entry[1] >= self.sync_seconds:
+                graph = self._sync(user_id, entry[0])
+            else:
+                graph = entry[0]
+                self._stats['hits'] += 1
+            self._store(user_id, graph)
+            return graph
+
+    def _load(self, user_id):
+        rows = self.db_service.get_knowledge_graph(user_id)
+        self._stats['loads'] += 1
+        return KnowledgeGraph.from_rows(rows['nodes'], rows['edges'])
+
+    def _sync(self, user_id, graph):
+        rows = self.db_service.get_knowledge_graph(
+            user_id, after_node_id=graph.max_node_id, after_edge_id=graph.max_edge_id
+        )
+        if rows['edge_count'] != graph.edge_count + len(rows['edges']):
+            return self._load(user_id)
+        self._stats['syncs'] += 1
+        if rows['nodes'] or rows['edges']:
+            graph = graph.extended(rows['nodes'], rows['edges'])
+        return graph
+
+    def _store(self, user_id, graph, synced_at=None):
+        self._graphs[user_id] = (graph, synced_at or time.time())
+        self._graphs.move_to_end(user_id)
+        while len(self._graphs) > self.max_graphs:
+            self._graphs.popitem(last=False)
+
+    def _extend_cached(self, user_id, nodes=(), edges=()):
+        """Apply rows this process just wrote to the user's cached graph, if loaded"""
+        with self._lock:
+            entry = self._graphs.get(user_id)
+            if entry is not None:
+                self._store(user_id, entry[0].extended(nodes, edges), synced_at=entry[1])
+                self._stats['extends'] += 1
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self._graphs.pop(user_id, None)
+
+    def add_nodes(self, labels, user_id=None):
+        """Create concept nodes; returns their IDs in input order"""
+        node_ids = self.db_service.add_knowledge_nodes(labels, user_id=user_id)
+        self._extend_cached(user_id, nodes=zip(node_ids, labels))
+        return node_ids
+
+    def add_edges(self, edges, user_id=None):
+        """Create edges between the user's nodes; returns their IDs in input order
+
+        Raises ValueError if an edge is malformed or names a node the user
+        doesn't have.
+        """
+        node_ids = {edge[key] for edge in edges for key in ('source_node_id', 'target_node_id')
+                    if edge.get(key) is not None}
+        graph = self.get_graph(user_id)
+        if not all(graph.has_node(node_id) for node_id in node_ids):
+            # The nodes may have been created by another process since the last sync
+            graph = self.get_graph(user_id, sync=True)
+        unknown = sorted(node_id for node_id in node_ids if not graph.has_node(node_id))
+        if unknown:
+            raise ValueError(f"Unknown node(s): {', '.join(map(str, unknown))}")
+        edge_ids = self.db_service.add_knowledge_edges(edges, user_id=user_id)
+        self._extend_cached(user_id, edges=[
+            (edge_id, edge['source_node_id'], edge['target_node_id'], edge['relation'])
+            for edge_id, edge in zip(edge_ids, edges)
+        ])
+        return edge_ids
+
+    def merge(self, labels, edges, user_id=None):
+        """Upsert nodes and edges keyed by normalized label; returns how many of each were created
+
+        `labels` maps a key to a display label and `edges` are
+        (source key, target key, relation) triples. Nodes whose normalized
+        label the user already has, and edges that already exist, are reused.
+        """
+        with self._merge_lock:
+            result = self.db_service.upsert_knowledge_graph(labels, edges, user_id=user_id)
+            self._extend_cached(user_id, nodes=result['created_nodes'], edges=result['created_edges'])
+        return {'nodes_created': len(result['created_nodes']), 'edges_created': len(result['created_edges'])}
+
+    def prerequisites(self, node_id, user_id=None):
+        return self.get_graph(user_id).prerequisites(node_id)
+
+    def neighborhood(self, node_id, hops=1, direction='both', limit=None, user_id=None):
+        return self.get_graph(user_id).neighborhood(node_id, hops=hops, direction=direction, limit=limit)
+
+    def shortest_path(self, source_id, target_id, direction='both', user_id=None):
+        return self.get_graph(user_id).shortest_path(source_id, target_id, direction=direction)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'cached_graphs': len(self._graphs)}
@@ -0,0 +1,193 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import Config
+
+
+class SourceIngestionService:
+    """Fetch every source of a unified-notes request concurrently.
+
+    Sources are fanned out over a bounded thread pool (transcripts, PDF
+    parsing and page fetches are all I/O bound), then reassembled in the
+    original request order: YouTube, files, text, webpages.
+    """
+
+    def __init__(self, youtube_service, pdf_service, max_workers=None, source_timeout=None):
+        self.youtube_service = youtube_service
+        self.pdf_service = pdf_service
+        self.max_workers = max_workers or Config.INGESTION_MAX_WORKERS
+        self.source_timeout = source_timeout or Config.INGESTION_SOURCE_TIMEOUT
+
+    def ingest(self, sources, on_finished=None):
+        """Process all sources and return content, source info and timings in request order
+
+        Every source shares one deadline, `source_timeout` seconds after the
+        sources are submitted. Sources still running at the deadline are
+        reported as timed out but cannot be interrupted, so `on_finished` is
+        called once the last of them has actually returned; use it to release
+        inputs the sources read, such as uploaded files.
+        """
+        try:
+            tasks = self._build_tasks(sources)
+        except Exception:
+            if on_finished:
+                on_finished()
+            raise
+        results = [None] * len(tasks)
+        started_at = {}
+        ingestion_start = time.perf_counter()
+        deadline = ingestion_start + self.source_timeout
+
+        def run(index, fetch):
+            started_at[index] = time.perf_counter()
+            return fetch()
+
+        # One count per task plus one held until every task is submitted
+        outstanding = [len(tasks) + 1]
+        outstanding_lock = threading.Lock()
+
+        def release(count=1):
+            with outstanding_lock:
+                outstanding[0] -= count
+                finished = outstanding[0] == 0
+            if finished and on_finished:
+                on_finished()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest')
+        futures = {}
+        try:
+            try:
+                for index, task in enumerate(tasks):
+                    future = executor.submit(run, index, task['fetch'])
+                    futures[future] = index
+                    future.add_done_callback(lambda _: release())
+            finally:
+                release(1 + len(tasks) - len(futures))
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.perf_counter(), 0),
+                                     return_when=FIRST_COMPLETED)
+                finished_at = time.perf_counter()
+
+                for future in done:
+                    index = futures[future]
+                    latency = finished_at - started_at.get(index, finished_at)
+                    try:
+                        results[index] = self._result(tasks[index], 'ok', latency, future.result())
+                    except Exception as e:
+                        print(f"{tasks[index]['type']} processing error for {tasks[index]['ref']}: {e}")
+                        results[index] = self._result(tasks[index], 'error', latency, error=str(e))
+
+                if pending and finished_at >= deadline:
+                    for future in pending:
+                        index = futures[future]
+                        print(f"{tasks[index]['type']} processing timed out for {tasks[index]['ref']}")
+                        results[index] = self._result(
+                            tasks[index], 'timeout', finished_at - started_at.get(index, ingestion_start),
+                            error=f"Timed out after {self.source_timeout}s"
+                        )
+                    break
+        finally:
+            # Sources that have not started are dropped; running ones finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        all_content = []
+        source_info = []
+        timings = []
+        for result in results:
+            timings.append(result['timing'])
+            if result['content']:
+                all_content.append(result['content'])
+                source_info.append(result['info'])
+
+        return {
+            'contents': all_content,
+            'sources': source_info,
+            'timings': timings,
+            'total_ms': round((time.perf_counter() - ingestion_start) * 1000)
+        }
+
+    def _build_tasks(self, sources):
+        """Flatten the request sources into an ordered task list"""
+        tasks = []
+
+        for url in sources.get('youtube', []):
+            if url.strip():
+                tasks.append({'type': 'youtube', 'ref': url, 'fetch': lambda url=url: self._fetch_youtube(url)})
+
+        for file_info in sources.get('files', []):
+            tasks.append({
+                'type': 'file',
+                'ref': file_info.get('name', 'unknown'),
+                'fetch': lambda file_info=file_info: self._fetch_file(file_info)
+            })
+
+        for text in sources.get('text', []):
+            if text.strip():
+                tasks.append({'type': 'text', 'ref': text[:30], 'fetch': lambda text=text: self._fetch_text(text)})
+
+        for url in sources.get('webpages', []):
+            if url.strip():
+                tasks.append({'type': 'webpage', 'ref': url, 'fetch': lambda url=url: self._fetch_webpage(url)})
+
+        return tasks
+
+    @staticmethod
+    def _result(task, status, latency, fetched=None, error=None):
+        content, info = fetched if fetched else (None, None)
+        if status == 'ok' and not content:
+            status = 'empty'
+
+        timing = {
+            'type': task['type'],
+            'ref': task['ref'],
+            'status': status,
+            'latency_ms': round(latency * 1000)
+        }
+        if error:
+            timing['error'] = error
+
+        return {'content': content, 'info': info, 'timing': timing}
+
+    def _fetch_youtube(self, url):
+        video_info = self.youtube_service.get_transcript(url)
+        return video_info['transcript'], {
+            'type': 'youtube',
+            'title': video_info.get('title', url),
+            'url': url
+        }
+
+    def _fetch_file(self, file_info):
+        file_content = self.pdf_service.extract_text_from_file(file_info)
+        return file_content, {
+            'type': 'file',
+            'name': file_info.get('name', 'unknown'),
+            'size': file_info.get('size', 0)
+        }
+
+    @staticmethod
+    def _fetch_text(text):
+        return text, {
+            'type': 'text',
+            'preview': text[:100] + '...' if len(text) > 100 else text
+        }
+
+    @staticmethod
+    def _fetch_webpage(url):
+        # Simple webpage content extraction (basic implementation)
+        import requests
+        from bs4 import BeautifulSoup
+
+        response = requests.get(url, timeout=10)
+        soup = BeautifulSoup(response.content, 'html.parser')
+
+        # Extract text from paragraphs
+        paragraphs = soup.find_all('p')
+        webpage_text = ' '.join([p.get_text() for p in paragraphs])
+
+        return webpage_text, {
+            'type': 'webpage',
+            'url': url,
+            'title': soup.title.string if soup.title else url
+        }
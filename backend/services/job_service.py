@@ -0,0 +1,276 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+
+
+class JobService:
+    """SQLite-backed job queue with a local worker thread pool.
+
+    Long-running pipelines (Whisper downloads, multi-call note generation)
+    are submitted here instead of running inside the Flask request thread.
+    Jobs are persisted, so anything queued is picked up again when the
+    server restarts.
+
+    A running job holds a lease that its process renews every few seconds;
+    only a job whose lease has expired (its process died) is run again,
+    so several processes can share one jobs.db without running a job
+    twice. A job is failed once it has been started `max_attempts` times,
+    and finished jobs are deleted after `retention_seconds`.
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, db_path=None, max_workers=None, poll_interval=1.0, lease_seconds=None,
+                 max_attempts=None, retention_seconds=None):
+        self.db_path = db_path or Config.JOB_DB_PATH
+        self.max_workers = max_workers or Config.JOB_WORKERS
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        self.retention_seconds = retention_seconds or Config.JOB_RETENTION_SECONDS
+        self.handlers = {}
+        self.worker_id = uuid.uuid4().hex
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    stages TEXT NOT NULL DEFAULT '[]',
+                    progress REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    worker_id TEXT,
+                    lease_expires_at REAL
+                )
+            """)
+            # jobs.db files created before leases existed
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, ddl in (('worker_id', 'TEXT'), ('lease_expires_at', 'REAL')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {ddl}')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)')
+
+    # =====================================================
+    # PUBLIC API
+    # =====================================================
+
+    def register(self, job_type, handler):
+        """Register a handler(payload, progress) -> result for a job type"""
+        self.handlers[job_type] = handler
+
+    def submit(self, job_type, payload):
+        """Queue a job and return its ID immediately"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, type, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, job_type, self.STATUS_QUEUED, json.dumps(payload, ensure_ascii=False),
+                 datetime.utcnow().isoformat())
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Get job status, progress stages and (once finished) the result"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+
+        job = {
+            'id': row['id'],
+            'type': row['type'],
+            'status': row['status'],
+            'progress': row['progress'],
+            'stages': json.loads(row['stages']),
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+        if row['status'] == self.STATUS_QUEUED:
+            with self._connect() as conn:
+                job['queue_position'] = conn.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?',
+                    (self.STATUS_QUEUED, row['created_at'])
+                ).fetchone()[0]
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error']:
+            job['error'] = row['error']
+        return job
+
+    def start(self):
+        """Start the worker threads and the lease heartbeat (once per process)"""
+        if self._workers:
+            return
+        with self._start_lock:
+            if self._workers:
+                return
+            self.prune()
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+            heartbeat.start()
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def prune(self):
+        """Delete finished jobs older than retention_seconds; returns how many were removed"""
+        cutoff = datetime.utcfromtimestamp(time.time() - self.retention_seconds).isoformat()
+        with self._connect() as conn:
+            return conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                (self.STATUS_SUCCEEDED, self.STATUS_FAILED, cutoff)
+            ).rowcount
+
+    # =====================================================
+    # WORKERS
+    # =====================================================
+
+    def _claim_next(self):
+        """Atomically take the oldest queued job, or a running job whose lease expired, under our lease
+
+        Abandoned jobs already started max_attempts times are failed instead
+        of being run again.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_expires_at = NULL '
+                'WHERE status = ? AND COALESCE(lease_expires_at, 0) < ? AND attempts >= ?',
+                (self.STATUS_FAILED, f"Abandoned after {self.max_attempts} attempt(s)",
+                 datetime.utcnow().isoformat(), self.STATUS_RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                'SELECT id, type, payload, attempts FROM jobs '
+                'WHERE status = ? OR (status = ? AND COALESCE(lease_expires_at, 0) < ?) ORDER BY created_at LIMIT 1',
+                (self.STATUS_QUEUED, self.STATUS_RUNNING, now)
+            ).fetchone()
+            if row:
+                if row['attempts']:
+                    print(f"Resuming job {row['id']} (attempt {row['attempts'] + 1} of {self.max_attempts})")
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, worker_id = ?, '
+                    'lease_expires_at = ? WHERE id = ?',
+                    (self.STATUS_RUNNING, datetime.utcnow().isoformat(), self.worker_id,
+                     now + self.lease_seconds, row['id'])
+                )
+            return row
+
+    def _heartbeat_loop(self):
+        """Renew the leases of this process's running jobs; prune finished jobs now and then"""
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(max(1.0, self.lease_seconds / 3))
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                if job_ids:
+                    with self._connect() as conn:
+                        conn.executemany(
+                            'UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = ?',
+                            [(time.time() + self.lease_seconds, job_id, self.worker_id, self.STATUS_RUNNING)
+                             for job_id in job_ids]
+                        )
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"Job heartbeat error: {e}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                row = self._claim_next()
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}")
+                row = None
+            if not row:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(row['id'], row['type'], json.loads(row['payload']))
+
+    def _run(self, job_id, job_type, payload):
+        start = time.perf_counter()
+
+        def progress(stage, percent=None):
+            self._record_stage(job_id, stage, percent, start)
+
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            result = self.handlers[job_type](payload, progress)
+            self._finish(job_id, self.STATUS_SUCCEEDED, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job_id, self.STATUS_FAILED, error=str(e))
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _record_stage(self, job_id, stage, percent, start):
+        with self._connect() as conn:
+            row = conn.execute('SELECT stages FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            stages = json.loads(row['stages']) if row else []
+            stages.append({'stage': stage, 'elapsed_ms': round((time.perf_counter() - start) * 1000)})
+            if percent is None:
+                conn.execute('UPDATE jobs SET stages = ? WHERE id = ?', (json.dumps(stages), job_id))
+            else:
+                conn.execute(
+                    'UPDATE jobs SET stages = ?, progress = ? WHERE id = ?',
+                    (json.dumps(stages), float(percent), job_id)
+                )
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            # A job whose lease was lost (and taken over elsewhere) is left to its new owner
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, progress = COALESCE(?, progress), '
+                'finished_at = ?, lease_expires_at = NULL WHERE id = ? AND worker_id = ?',
+                (status,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error,
+                 100.0 if status == self.STATUS_SUCCEEDED else None,
+                 datetime.utcnow().isoformat(),
+                 job_id,
+                 self.worker_id)
+            )
@@ -0,0 +1,173 @@
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from .graph_service import normalize_label, RELATION_PREREQUISITE, RELATION_SUBTOPIC, RELATION_MENTIONS, RELATION_RELATED
+
+HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s')
+BOLD = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+LINK = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+# "第 2 部分 - " (chunked notes), "1.2 ", "三、", "Part 3:" and leading emoji/bullets
+HEADING_PREFIX = re.compile(
+    r'^(?:[^\w\s]+\s*|第\s*\d+\s*部分\s*|\d+(?:\.\d+)+[.)、]?\s*|\d+[.)、]\s*|[一二三四五六七八九十]+[、.]\s*|part\s+\d+\s*[:.]?\s*)+',
+    re.IGNORECASE
+)
+
+# Bold lead-ins that label a line rather than name a concept
+GENERIC_TERMS = {
+    '定義', '定义', '例子', '例如', '舉例', '举例', '範例', '范例', '注意', '重點', '重点', '公式', '說明', '说明',
+    '總結', '总结', '應用', '应用', '優點', '优点', '缺點', '缺点', '特點', '特点', '步驟', '步骤', '關鍵', '关键',
+    '完整學習筆記', 'definition', 'example', 'examples', 'note', 'notes', 'formula', 'summary', 'key points',
+    'application', 'applications', 'advantages', 'disadvantages', 'steps', 'important',
+}
+MIN_LABEL_CHARS = 2
+MAX_LABEL_CHARS = 80
+
+
+def clean_label(text):
+    """Concept label from heading or bold text: markdown, numbering and trailing colons removed"""
+    text = LINK.sub(r'\1', text).replace('**', '').replace('__', '').replace('`', '')
+    text = HEADING_PREFIX.sub('', text.strip())
+    return text.strip().rstrip(':：').strip()
+
+
+def parse_outline(markdown):
+    """Concepts and relations readable from a note's Markdown structure, without any LLM call
+
+    Headings become nodes linked parent -> child (has_subtopic); bold terms
+    become nodes mentioned by their enclosing heading. Bold terms that share
+    a paragraph or list item are returned as candidate pairs whose relation
+    (if any) the structure cannot tell.
+
+    Returns {'labels': {key: label}, 'edges': {(key, key, relation)},
+    'pairs': Counter({(key, key): count}), 'sections': {(key, key): heading key}},
+    keyed by normalize_label.
+    """
+    labels, edges, pairs, sections = {}, set(), Counter(), {}
+    stack = []  # (level, key) of the open headings
+
+    def concept(text):
+        label = clean_label(text)
+        key = normalize_label(label)
+        if not MIN_LABEL_CHARS <= len(key) <= MAX_LABEL_CHARS or key in GENERIC_TERMS:
+            return None
+        labels.setdefault(key, label)
+        return key
+
+    block = []  # terms of the current paragraph or list item
+
+    def close_block():
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                pair = (a, b) if a < b else (b, a)
+                pairs[pair] += 1
+                sections.setdefault(pair, stack[-1][1] if stack else None)
+        block.clear()
+
+    for line in markdown.splitlines():
+        heading = HEADING.match(line)
+        if heading or not line.strip() or LIST_ITEM.match(line):
+            close_block()
+        if heading:
+            level = len(heading.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            key = concept(heading.group(2))
+            if key is None:
+                continue
+            if stack:
+                edges.add((stack[-1][1], key, RELATION_SUBTOPIC))
+            stack.append((level, key))
+            continue
+        for match in BOLD.finditer(line):
+            key = concept(match.group(1) or match.group(2))
+            if key is None:
+                continue
+            if stack and stack[-1][1] != key:
+                edges.add((stack[-1][1], key, RELATION_MENTIONS))
+            if key not in block:
+                block.append(key)
+    close_block()
+
+    return {'labels': labels, 'edges': edges, 'pairs': pairs, 'sections': sections}
+
+
+class KnowledgeExtractionService:
+    """Builds a user's knowledge graph from generated notes.
+
+    Each note is parsed once for its heading tree and bold terms (see
+    parse_outline). Only the relations the structure can't settle, term
+    pairs sharing a paragraph, go to the LLM, batched `pairs_per_call` to a
+    request and at most `max_calls` requests per run, most frequent pairs
+    first. Everything is then merged into the graph in one transaction,
+    deduplicated by normalized label.
+    """
+
+    LLM_RELATIONS = {
+        'a_before_b': lambda a, b: (a, b, RELATION_PREREQUISITE),
+        'b_before_a': lambda a, b: (b, a, RELATION_PREREQUISITE),
+        'related': lambda a, b: (a, b, RELATION_RELATED),
+    }
+
+    def __init__(self, openai_service, graph_service, pairs_per_call=None, max_calls=None):
+        self.openai_service = openai_service
+        self.graph_service = graph_service
+        self.pairs_per_call = pairs_per_call or Config.GRAPH_EXTRACTION_PAIRS_PER_CALL
+        self.max_calls = Config.GRAPH_EXTRACTION_MAX_CALLS if max_calls is None else max_calls
+
+    def extract(self, notes, user_id=None, language='zh-tw', use_cache=True, progress=lambda stage, percent=None: None):
+        """Parse `notes` (a list of Markdown documents) and merge what they describe into the user's graph"""
+        progress('parsing_notes', 10)
+        labels, edges, pairs, sections = {}, set(), Counter(), {}
+        for markdown in notes:
+            outline = parse_outline(markdown or '')
+            for key, label in outline['labels'].items():
+                labels.setdefault(key, label)
+            edges |= outline['edges']
+            pairs.update(outline['pairs'])
+            for pair, section in outline['sections'].items():
+                sections.setdefault(pair, section)
+
+        # Pairs the headings already relate need no LLM call
+        settled = {(a, b) if a < b else (b, a) for a, b, _ in edges}
+        uncertain = [pair for pair, _ in pairs.most_common() if pair not in settled]
+        batches = [uncertain[i:i + self.pairs_per_call]
+                   for i in range(0, min(len(uncertain), self.pairs_per_call * self.max_calls), self.pairs_per_call)]
+
+        progress('classifying_relations', 40)
+        classified = 0
+
+        def classify(i):
+            try:
+                return self.openai_service.classify_concept_relations(
+                    [(labels[a], labels[b], labels.get(sections.get((a, b)))) for a, b in batches[i]],
+                    language, use_cache=use_cache
+                )
+            except Exception as e:
+                print(f"Relation classification failed for batch {i}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(Config.OPENAI_CHUNK_CONCURRENCY, len(batches))),
+                                thread_name_prefix='graph-extract') as executor:
+            results = list(executor.map(classify, range(len(batches))))
+        for batch, relations in zip(batches, results):
+            if relations is None:
+                continue
+            classified += len(batch)
+            for (a, b), relation in zip(batch, relations):
+                if relation in self.LLM_RELATIONS:
+                    edges.add(self.LLM_RELATIONS[relation](a, b))
+
+        progress('saving_graph', 80)
+        merged = self.graph_service.merge(labels, edges, user_id=user_id)
+        return {
+            'success': True,
+            'notes': len(notes),
+            'concepts': len(labels),
+            'relations': len(edges),
+            'llm_calls': len(batches),
+            'pairs_classified': classified,
+            'pairs_skipped': len(uncertain) - sum(len(batch) for batch in batches),
+            **merged
+        }
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import Config
+
+
+class LLMResponseCache:
+    """Two-tier cache for chat completion responses.
+
+    Keys are a SHA-256 of (model, messages, max_tokens, temperature), so the
+    same PDF, transcript or note sent with the same settings is answered
+    without calling the API. An in-process LRU sits in front of a persistent
+    SQLite tier; both evict on TTL and on size. The memory tier is bounded
+    by entry count and by bytes; the disk tier keeps a running byte total so
+    eviction never sums the whole table.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=None, memory_entries=None, disk_max_bytes=None,
+                 memory_max_bytes=None):
+        self.db_path = db_path or Config.LLM_CACHE_DB_PATH
+        self.ttl_seconds = ttl_seconds or Config.LLM_CACHE_TTL_SECONDS
+        self.memory_entries = memory_entries or Config.LLM_CACHE_MEMORY_ENTRIES
+        self.memory_max_bytes = memory_max_bytes or Config.LLM_CACHE_MEMORY_MAX_BYTES
+        self.disk_max_bytes = disk_max_bytes or Config.LLM_CACHE_DISK_MAX_BYTES
+        self._memory = OrderedDict()  # key -> (expires_at, value, size)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'writes': 0, 'evictions': 0}
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_llm_cache_expires_at ON llm_cache (expires_at)')
+            # Running total so size-based eviction never needs a full-table SUM
+            conn.execute('CREATE TABLE IF NOT EXISTS llm_cache_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)')
+            conn.execute(
+                'INSERT OR IGNORE INTO llm_cache_stats (id, total_bytes) '
+                'SELECT 1, COALESCE(SUM(size), 0) FROM llm_cache'
+            )
+
+    @staticmethod
+    def make_key(model, messages, max_tokens, temperature):
+        payload = json.dumps(
+            {'model': model, 'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Cached value for key, or None on miss/expiry"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, value, _ = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                self._forget(key)
+
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at, size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+            elif row:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._add_bytes(conn, -row[2])
+                row = None
+
+        with self._lock:
+            if row:
+                self._stats['disk_hits'] += 1
+                self._remember(key, row[1], row[0])
+                return row[0]
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._stats['writes'] += 1
+
+        size = len(value.encode('utf-8'))
+        with self._connect() as conn:
+            old = conn.execute('SELECT size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, expires_at, now)
+            )
+            self._add_bytes(conn, size - (old[0] if old else 0))
+            self._evict_disk(conn, now)
+
+    def get_or_compute(self, key, compute, bypass=False):
+        """Return the cached value for key, computing and storing it on a miss.
+
+        With bypass=True the cache is neither read nor written.
+        """
+        if bypass:
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return compute()
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = compute()
+        if value:
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+        with self._connect() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            size = conn.execute('SELECT total_bytes FROM llm_cache_stats WHERE id = 1').fetchone()[0]
+        stats['disk_entries'] = count
+        stats['disk_bytes'] = size
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        with self._connect() as conn:
+            conn.execute('DELETE FROM llm_cache')
+            conn.execute('UPDATE llm_cache_stats SET total_bytes = 0 WHERE id = 1')
+
+    def _remember(self, key, expires_at, value):
+        """Insert into the memory LRU (caller holds the lock); a value over the byte budget is not kept"""
+        if key in self._memory:
+            self._forget(key)
+        size = len(value.encode('utf-8'))
+        if size > self.memory_max_bytes:
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.memory_entries or self._memory_bytes > self.memory_max_bytes):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats['evictions'] += 1
+
+    def _forget(self, key):
+        """Drop a key from the memory LRU (caller holds the lock)"""
+        self._memory_bytes -= self._memory.pop(key)[2]
+
+    @staticmethod
+    def _add_bytes(conn, delta):
+        conn.execute('UPDATE llm_cache_stats SET total_bytes = total_bytes + ? WHERE id = 1', (delta,))
+
+    def _evict_disk(self, conn, now):
+        """Drop expired rows, then least recently used rows until under the size budget"""
+        expired = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache WHERE expires_at <= ?', (now,)).fetchone()[0]
+        if expired:
+            conn.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+            self._add_bytes(conn, -expired)
+
+        excess = conn.execute('SELECT total_bytes FROM llm_cache_stats WHERE id = 1').fetchone()[0] - self.disk_max_bytes
+        if excess <= 0:
+            return
+
+        freed = 0
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM llm_cache ORDER BY last_access'):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM llm_cache WHERE key = ?', victims)
+        self._add_bytes(conn, -freed)
+        with self._lock:
+            self._stats['evictions'] += len(victims)
@@ -1,85 +1,297 @@
 import openai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import Config
+from .rate_limiter import RateLimiter
+from .text_chunker import TextChunker, count_tokens
+from .llm_cache import LLMResponseCache
+
+CHUNKED_NOTES_HEADER = "# 完整學習筆記\n\n"
+CHUNK_SEPARATOR = "\n\n---\n\n"
+NOTE_SYSTEM_PROMPT = "You are an expert note-taker who creates well-structured study notes in Markdown format. Provide content directly without meta-commentary or conclusive summaries."
+
+# One limiter per process: the OpenAI limits apply to the API key, not to a service instance
+_rate_limiter = RateLimiter(Config.OPENAI_REQUESTS_PER_MINUTE, Config.OPENAI_TOKENS_PER_MINUTE)
+_response_cache = LLMResponseCache() if Config.LLM_CACHE_ENABLED else None
 
 class OpenAIService:
     def __init__(self):
         openai.api_key = Config.OPENAI_API_KEY
         self.model = Config.OPENAI_MODEL
+        self.rate_limiter = _rate_limiter
+        self.cache = _response_cache
+        self.chunker = TextChunker()
         
-    def generate_notes(self, content, detail_level='medium', language='zh-tw', content_type='general'):
-        """Generate notes from content using OpenAI with enhanced prompts and smart content handling"""
+    def _chat_completion(self, messages, max_tokens, temperature, model=None, use_cache=True):
+        """Send a chat completion through the response cache and shared rate limiter, return the message text"""
+        model = model or Config.OPENAI_MODEL
         
-        # Handle very large content by intelligent chunking if needed
-        if len(content) > 15000:  # ~15k characters is roughly safe limit for context
-            return self._generate_notes_chunked(content, detail_level, language, content_type)
+        def request():
+            self.rate_limiter.acquire(self._estimate_tokens(messages, max_tokens))
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content
         
-        # Get optimized prompt based on detail level, language, and content type
-        prompt = self._create_prompt(content, detail_level, language, content_type)
+        if not self.cache:
+            return request()
+        
+        key = self.cache.make_key(model, messages, max_tokens, temperature)
+        return self.cache.get_or_compute(key, request, bypass=not use_cache)
+    
+    def _chat_completion_stream(self, messages, max_tokens, temperature, model=None, use_cache=True):
+        """Yield the completion text as it arrives (a cached response is yielded in one piece)"""
+        model = model or Config.OPENAI_MODEL
+        key = self.cache.make_key(model, messages, max_tokens, temperature) if self.cache else None
+        
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        self.rate_limiter.acquire(self._estimate_tokens(messages, max_tokens))
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        
+        parts = []
+        for chunk in response:
+            delta = chunk.choices[0].delta.get('content')
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if key and use_cache and parts:
+            self.cache.set(key, ''.join(parts))
+    
+    @staticmethod
+    def _estimate_tokens(messages, max_tokens):
+        """Rough upper bound on tokens a request consumes (prompt + completion budget)"""
+        return sum(count_tokens(m.get('content', '')) for m in messages) + max_tokens
+        
+    def generate_notes(self, content, detail_level='medium', language='zh-tw', content_type='general', merge_chunks=None, use_cache=True):
+        """Generate notes from content using OpenAI with enhanced prompts and smart content handling"""
+        
+        # Handle very large content by token-aware chunking if needed
+        if self.chunker.needs_chunking(content):
+            return self._generate_notes_chunked(content, detail_level, language, content_type, merge_chunks, use_cache)
         
         try:
-            response = openai.ChatCompletion.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert note-taker who creates well-structured study notes in Markdown format. Provide content directly without meta-commentary or conclusive summaries."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=Config.OPENAI_MAX_TOKENS,
-                temperature=Config.OPENAI_TEMPERATURE
+            return self._chat_completion(
+                **self._notes_request(content, detail_level, language, content_type),
+                use_cache=use_cache
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             raise Exception(f"Failed to generate notes: {str(e)}")
     
-    def _generate_notes_chunked(self, content, detail_level, language, content_type):
-        """Handle very large content by chunking and combining results"""
+    def generate_notes_stream(self, content, detail_level='medium', language='zh-tw', content_type='general', merge_chunks=None, use_cache=True):
+        """Streaming variant of generate_notes: yields (event, data) pairs and returns the full notes"""
+        return (yield from self._stream_notes(
+            content,
+            lambda text: self._notes_request(text, detail_level, language, content_type),
+            lambda chunks, i: self._generate_chunk_notes(chunks[i], i, len(chunks), detail_level, language, content_type, use_cache),
+            language,
+            merge_chunks,
+            use_cache
+        ))
+    
+    def _notes_request(self, content, detail_level, language, content_type, part=None):
+        """Chat completion arguments for note generation (part=(index, total) for a chunk)"""
+        # Get optimized prompt based on detail level, language, and content type
+        prompt = self._create_prompt(content, detail_level, language, content_type)
+        
+        # Add chunk context
+        if part and part[1] > 1:
+            prompt += f"\n\n注意：這是第 {part[0]+1} 部分，共 {part[1]} 部分。請確保內容銜接自然。不要添加總結性結尾，直接以內容結束。"
+        
+        return {
+            'messages': [
+                {"role": "system", "content": NOTE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            'max_tokens': Config.OPENAI_MAX_TOKENS,
+            'temperature': Config.OPENAI_TEMPERATURE
+        }
+    
+    def _generate_notes_chunked(self, content, detail_level, language, content_type, merge_chunks=None, use_cache=True):
+        """Handle very large content by chunking, summarizing chunks concurrently and combining results"""
         
-        # Split content into manageable chunks
-        chunk_size = 12000  # Safe chunk size
-        chunks = []
+        # Split content into token-bounded chunks along paragraph/sentence boundaries
+        chunks = self.chunker.split(content)
         
-        for i in range(0, len(content), chunk_size):
-            chunk = content[i:i + chunk_size]
-            chunks.append(chunk)
+        return self._map_reduce_chunks(
+            chunks,
+            lambda i: self._generate_chunk_notes(chunks[i], i, len(chunks), detail_level, language, content_type, use_cache),
+            language,
+            merge_chunks,
+            use_cache
+        )
+    
+    def _map_reduce_chunks(self, chunks, generate_chunk, language, merge_chunks=None, use_cache=True):
+        """Generate notes for every chunk concurrently, then merge or concatenate them in order"""
         
-        # Generate notes for each chunk
-        chunk_notes = []
-        for i, chunk in enumerate(chunks):
-            try:
-                prompt = self._create_prompt(chunk, detail_level, language, content_type)
-                
-                # Add chunk context
-                if len(chunks) > 1:
-                    prompt += f"\n\n注意：這是第 {i+1} 部分，共 {len(chunks)} 部分。請確保內容銜接自然。不要添加總結性結尾，直接以內容結束。"
-                
-                response = openai.ChatCompletion.create(
-                    model=Config.OPENAI_MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are an expert note-taker who creates well-structured study notes in Markdown format. Provide content directly without meta-commentary or conclusive summaries."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=Config.OPENAI_MAX_TOKENS,
-                    temperature=Config.OPENAI_TEMPERATURE
-                )
-                
-                chunk_notes.append(response.choices[0].message.content)
-                
-            except Exception as e:
-                chunk_notes.append(f"## 第 {i+1} 部分處理錯誤\n\n錯誤: {str(e)}")
+        # Map: generate notes for every chunk concurrently, reassembled in order
+        chunk_notes = self.map_concurrently(generate_chunk, len(chunks))
         
         # Combine all chunk notes
         if len(chunk_notes) == 1:
             return chunk_notes[0]
         
+        if merge_chunks is None:
+            merge_chunks = Config.OPENAI_MERGE_CHUNKS
+        if merge_chunks:
+            try:
+                return self._reduce_chunk_notes(chunk_notes, language, use_cache)
+            except Exception as e:
+                print(f"Chunk merge failed, falling back to concatenation: {e}")
+        
         # Create a unified document from chunks
-        combined_notes = "# 完整學習筆記\n\n"
-        for i, notes in enumerate(chunk_notes):
-            # Remove duplicate headers and combine
-            clean_notes = notes.replace("# ", "## ").replace("##", f"## 第 {i+1} 部分 - ")
-            combined_notes += clean_notes + "\n\n---\n\n"
+        return CHUNKED_NOTES_HEADER + CHUNK_SEPARATOR.join(
+            self._format_chunk_section(i, notes) for i, notes in enumerate(chunk_notes)
+        )
+    
+    @staticmethod
+    def _format_chunk_section(index, notes):
+        """Demote a chunk's headers under a numbered part heading"""
+        # Remove duplicate headers and combine
+        return notes.replace("# ", "## ").replace("##", f"## 第 {index+1} 部分 - ").rstrip("\n-")
+    
+    def _stream_notes(self, content, build_request, generate_chunk, language, merge_chunks=None, use_cache=True):
+        """Shared streaming driver: token events for a single request, chunk progress for the chunked path"""
+        if not self.chunker.needs_chunking(content):
+            yield 'progress', {'stage': 'generating', 'chunks': 1}
+            parts = []
+            for delta in self._chat_completion_stream(**build_request(content), use_cache=use_cache):
+                parts.append(delta)
+                yield 'token', {'text': delta}
+            return ''.join(parts)
+        
+        chunks = self.chunker.split(content)
+        total = len(chunks)
+        if merge_chunks is None:
+            merge_chunks = Config.OPENAI_MERGE_CHUNKS
+        concatenate = total > 1 and not merge_chunks
+        yield 'progress', {'stage': 'chunking', 'chunks': total}
+        
+        chunk_notes = [None] * total
+        emitted = []
+        next_index = 0
+        workers = max(1, min(Config.OPENAI_CHUNK_CONCURRENCY, total))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='openai-map')
+        try:
+            futures = {executor.submit(generate_chunk, chunks, i): i for i in range(total)}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                chunk_notes[index] = future.result()
+                yield 'progress', {'stage': 'chunk_done', 'chunk': index, 'completed': completed, 'chunks': total}
+                
+                # Relay finished sections in order as soon as every earlier chunk is done
+                while concatenate and next_index < total and chunk_notes[next_index] is not None:
+                    prefix = CHUNKED_NOTES_HEADER if next_index == 0 else CHUNK_SEPARATOR
+                    text = prefix + self._format_chunk_section(next_index, chunk_notes[next_index])
+                    emitted.append(text)
+                    next_index += 1
+                    yield 'token', {'text': text}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        return combined_notes.rstrip("\n---\n")
+        if concatenate:
+            return ''.join(emitted)
+        
+        if total > 1:
+            yield 'progress', {'stage': 'merging', 'chunks': total}
+            try:
+                notes = self._reduce_chunk_notes(chunk_notes, language, use_cache)
+            except Exception as e:
+                print(f"Chunk merge failed, falling back to concatenation: {e}")
+                notes = CHUNKED_NOTES_HEADER + CHUNK_SEPARATOR.join(
+                    self._format_chunk_section(i, n) for i, n in enumerate(chunk_notes)
+                )
+        else:
+            notes = chunk_notes[0]
+        
+        yield 'token', {'text': notes}
+        return notes
+    
+    def _generate_chunk_notes(self, chunk, index, total, detail_level, language, content_type, use_cache=True):
+        """Map step: notes for a single chunk (errors are reported inline, not raised)"""
+        try:
+            return self._chat_completion(
+                **self._notes_request(chunk, detail_level, language, content_type, (index, total)),
+                use_cache=use_cache
+            )
+            
+        except Exception as e:
+            return f"## 第 {index+1} 部分處理錯誤\n\n錯誤: {str(e)}"
+    
+    @staticmethod
+    def map_concurrently(fn, count):
+        """Run fn(0..count-1) on a pool bounded by OPENAI_CHUNK_CONCURRENCY and return results in index order"""
+        if count <= 1:
+            return [fn(i) for i in range(count)]
+        
+        workers = max(1, min(Config.OPENAI_CHUNK_CONCURRENCY, count))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='openai-map') as executor:
+            return list(executor.map(fn, range(count)))
+    
+    def _reduce_chunk_notes(self, chunk_notes, language, use_cache=True):
+        """Reduce step: merge chunk notes in groups that fit one request until a single document remains"""
+        merge_budget = self.chunker.max_tokens  # tokens of notes per merge request, same as a map chunk
+        
+        while len(chunk_notes) > 1:
+            groups = []
+            group_tokens = 0
+            for notes in chunk_notes:
+                tokens = count_tokens(notes)
+                if groups and group_tokens + tokens <= merge_budget:
+                    groups[-1].append(notes)
+                    group_tokens += tokens
+                else:
+                    groups.append([notes])
+                    group_tokens = tokens
+            
+            if len(groups) == len(chunk_notes):
+                # Nothing fits together any more; merging further would overflow the context
+                raise ValueError("Chunk notes are too large to merge")
+            
+            chunk_notes = self.map_concurrently(
+                lambda i: groups[i][0] if len(groups[i]) == 1 else self._merge_notes(groups[i], language, use_cache),
+                len(groups)
+            )
+        
+        return chunk_notes[0]
+    
+    def _merge_notes(self, notes_list, language, use_cache=True):
+        """Merge several partial notes into one coherent Markdown document"""
+        language_names = {'en': 'English', 'zh-cn': '简体中文', 'zh-tw': '繁體中文'}
+        parts = "\n\n".join(f"=== 第 {i+1} 部分 ===\n{notes}" for i, notes in enumerate(notes_list))
+        
+        prompt = f"""以下是同一份學習材料按順序分段生成的筆記。請將它們合併為一份連貫、完整的學習筆記：
+- 保留所有概念、例子、公式和數據，不要刪減內容
+- 合併重複的標題和重複解釋的概念
+- 按主題重新組織成統一的標題層次 (H1, H2, H3)
+- 使用語言：{language_names.get(language, '繁體中文')}
+- 直接輸出筆記內容，不要添加總結性結尾
+
+{parts}
+"""
+        return self._chat_completion(
+            messages=[
+                {"role": "system", "content": NOTE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=Config.OPENAI_MAX_TOKENS,
+            temperature=Config.OPENAI_TEMPERATURE,
+            use_cache=use_cache
+        )
     
     def _create_prompt(self, content, detail_level, language='zh-tw', content_type='general'):
         """Create optimized prompt for note generation based on Claude Opus 4.1 suggestions"""
@@ -275,7 +487,7 @@ class OpenAIService:
 """
         return prompt
     
-    def generate_flashcards(self, notes, count=15, difficulty='medium', types=['definition', 'example'], language='zh-tw'):
+    def generate_flashcards(self, notes, count=15, difficulty='medium', types=['definition', 'example'], language='zh-tw', use_cache=True):
         """Generate enhanced flashcards from notes using optimized prompts"""
         
         # Enhanced language-specific instructions for flashcards
@@ -356,15 +568,13 @@ class OpenAIService:
 """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=Config.OPENAI_MODEL,
+            content = self._chat_completion(
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=2000,  # Increased for better flashcards
-                temperature=0.5
+                temperature=0.5,
+                use_cache=use_cache
             )
             
-            content = response.choices[0].message.content
-            
             # Parse JSON response
             import json
             import re
@@ -391,7 +601,7 @@ class OpenAIService:
         except Exception as e:
             raise Exception(f"Failed to generate flashcards: {str(e)}")
     
-    def generate_quiz(self, notes, language='zh-tw'):
+    def generate_quiz(self, notes, language='zh-tw', use_cache=True):
         """Generate quiz from notes"""
         
         # Language-specific instructions for quiz
@@ -446,24 +656,114 @@ class OpenAIService:
 """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=Config.OPENAI_MODEL,
+            return self._chat_completion(
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=2500,  # Increased for comprehensive quizzes
-                temperature=0.5
+                temperature=0.5,
+                use_cache=use_cache
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             raise Exception(f"Failed to generate quiz: {str(e)}")
 
-    def generate_unified_notes(self, content, detail_level='medium', language='zh-tw', context_info=None):
+    def classify_concept_relations(self, pairs, language='zh-tw', use_cache=True):
+        """Label each (concept A, concept B, section) pair in one request
+        
+        Returns one of 'a_before_b', 'b_before_a', 'related' or 'none' per
+        pair, in input order; pairs the response leaves out are 'none'.
+        """
+        language_names = {'en': 'English', 'zh-cn': '简体中文', 'zh-tw': '繁體中文'}
+        lines = "\n".join(f"{i}. A=「{a}」 B=「{b}」（章節：{section or '—'}）" for i, (a, b, section) in enumerate(pairs))
+        
+        prompt = f"""以下每一行是學習筆記中同一段落出現的兩個概念 A 與 B。請判斷它們的學習關係：
+- "a_before_b"：必須先理解 A 才能學習 B（A 是 B 的先備知識）
+- "b_before_a"：必須先理解 B 才能學習 A
+- "related"：相關，但沒有先後順序
+- "none"：沒有實質關係
+
+筆記語言：{language_names.get(language, '繁體中文')}
+
+只返回 JSON 陣列，不要其他文字：
+[{{"id": 0, "relation": "a_before_b"}}]
+
+{lines}
+"""
+        
+        content = self._chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=20 * len(pairs) + 100,
+            temperature=0,
+            use_cache=use_cache
+        )
+        
+        import json
+        import re
+        
+        try:
+            labels = json.loads(content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'\[.*\]', content, re.DOTALL)
+            labels = json.loads(json_match.group()) if json_match else []
+        
+        relations = ['none'] * len(pairs)
+        for item in labels if isinstance(labels, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index, relation = item.get('id'), item.get('relation')
+            if isinstance(index, int) and 0 <= index < len(pairs) and relation in ('a_before_b', 'b_before_a', 'related'):
+                relations[index] = relation
+        return relations
+
+    def generate_unified_notes(self, content, detail_level='medium', language='zh-tw', context_info=None, merge_chunks=None, use_cache=True):
         """Generate notes from multiple unified sources with enhanced context awareness"""
         
         if not context_info:
             context_info = {}
         
+        try:
+            if not self.chunker.needs_chunking(content):
+                return self._generate_unified_part(content, detail_level, language, context_info, use_cache=use_cache)
+            
+            # Combined sources exceed one request: summarize token-bounded chunks concurrently
+            chunks = self.chunker.split(content)
+            return self._map_reduce_chunks(
+                chunks,
+                lambda i: self._generate_unified_part(
+                    chunks[i], detail_level, language, context_info, (i, len(chunks)), use_cache
+                ),
+                language,
+                merge_chunks,
+                use_cache
+            )
+            
+        except Exception as e:
+            print(f"Error generating unified notes: {e}")
+            return "抱歉，生成統一筆記時出現錯誤。"
+    
+    def generate_unified_notes_stream(self, content, detail_level='medium', language='zh-tw', context_info=None, merge_chunks=None, use_cache=True):
+        """Streaming variant of generate_unified_notes: yields (event, data) pairs and returns the full notes"""
+        context_info = context_info or {}
+        return (yield from self._stream_notes(
+            content,
+            lambda text: self._unified_request(text, detail_level, language, context_info),
+            lambda chunks, i: self._generate_unified_part(
+                chunks[i], detail_level, language, context_info, (i, len(chunks)), use_cache
+            ),
+            language,
+            merge_chunks,
+            use_cache
+        ))
+    
+    def _generate_unified_part(self, content, detail_level, language, context_info, part=None, use_cache=True):
+        """Generate unified notes for the full content, or for one chunk of it when part=(index, total)"""
+        return self._chat_completion(
+            **self._unified_request(content, detail_level, language, context_info, part),
+            use_cache=use_cache
+        ).strip()
+    
+    def _unified_request(self, content, detail_level, language, context_info, part=None):
+        """Chat completion arguments for unified multi-source notes"""
+        
         # 專業學習筆記詳細度規格
         detail_instructions = {
             'brief': """📝 簡潔版 (快速複習筆記) - 目標：<500字，2分鐘閱讀
@@ -768,6 +1068,9 @@ class OpenAIService:
 ---
 
 請創建一份徹底完整、適合深度學習的專業筆記。"""
+        
+        if part:
+            prompt += f"\n\n注意：這是第 {part[0]+1} 部分，共 {part[1]} 部分。請確保內容銜接自然。不要添加總結性結尾，直接以內容結束。"
 
         # 根據詳細程度設置適當的 token 限制 - 用戶偏好無字數限制
         token_limits = {
@@ -777,19 +1080,12 @@ class OpenAIService:
         }
         max_tokens = token_limits.get(detail_level, 4000)
         
-        try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": language_instruction},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            print(f"Error generating unified notes: {e}")
-            return "抱歉，生成統一筆記時出現錯誤。"
\ No newline at end of file
+        return {
+            'messages': [
+                {"role": "system", "content": language_instruction},
+                {"role": "user", "content": prompt}
+            ],
+            'max_tokens': max_tokens,
+            'temperature': 0.3,
+            'model': self.model
+        }
\ No newline at end of file
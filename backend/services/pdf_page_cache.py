@@ -0,0 +1,203 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PDFPageCache:
+    """Persistent cache of extracted PDF page text.
+
+    Two levels, both in SQLite:
+    - documents: SHA-256 of the file -> page count and per-page content hashes,
+      so a re-upload of the same file is answered without opening it.
+    - pages: (page fingerprint, extractor version) -> text, shared across
+      documents, so a revised deck only re-extracts the pages that changed.
+      The fingerprint covers the content stream and every resource it draws
+      on (forms, fonts, ToUnicode maps), not just the stream.
+
+    Rows expire after `ttl_seconds`; least recently used pages are evicted
+    once the text exceeds `max_bytes`, tracked as a running total so writes
+    never sum the whole table.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=None, max_bytes=None):
+        self.db_path = db_path or Config.PDF_CACHE_DB_PATH
+        self.ttl_seconds = ttl_seconds or Config.PDF_CACHE_TTL_SECONDS
+        self.max_bytes = max_bytes or Config.PDF_CACHE_MAX_BYTES
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pdf_documents (
+                    doc_hash TEXT PRIMARY KEY,
+                    page_count INTEGER NOT NULL,
+                    page_hashes TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pdf_pages (
+                    page_hash TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (page_hash, extractor_version)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_pdf_documents_last_access ON pdf_documents (last_access)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_pdf_pages_last_access ON pdf_pages (last_access)')
+            # Running total so size-based eviction never needs a full-table SUM
+            conn.execute('CREATE TABLE IF NOT EXISTS pdf_cache_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)')
+            conn.execute(
+                'INSERT OR IGNORE INTO pdf_cache_stats (id, total_bytes) '
+                'SELECT 1, COALESCE(SUM(size), 0) FROM pdf_pages'
+            )
+
+    # =====================================================
+    # DOCUMENTS
+    # =====================================================
+
+    def get_document(self, doc_hash):
+        """(page_count, {page_index: page_hash}) for a known document, or None"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT page_count, page_hashes FROM pdf_documents WHERE doc_hash = ? AND last_access > ?',
+                (doc_hash, now - self.ttl_seconds)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute('UPDATE pdf_documents SET last_access = ? WHERE doc_hash = ?', (now, doc_hash))
+        return row['page_count'], {int(index): page_hash for index, page_hash in json.loads(row['page_hashes']).items()}
+
+    def put_document(self, doc_hash, page_count, page_hashes):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO pdf_documents (doc_hash, page_count, page_hashes, last_access) '
+                'VALUES (?, ?, ?, ?)',
+                (doc_hash, page_count, json.dumps(page_hashes), time.time())
+            )
+
+    # =====================================================
+    # PAGES
+    # =====================================================
+
+    def get_pages(self, page_hashes, extractor_version):
+        """{page_hash: text} for the hashes that are cached"""
+        unique = list(dict.fromkeys(page_hashes))
+        if not unique:
+            return {}
+
+        now = time.time()
+        found = {}
+        with self._connect() as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT page_hash, text FROM pdf_pages WHERE extractor_version = ? AND last_access > ? '
+                    f'AND page_hash IN ({placeholders})',
+                    [extractor_version, now - self.ttl_seconds, *batch]
+                ).fetchall()
+                found.update((row['page_hash'], row['text']) for row in rows)
+            conn.executemany(
+                'UPDATE pdf_pages SET last_access = ? WHERE page_hash = ? AND extractor_version = ?',
+                [(now, page_hash, extractor_version) for page_hash in found]
+            )
+        return found
+
+    def put_pages(self, pages, extractor_version):
+        """Store [(page_hash, text)] and evict to stay within the TTL and size budget"""
+        now = time.time()
+        rows = {page_hash: (page_hash, extractor_version, text, len(text.encode('utf-8')), now)
+                for page_hash, text in pages}
+        with self._connect() as conn:
+            replaced = 0
+            hashes = list(rows)
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                replaced += conn.execute(
+                    f'SELECT COALESCE(SUM(size), 0) FROM pdf_pages WHERE extractor_version = ? '
+                    f'AND page_hash IN ({placeholders})',
+                    [extractor_version, *batch]
+                ).fetchone()[0]
+            conn.executemany(
+                'INSERT OR REPLACE INTO pdf_pages (page_hash, extractor_version, text, size, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                list(rows.values())
+            )
+            self._add_bytes(conn, sum(row[3] for row in rows.values()) - replaced)
+            self._evict(conn, now)
+
+    def stats(self):
+        with self._connect() as conn:
+            documents = conn.execute('SELECT COUNT(*) FROM pdf_documents').fetchone()[0]
+            pages = conn.execute('SELECT COUNT(*) FROM pdf_pages').fetchone()[0]
+            size = conn.execute('SELECT total_bytes FROM pdf_cache_stats WHERE id = 1').fetchone()[0]
+        return {'documents': documents, 'pages': pages, 'bytes': size}
+
+    @staticmethod
+    def _add_bytes(conn, delta):
+        conn.execute('UPDATE pdf_cache_stats SET total_bytes = total_bytes + ? WHERE id = 1', (delta,))
+
+    def _evict(self, conn, now):
+        """Drop expired rows, then least recently used pages until under the size budget"""
+        cutoff = now - self.ttl_seconds
+        conn.execute('DELETE FROM pdf_documents WHERE last_access < ?', (cutoff,))
+        expired = conn.execute('SELECT COALESCE(SUM(size), 0) FROM pdf_pages WHERE last_access < ?', (cutoff,)).fetchone()[0]
+        if expired:
+            conn.execute('DELETE FROM pdf_pages WHERE last_access < ?', (cutoff,))
+            self._add_bytes(conn, -expired)
+
+        excess = conn.execute('SELECT total_bytes FROM pdf_cache_stats WHERE id = 1').fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+
+        freed = 0
+        victims = []
+        for row in conn.execute('SELECT page_hash, extractor_version, size FROM pdf_pages ORDER BY last_access'):
+            victims.append((row['page_hash'], row['extractor_version']))
+            freed += row['size']
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM pdf_pages WHERE page_hash = ? AND extractor_version = ?', victims)
+        self._add_bytes(conn, -freed)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_page_cache():
+    """Process-wide PDFPageCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PDFPageCache()
+        return _cache
@@ -1,61 +1,464 @@
 import PyPDF2
-from io import BytesIO
 import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from PyPDF2.generic import IndirectObject, StreamObject
+from config import Config
+from .pdf_page_cache import get_pdf_page_cache, file_sha256
+from .pdf_worker import iter_page_texts, extract_page_batch
+
+SPOOL_CHUNK_SIZE = 1024 * 1024  # 1MB copy buffer when spooling uploads to disk
+BASE64_CHUNK_CHARS = 4 * 64 * 1024  # base64 characters decoded per step (a multiple of 4)
+_UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+# Bump the suffix whenever extraction output changes so stale cached pages are not reused
+EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}-1"
+# Bump whenever _page_fingerprint changes; cached documents map to fingerprints of their scheme
+FINGERPRINT_VERSION = 2
+CACHE_WRITE_BATCH = 32
+
+
+def _object_digest(obj, memo):
+    """SHA-256 of a PDF object and everything it references: dict entries, arrays and decoded stream data.
+
+    Referenced objects are hashed once per document (`memo`, keyed by object
+    number), so fonts and forms shared by many pages are read once. Image
+    data is skipped since it never contributes extracted text.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key not in memo:
+            memo[key] = b'cycle'
+            memo[key] = _object_digest(obj.get_object(), memo)
+        return memo[key]
+
+    digest = hashlib.sha256(type(obj).__name__.encode())
+    if isinstance(obj, StreamObject) and obj.get('/Subtype') != '/Image':
+        digest.update(obj.get_data())
+    if isinstance(obj, dict):
+        for key in sorted(obj):
+            if key != '/Parent':
+                digest.update(key.encode('utf-8'))
+                digest.update(_object_digest(obj.raw_get(key) if hasattr(obj, 'raw_get') else obj[key], memo))
+    elif isinstance(obj, list):
+        for item in obj:
+            digest.update(_object_digest(item, memo))
+    else:
+        digest.update(repr(obj).encode('utf-8'))
+    return digest.digest()
+
+
+def _page_fingerprint(page, memo):
+    """Hash of everything a page's text is extracted from: its content stream plus its resources,
+    including Form XObjects drawn via Do, font programs and ToUnicode CMaps. Identical pages in
+    different files share it; any change to what extraction reads gives a new one."""
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = page.raw_get('/Resources') if '/Resources' in page else None
+    if resources is not None:
+        digest.update(_object_digest(resources, memo))
+    return digest.hexdigest()
+
+
+def _fingerprint_pages(path, page_indices=None):
+    """(page_count, {page_index: fingerprint}) for the given pages (all pages by default)"""
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        page_count = len(reader.pages)
+        if page_indices is None:
+            page_indices = range(page_count)
+        memo = {}
+        return page_count, {index: _page_fingerprint(reader.pages[index], memo) for index in page_indices}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    """Process pool shared by every PDF request, created on first use
+
+    Never forked from the server: by the time a PDF arrives it runs job
+    workers, thread pools and open SQLite connections, and a forked child
+    can deadlock on a lock some other thread held at fork time. Workers
+    come from a forkserver (a clean single-threaded process that has
+    preloaded pdf_worker) or, where that is unavailable, are spawned.
+
+    Either way multiprocessing re-imports the parent's main script in each
+    worker as __mp_main__. Under `python app.py` that re-runs app.py's
+    module-level setup (config, database schema check, service objects)
+    once per worker when the pool starts; the `if __name__ == '__main__'`
+    block, and so the server itself, does not run. Workers live as long as
+    the pool, so this is paid PDF_EXTRACT_WORKERS times per server process.
+    Under `flask run` or a WSGI server the main script is the runner's own
+    small entry point, which does not build the app's services.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['services.pdf_worker'])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=Config.PDF_EXTRACT_WORKERS, mp_context=context)
+        return _pool
+
 
 class PDFService:
+    """PDF text extraction.
+
+    Uploads are spooled to a temporary file rather than held in memory, and
+    PyPDF2 reads pages lazily from disk. Documents larger than
+    `PDF_PARALLEL_MIN_PAGES` are extracted in page batches across a shared
+    process pool; `iter_pages` yields pages in order as soon as they are
+    ready, and the full text is joined once at the end.
+    """
+
     @staticmethod
-    def extract_text(file):
-        """Extract text from PDF file"""
+    @contextmanager
+    def _temp_pdf(write):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
         try:
-            # Read PDF file
-            pdf_reader = PyPDF2.PdfReader(BytesIO(file.read()))
-            
-            # Extract text from all pages
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-            
-            # Clean up text
-            text = text.strip()
-            
-            if not text:
-                raise ValueError("No text found in PDF")
-            
-            return text
-            
+            with os.fdopen(fd, 'wb') as out:
+                write(out)
+            yield path
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def spooled(file):
+        """Copy a file-like upload to a temp file in bounded chunks; yields its path and removes it afterwards"""
+        return PDFService._temp_pdf(lambda out: shutil.copyfileobj(file, out, SPOOL_CHUNK_SIZE))
+
+    @staticmethod
+    def spooled_base64(data):
+        """Decode base64 (optionally a data: URL) to a temp file chunk by chunk; yields its path"""
+        return PDFService._temp_pdf(lambda out: PDFService.decode_base64_to(data, out))
+
+    @staticmethod
+    def base64_size(data):
+        """Decoded size of base64 (optionally a data: URL) in bytes, without decoding it"""
+        start = data.find(',') + 1 if data.startswith('data:') else 0
+        length = len(data) - start - sum(data.count(c, start) for c in ' \t\r\n')
+        tail = data[-8:].rstrip()
+        padding = len(tail) - len(tail.rstrip('='))
+        return max(length - padding, 0) * 3 // 4
+
+    @staticmethod
+    def decode_base64_to(data, out):
+        """Write decoded base64 to `out` in bounded steps, never copying or decoding the whole string at once"""
+        start = data.find(',') + 1 if data.startswith('data:') else 0
+        pending = ''
+        for offset in range(start, len(data), BASE64_CHUNK_CHARS):
+            piece = pending + ''.join(data[offset:offset + BASE64_CHUNK_CHARS].split())
+            usable = len(piece) - len(piece) % 4
+            out.write(base64.b64decode(piece[:usable]))
+            pending = piece[usable:]
+        if pending:
+            out.write(base64.b64decode(pending + '=' * (-len(pending) % 4)))
+
+    # =====================================================
+    # MULTIPART UPLOADS
+    # =====================================================
+
+    @staticmethod
+    def _upload_path(upload_id):
+        if not _UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+            raise ValueError("Invalid upload id")
+        return os.path.join(Config.UPLOAD_DIR, f"{upload_id}.pdf")
+
+    @staticmethod
+    def save_upload(file):
+        """Stream a multipart upload to disk; returns file info referencing it by upload_id"""
+        os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        path = PDFService._upload_path(upload_id)
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(file, out, SPOOL_CHUNK_SIZE)
+
+        size = os.path.getsize(path)
+        if size > Config.MAX_FILE_SIZE:
+            os.remove(path)
+            raise ValueError(f"File too large: {file.filename} (max {Config.MAX_FILE_SIZE // (1024 * 1024)}MB)")
+
+        return {'name': file.filename, 'size': size, 'upload_id': upload_id}
+
+    @staticmethod
+    def discard_uploads(file_infos):
+        """Delete saved uploads once they have been ingested"""
+        for file_info in file_infos or []:
+            if file_info.get('upload_id'):
+                try:
+                    os.remove(PDFService._upload_path(file_info['upload_id']))
+                except (OSError, ValueError):
+                    pass
+
+    # =====================================================
+    # EXTRACTION
+    # =====================================================
+
+    @staticmethod
+    def page_count(path):
+        with open(path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+
+    @staticmethod
+    def _document_key(path):
+        return f"{file_sha256(path)}:{FINGERPRINT_VERSION}"
+
+    @staticmethod
+    def cached_page_texts(path):
+        """{page_index: text} for the pages of this document already in the page cache; never parses the PDF"""
+        if not Config.PDF_CACHE_ENABLED:
+            return {}
+        cache = get_pdf_page_cache()
+        document = cache.get_document(PDFService._document_key(path))
+        if not document:
+            return {}
+        page_hashes = document[1]
+        texts = cache.get_pages(list(page_hashes.values()), EXTRACTOR_VERSION)
+        return {index: texts[page_hash] for index, page_hash in page_hashes.items() if page_hash in texts}
+
+    @staticmethod
+    def iter_pages(path, page_indices=None, use_cache=True):
+        """Yield (page_index, text) in page order, each as soon as it and every page before it is ready.
+
+        Pages already in the page cache (matched by content fingerprint) are
+        not parsed again; a document seen before is not even opened.
+        """
+        if not (use_cache and Config.PDF_CACHE_ENABLED):
+            if page_indices is None:
+                page_indices = range(PDFService.page_count(path))
+            yield from PDFService._extract_pages(path, list(page_indices))
+            return
+
+        cache = get_pdf_page_cache()
+        doc_hash = PDFService._document_key(path)
+        document = cache.get_document(doc_hash)
+        if document:
+            page_count, page_hashes = document
+            page_indices = list(range(page_count) if page_indices is None else page_indices)
+            unhashed = [index for index in page_indices if index not in page_hashes]
+            if unhashed:
+                page_hashes.update(_fingerprint_pages(path, unhashed)[1])
+                cache.put_document(doc_hash, page_count, page_hashes)
+        else:
+            page_count, page_hashes = _fingerprint_pages(path, page_indices)
+            page_indices = list(range(page_count) if page_indices is None else page_indices)
+            cache.put_document(doc_hash, page_count, page_hashes)
+
+        texts = cache.get_pages([page_hashes[index] for index in page_indices], EXTRACTOR_VERSION)
+        # Extract each missing fingerprint once (repeated pages, e.g. blank ones, share it)
+        missing = []
+        seen = set(texts)
+        for index in page_indices:
+            if page_hashes[index] not in seen:
+                seen.add(page_hashes[index])
+                missing.append(index)
+        if missing:
+            print(f"PDF cache: extracting {len(missing)} of {len(page_indices)} page(s)")
+
+        fresh = PDFService._extract_pages(path, missing)
+        new_pages = []
+        try:
+            for index in page_indices:
+                page_hash = page_hashes[index]
+                if page_hash not in texts:
+                    _, texts[page_hash] = next(fresh)
+                    new_pages.append((page_hash, texts[page_hash]))
+                    if len(new_pages) >= CACHE_WRITE_BATCH:
+                        cache.put_pages(new_pages, EXTRACTOR_VERSION)
+                        new_pages = []
+                yield index, texts[page_hash]
+        finally:
+            fresh.close()
+            if new_pages:
+                cache.put_pages(new_pages, EXTRACTOR_VERSION)
+
+    @staticmethod
+    def _extract_pages(path, page_indices):
+        """Parse pages with PyPDF2, across the process pool for large selections"""
+        pool = None
+        if len(page_indices) >= Config.PDF_PARALLEL_MIN_PAGES and Config.PDF_EXTRACT_WORKERS > 1:
+            pool = _get_process_pool()
+        if pool is None:
+            yield from iter_page_texts(path, page_indices)
+            return
+
+        batch = max(1, Config.PDF_PAGE_BATCH)
+        futures = [
+            pool.submit(extract_page_batch, path, page_indices[i:i + batch])
+            for i in range(0, len(page_indices), batch)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # Consumer stopped early (or a batch failed): drop batches that haven't started
+            for future in futures:
+                future.cancel()
+
+    # =====================================================
+    # PAGE SELECTION
+    # =====================================================
+
+    @staticmethod
+    def parse_page_ranges(spec, page_count):
+        """'1-3, 5, 9-' (1-based, inclusive) -> sorted 0-based page indices"""
+        selected = set()
+        for part in str(spec).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            match = re.fullmatch(r'(\d+)?\s*(-)?\s*(\d+)?', part)
+            if not match or not (match.group(1) or match.group(3)):
+                raise ValueError(f"Invalid page range: {part}")
+            start = int(match.group(1) or 1)
+            end = int(match.group(3) or (page_count if match.group(2) else start))
+            if start < 1 or end > page_count or start > end:
+                raise ValueError(f"Page range {part} is outside 1-{page_count}")
+            selected.update(range(start - 1, end))
+        return sorted(selected)
+
+    @staticmethod
+    def get_outline(path):
+        """(page_count, flattened outline) with each entry's 1-based page span"""
+        with open(path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            page_count = len(reader.pages)
+            entries = []
+
+            def walk(items, level):
+                for item in items:
+                    if isinstance(item, list):
+                        walk(item, level + 1)
+                        continue
+                    try:
+                        page = reader.get_destination_page_number(item)
+                    except Exception:
+                        page = None
+                    entries.append({'title': str(item.title), 'level': level, 'page': page})
+
+            try:
+                walk(reader.outline, 0)
+            except Exception as e:
+                print(f"Failed to read PDF outline: {e}")
+
+        outline = []
+        for i, entry in enumerate(entries):
+            if entry['page'] is None or entry['page'] < 0:
+                continue
+            # A section runs until the next entry at the same or a higher level
+            end = page_count
+            for following in entries[i + 1:]:
+                if following['level'] <= entry['level'] and following['page'] is not None and following['page'] >= 0:
+                    end = max(following['page'], entry['page'] + 1)
+                    break
+            outline.append({
+                'id': len(outline),
+                'title': entry['title'],
+                'level': entry['level'],
+                'page': entry['page'] + 1,
+                'end_page': end
+            })
+        return page_count, outline
+
+    @staticmethod
+    def select_pages(path, pages=None, sections=None):
+        """0-based page indices chosen by a page-range spec and/or outline sections (ids or titles).
+
+        Returns None when nothing is selected, meaning the whole document.
+        """
+        if isinstance(sections, str):
+            sections = json.loads(sections) if sections.strip().startswith('[') else \
+                [section.strip() for section in sections.split(',') if section.strip()]
+        if not pages and not sections:
+            return None
+
+        if sections:
+            page_count, outline = PDFService.get_outline(path)
+        else:
+            page_count, outline = PDFService.page_count(path), []
+
+        selected = set(PDFService.parse_page_ranges(pages, page_count)) if pages else set()
+        for section in sections or []:
+            key = str(section).strip()
+            entry = next((e for e in outline if str(e['id']) == key), None) or \
+                next((e for e in outline if e['title'].strip() == key), None)
+            if not entry:
+                raise ValueError(f"Unknown outline section: {section}")
+            selected.update(range(entry['page'] - 1, entry['end_page']))
+        return sorted(selected)
+
+    @staticmethod
+    def document_info(path, page_chars=False):
+        """Page count, outline and per-page text length.
+
+        Only the outline is read, so this stays cheap for large documents.
+        Page lengths come from the page cache; pages it does not hold report
+        None unless `page_chars` is set, which extracts them (through the
+        cache, so extracting a selection afterwards parses nothing again).
+        """
+        page_count, outline = PDFService.get_outline(path)
+        texts = dict(PDFService.iter_pages(path)) if page_chars else PDFService.cached_page_texts(path)
+        pages = [
+            {'page': index + 1, 'chars': len(texts[index].strip()) if index in texts else None}
+            for index in range(page_count)
+        ]
+        return {
+            'page_count': page_count,
+            'outline': outline,
+            'pages': pages,
+            'total_chars': sum(page['chars'] for page in pages) if len(texts) >= page_count else None
+        }
+
+    @staticmethod
+    def extract_text_from_path(path, page_indices=None):
+        """Extract and join page text from a PDF on disk"""
+        text = "\n\n".join(page_text for _, page_text in PDFService.iter_pages(path, page_indices)).strip()
+        if not text:
+            raise ValueError("No text found in PDF")
+        return text
+
+    @staticmethod
+    def extract_selected_text(path, pages=None, sections=None):
+        """Extract only the selected pages; untouched pages are never parsed"""
+        return PDFService.extract_text_from_path(path, PDFService.select_pages(path, pages, sections))
+
+    @staticmethod
+    def extract_text(file, pages=None, sections=None):
+        """Extract text from PDF file (optionally a page range and/or outline sections)"""
+        try:
+            with PDFService.spooled(file) as path:
+                return PDFService.extract_selected_text(path, pages, sections)
+        except ValueError as e:
+            raise ValueError(f"Failed to extract PDF text: {str(e)}")
         except Exception as e:
             raise Exception(f"Failed to extract PDF text: {str(e)}")
-    
+
     @staticmethod
     def extract_text_from_file(file_info):
-        """Extract text from file info (base64 encoded data)"""
+        """Extract text from file info (a saved multipart upload, or base64 encoded data)"""
+        pages, sections = file_info.get('pages'), file_info.get('sections')
         try:
-            # Get file data from base64
-            file_data = file_info.get('data', '')
-            if file_data.startswith('data:'):
-                # Remove data URL prefix
-                file_data = file_data.split(',')[1]
-            
-            # Decode base64 data
-            file_bytes = base64.b64decode(file_data)
-            
-            # Read PDF file
-            pdf_reader = PyPDF2.PdfReader(BytesIO(file_bytes))
-            
-            # Extract text from all pages
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-            
-            # Clean up text
-            text = text.strip()
-            
-            if not text:
-                raise ValueError("No text found in PDF")
-            
-            return text
-            
+            if file_info.get('upload_id'):
+                return PDFService.extract_selected_text(
+                    PDFService._upload_path(file_info['upload_id']), pages, sections
+                )
+
+            with PDFService.spooled_base64(file_info.get('data', '')) as path:
+                return PDFService.extract_selected_text(path, pages, sections)
+
         except Exception as e:
-            raise Exception(f"Failed to extract PDF text from file info: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to extract PDF text from file info: {str(e)}")
@@ -0,0 +1,19 @@
+"""Page extraction run inside the PDF process pool.
+
+Kept free of Config, Flask and database imports: pool workers are started
+with forkserver/spawn and import only this module (and PyPDF2).
+"""
+import PyPDF2
+
+
+def iter_page_texts(path, page_indices):
+    """Open the PDF once (lazily, from disk) and yield (page_index, text) for the given pages"""
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for index in page_indices:
+            yield index, reader.pages[index].extract_text() or ''
+
+
+def extract_page_batch(path, page_indices):
+    """Process-pool task: extract a contiguous batch of pages"""
+    return list(iter_page_texts(path, page_indices))
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Client-side sliding-window limiter for requests/min and tokens/min.
+
+    Shared by every thread that talks to the OpenAI API so concurrent chunk
+    requests back off locally instead of tripping the server-side 429s.
+    A limit of 0 disables that dimension.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] >= self.WINDOW_SECONDS:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, now, tokens):
+        """Seconds until a request of `tokens` fits in the window (0 if it fits now)"""
+        wait = 0.0
+
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            oldest = self._events[len(self._events) - self.requests_per_minute][0]
+            wait = max(wait, oldest + self.WINDOW_SECONDS - now)
+
+        if self.tokens_per_minute and self._events:
+            # A single request larger than the whole budget is let through once the window is empty
+            excess = self._tokens_in_window + tokens - self.tokens_per_minute
+            if excess > 0:
+                released = 0
+                for timestamp, event_tokens in self._events:
+                    released += event_tokens
+                    if released >= excess:
+                        wait = max(wait, timestamp + self.WINDOW_SECONDS - now)
+                        break
+                else:
+                    wait = max(wait, self._events[-1][0] + self.WINDOW_SECONDS - now)
+
+        return wait
+
+    def acquire(self, tokens=0):
+        """Block until a request using `tokens` tokens may be sent, then record it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+            time.sleep(min(wait, 1.0))
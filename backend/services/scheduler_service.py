@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta
+import numpy as np
+from config import Config
+
+# Card states stored in CardState.state (and logged on each Review)
+STATE_NEW = 0
+STATE_REVIEW = 2
+STATE_RELEARNING = 3
+
+RATING_AGAIN = 1
+RATING_HARD = 2
+RATING_EASY = 4
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_days(timestamps):
+    """Naive UTC datetimes -> float days since the epoch (numpy array)"""
+    # Integer timedelta division is several times faster than np.array(..., 'datetime64[us]')
+    micros = np.fromiter(((ts - EPOCH) // MICROSECOND for ts in timestamps), dtype=np.int64, count=len(timestamps))
+    return micros / 86_400e6
+
+
+def from_days(days):
+    return EPOCH + timedelta(days=float(days))
+
+
+class FSRSScheduler:
+    """FSRS-4.5 memory model, vectorized over cards with NumPy.
+
+    Each card has a stability S (days until recall probability falls to 90%)
+    and a difficulty D in [1, 10]. Every review updates both from the rating
+    (1 again, 2 hard, 3 good, 4 easy) and the recall probability at the time
+    of the review; the next interval is the time until recall probability
+    falls to `desired_retention`.
+
+    replay() recomputes the state of many cards from their review logs at
+    once: it walks review positions (1st review of every card, then 2nd, ...)
+    so the Python loop runs once per review *position*, not per review row.
+    """
+
+    # Default FSRS-4.5 parameters
+    WEIGHTS = np.array([
+        0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+        0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755
+    ])
+    DECAY = -0.5
+    FACTOR = 0.9 ** (1 / DECAY) - 1
+
+    def __init__(self, desired_retention=None, maximum_interval=None):
+        self.desired_retention = desired_retention or Config.SRS_DESIRED_RETENTION
+        self.maximum_interval = maximum_interval or Config.SRS_MAXIMUM_INTERVAL
+
+    # =====================================================
+    # MEMORY MODEL (element-wise over arrays)
+    # =====================================================
+
+    def retrievability(self, elapsed_days, stability):
+        return (1 + self.FACTOR * elapsed_days / stability) ** self.DECAY
+
+    def initial_stability(self, rating):
+        return self.WEIGHTS[rating - 1]
+
+    def initial_difficulty(self, rating):
+        w = self.WEIGHTS
+        return np.clip(w[4] - (rating - 3) * w[5], 1, 10)
+
+    def next_difficulty(self, difficulty, rating):
+        w = self.WEIGHTS
+        updated = difficulty - w[6] * (rating - 3)
+        # Mean reversion towards the initial difficulty of a "good" rating
+        return np.clip(w[7] * w[4] + (1 - w[7]) * updated, 1, 10)
+
+    def next_stability(self, difficulty, stability, retrievability, rating):
+        w = self.WEIGHTS
+        hard_penalty = np.where(rating == RATING_HARD, w[15], 1.0)
+        easy_bonus = np.where(rating == RATING_EASY, w[16], 1.0)
+        recall = stability * (1 + np.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+                              * (np.exp(w[10] * (1 - retrievability)) - 1) * hard_penalty * easy_bonus)
+        forget = (w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1)
+                  * np.exp(w[14] * (1 - retrievability)))
+        return np.where(rating == RATING_AGAIN, np.minimum(forget, stability), recall)
+
+    def interval(self, stability):
+        """Whole days until recall probability reaches desired_retention"""
+        days = stability / self.FACTOR * (self.desired_retention ** (1 / self.DECAY) - 1)
+        return np.clip(np.rint(days), 1, self.maximum_interval)
+
+    # =====================================================
+    # REPLAY
+    # =====================================================
+
+    def replay(self, card_ids, reviewed_days, ratings):
+        """Current state of every card from its full review log
+
+        Inputs are parallel arrays of review rows (reviewed_days from
+        to_days()), fastest when ordered by card and then time. Returns a dict of arrays aligned with 'card_id':
+        stability, difficulty, state, reps, lapses, last_review and due (both
+        in days), interval (days) and last_rating, plus 'latest_row': the
+        index into the inputs of each card's most recent review.
+        """
+        card_ids = np.asarray(card_ids)
+        reviewed_days = np.asarray(reviewed_days, dtype=np.float64)
+        ratings = np.asarray(ratings, dtype=np.int64)
+        if len(card_ids) == 0:
+            return None
+
+        # Callers normally fetch rows ordered by (card, time); a stable sort on
+        # the card is then nearly free, and lexsort is only the fallback
+        order = np.argsort(card_ids, kind='stable')
+        sorted_cards = card_ids[order]
+        same_card = sorted_cards[1:] == sorted_cards[:-1]
+        if np.any(same_card & (np.diff(reviewed_days[order]) < 0)):
+            order = np.lexsort((reviewed_days, card_ids))
+            sorted_cards = card_ids[order]
+            same_card = sorted_cards[1:] == sorted_cards[:-1]
+        first = np.flatnonzero(np.r_[True, ~same_card])
+        counts = np.diff(np.r_[first, len(order)])
+        unique_cards = sorted_cards[first]
+        card_index = np.repeat(np.arange(len(unique_cards)), counts)
+        position = (np.arange(len(order)) - np.repeat(first, counts)).astype(np.min_scalar_type(counts.max()))
+
+        # Review rows grouped by position, so step k touches each card's k-th review
+        by_step = np.argsort(position, kind='stable')
+        step_bounds = np.searchsorted(position[by_step], np.arange(counts.max() + 1))
+
+        n = len(unique_cards)
+        stability = np.zeros(n)
+        difficulty = np.zeros(n)
+        last_review = np.zeros(n)
+        last_rating = np.zeros(n, dtype=np.int64)
+        lapses = np.zeros(n, dtype=np.int64)
+
+        for k in range(counts.max()):
+            rows = by_step[step_bounds[k]:step_bounds[k + 1]]
+            cards = card_index[rows]
+            rating = ratings[order[rows]]
+            day = reviewed_days[order[rows]]
+
+            if k == 0:
+                stability[cards] = self.initial_stability(rating)
+                difficulty[cards] = self.initial_difficulty(rating)
+            else:
+                elapsed = np.maximum(day - last_review[cards], 0)
+                recall = self.retrievability(elapsed, stability[cards])
+                stability[cards] = self.next_stability(difficulty[cards], stability[cards], recall, rating)
+                difficulty[cards] = self.next_difficulty(difficulty[cards], rating)
+                lapses[cards] += rating == RATING_AGAIN
+            last_review[cards] = day
+            last_rating[cards] = rating
+
+        interval = self.interval(stability)
+        return {
+            'card_id': unique_cards,
+            'stability': stability,
+            'difficulty': difficulty,
+            'state': np.where(last_rating == RATING_AGAIN, STATE_RELEARNING, STATE_REVIEW),
+            'reps': counts,
+            'lapses': lapses,
+            'last_review': last_review,
+            'last_rating': last_rating,
+            'interval': interval,
+            'due': last_review + interval,
+            'latest_row': order[first + counts - 1],
+        }
+
+    def next_state(self, previous: dict, reviewed_at: datetime, rating: int) -> dict:
+        """Step one card's state by a single review, matching what replay() computes
+        
+        `previous` holds the card's stability, difficulty, reps, lapses and
+        last_review (None for a card's first review). Returns the new values
+        keyed like the CardState columns.
+        """
+        if previous is None:
+            day = to_days([reviewed_at])[0]
+            stability = float(self.initial_stability(rating))
+            difficulty = float(self.initial_difficulty(rating))
+            reps, lapses = 1, 0
+        else:
+            last_day, day = to_days([previous['last_review'], reviewed_at])
+            recall = self.retrievability(max(day - last_day, 0), previous['stability'])
+            stability = float(self.next_stability(previous['difficulty'], previous['stability'], recall, rating))
+            difficulty = float(self.next_difficulty(previous['difficulty'], rating))
+            reps = previous['reps'] + 1
+            lapses = previous['lapses'] + (rating == RATING_AGAIN)
+        interval = float(self.interval(stability))
+        return {
+            'stability': stability,
+            'difficulty': difficulty,
+            'state': STATE_RELEARNING if rating == RATING_AGAIN else STATE_REVIEW,
+            'reps': reps,
+            'lapses': lapses,
+            'last_review': reviewed_at,
+            'last_rating': rating,
+            'scheduled_days': interval,
+            # Same day arithmetic as replay(), so both paths agree to the microsecond
+            'due_at': from_days(day + interval),
+        }
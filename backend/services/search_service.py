@@ -0,0 +1,337 @@
+import html
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from .transcript_store import get_transcript_store
+
+DOC_NOTE = 'note'
+DOC_FLASHCARD = 'flashcard'
+DOC_TRANSCRIPT = 'transcript'
+DOC_TYPES = (DOC_NOTE, DOC_FLASHCARD, DOC_TRANSCRIPT)
+
+# Han, kana and hangul: written without spaces, so indexed as overlapping bigrams
+CJK_RUN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+')
+QUERY_TERM = re.compile(r'\w+')
+
+
+def _bigrams(run):
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def _index_tokens(run):
+    # The run's last character also gets a unigram, so every character starts
+    # some token and single-character prefix queries find all of them
+    tokens = _bigrams(run)
+    return tokens + [run[-1]] if len(run) > 1 else tokens
+
+
+def tokenize(text):
+    """Text as FTS5 should index it: CJK runs become space-separated bigrams,
+    everything else is left to FTS5's unicode61 tokenizer."""
+    return CJK_RUN.sub(lambda m: ' ' + ' '.join(_index_tokens(m.group())) + ' ', text or '')
+
+
+def build_match(query):
+    """FTS5 MATCH expression for a user query, or None if it has no searchable terms
+
+    Every term must match (implicit AND). A CJK term matches as the phrase of
+    its bigrams, which only hits adjacent characters; a single CJK character
+    and the last Latin term match as prefixes.
+    """
+    clauses = []
+    terms = QUERY_TERM.findall(query or '')
+    for i, term in enumerate(terms):
+        position = 0
+        for match in CJK_RUN.finditer(term):
+            if match.start() > position:
+                clauses.append(_latin_clause(term[position:match.start()], prefix=False))
+            run = match.group()
+            if len(run) == 1:
+                clauses.append(f'"{run}"*')
+            else:
+                clauses.append('"' + ' '.join(_bigrams(run)) + '"')
+            position = match.end()
+        if position < len(term):
+            clauses.append(_latin_clause(term[position:], prefix=i == len(terms) - 1))
+    return ' '.join(clauses) or None
+
+
+def _latin_clause(term, prefix):
+    term = term.replace('"', '""')
+    return f'"{term}"*' if prefix else f'"{term}"'
+
+
+def highlight_terms(query):
+    """Query terms as they appear in the original text, for snippets"""
+    terms = []
+    for term in QUERY_TERM.findall(query or ''):
+        position = 0
+        for match in CJK_RUN.finditer(term):
+            if match.start() > position:
+                terms.append(term[position:match.start()])
+            terms.append(match.group())
+            position = match.end()
+        if position < len(term):
+            terms.append(term[position:])
+    return sorted(set(terms), key=len, reverse=True)
+
+
+class SearchIndex:
+    """Full-text index over notes, flashcards and cached transcripts.
+
+    Documents live in SQLite next to a contentless FTS5 table indexing their
+    tokenized title and body (see tokenize), so zh-tw text is searchable
+    without a custom tokenizer extension. Results are ranked by bm25 with
+    titles weighted above bodies, and snippets are cut from the original text.
+
+    bm25 costs time per matching document, so only the newest `rank_window`
+    matches are ranked; broad queries ("學") stay fast at the cost of not
+    considering very old documents.
+
+    Notes and flashcards are indexed by DatabaseService as they change;
+    transcripts are pulled from the TranscriptStore past a stored watermark
+    (see sync_transcripts).
+    """
+
+    TITLE_WEIGHT = 5.0
+    BODY_WEIGHT = 1.0
+    SNIPPET_CHARS = 160
+
+    def __init__(self, db_path=None, transcript_sync_seconds=None, rank_window=None):
+        self.db_path = db_path or Config.SEARCH_DB_PATH
+        self.rank_window = rank_window or Config.SEARCH_RANK_WINDOW
+        self.transcript_sync_seconds = transcript_sync_seconds if transcript_sync_seconds is not None \
+            else Config.SEARCH_TRANSCRIPT_SYNC_SECONDS
+        self._last_transcript_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_docs (
+                    id INTEGER PRIMARY KEY,
+                    doc_type TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    title TEXT NOT NULL DEFAULT '',
+                    body TEXT NOT NULL DEFAULT '',
+                    updated_at REAL NOT NULL,
+                    UNIQUE (doc_type, doc_id)
+                )
+            """)
+            # rowid = search_docs.id. Contentless: the original text is in
+            # search_docs, and deletes re-tokenize it. The 1-character prefix
+            # index serves single-character CJK queries.
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_fts
+                USING fts5(title, body, content = '', prefix = '1', tokenize = 'unicode61 remove_diacritics 2')
+            """)
+            conn.execute('CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    # =====================================================
+    # INDEXING
+    # =====================================================
+
+    def upsert(self, doc_type, doc_id, title, body):
+        self.upsert_many([(doc_type, doc_id, title, body)])
+
+    def upsert_many(self, docs):
+        """Index or re-index [(doc_type, doc_id, title, body)] in one transaction"""
+        now = time.time()
+        with self._connect() as conn:
+            for doc_type, doc_id, title, body in docs:
+                title, body = title or '', body or ''
+                row = conn.execute(
+                    'SELECT id, title, body FROM search_docs WHERE doc_type = ? AND doc_id = ?', (doc_type, str(doc_id))
+                ).fetchone()
+                if row:
+                    rowid = row['id']
+                    self._unindex_rows(conn, [row])
+                    conn.execute('UPDATE search_docs SET title = ?, body = ?, updated_at = ? WHERE id = ?',
+                                 (title, body, now, rowid))
+                else:
+                    rowid = conn.execute(
+                        'INSERT INTO search_docs (doc_type, doc_id, title, body, updated_at) VALUES (?, ?, ?, ?, ?)',
+                        (doc_type, str(doc_id), title, body, now)
+                    ).lastrowid
+                conn.execute('INSERT INTO search_fts (rowid, title, body) VALUES (?, ?, ?)',
+                             (rowid, tokenize(title), tokenize(body)))
+
+    def delete(self, doc_type, doc_ids):
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        with self._connect() as conn:
+            for i in range(0, len(doc_ids), 500):
+                batch = doc_ids[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT id, title, body FROM search_docs WHERE doc_type = ? AND doc_id IN ({placeholders})',
+                    [doc_type, *batch]
+                ).fetchall()
+                self._unindex_rows(conn, rows)
+                conn.executemany('DELETE FROM search_docs WHERE id = ?', [(row['id'],) for row in rows])
+
+    def clear(self, doc_type):
+        with self._connect() as conn:
+            self._unindex_rows(conn, conn.execute(
+                'SELECT id, title, body FROM search_docs WHERE doc_type = ?', (doc_type,)
+            ))
+            conn.execute('DELETE FROM search_docs WHERE doc_type = ?', (doc_type,))
+
+    @staticmethod
+    def _unindex_rows(conn, rows):
+        """Remove search_docs rows from the contentless FTS table (needs the indexed values)"""
+        conn.executemany(
+            "INSERT INTO search_fts (search_fts, rowid, title, body) VALUES ('delete', ?, ?, ?)",
+            [(row['id'], tokenize(row['title']), tokenize(row['body'])) for row in rows]
+        )
+
+    def sync_transcripts(self, store=None, force=False, full=False):
+        """Index transcripts cached since the last sync; returns how many were indexed
+
+        Runs at most once per transcript_sync_seconds unless forced; `full`
+        drops indexed transcripts and re-reads the whole store.
+        """
+        with self._sync_lock:
+            now = time.time()
+            if not (force or full) and now - self._last_transcript_sync < self.transcript_sync_seconds:
+                return 0
+            self._last_transcript_sync = now
+
+            store = store or get_transcript_store()
+            if full:
+                self.clear(DOC_TRANSCRIPT)
+                created_at, row_id = 0.0, 0
+            else:
+                created_at, row_id = self._get_watermark()
+            indexed = 0
+            while True:
+                entries = store.changed_since(created_at, row_id)
+                if not entries:
+                    break
+                self.upsert_many(
+                    (DOC_TRANSCRIPT, entry['video_id'], entry['title'] or entry['result'].get('title'),
+                     entry['result'].get('transcript'))
+                    for entry in entries
+                )
+                created_at, row_id = entries[-1]['created_at'], entries[-1]['id']
+                self._set_watermark(created_at, row_id)
+                indexed += len(entries)
+            return indexed
+
+    def _get_watermark(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM search_meta WHERE key = 'transcript_watermark'").fetchone()
+        if not row:
+            return 0.0, 0
+        created_at, row_id = row['value'].split('|')
+        return float(created_at), int(row_id)
+
+    def _set_watermark(self, created_at, row_id):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('transcript_watermark', ?)",
+                         (f'{created_at!r}|{row_id}',))
+
+    # =====================================================
+    # SEARCH
+    # =====================================================
+
+    def search(self, query, types=None, limit=20):
+        """Ranked [{type, id, title, snippet, score}] for a query (lower score ranks higher)"""
+        match = build_match(query)
+        if not match:
+            return []
+
+        matches = 'FROM search_fts'
+        type_params = []
+        if types:
+            matches += f" JOIN search_docs t ON t.id = search_fts.rowid AND t.doc_type IN ({','.join('?' * len(types))})"
+            type_params = list(types)
+        matches += ' WHERE search_fts MATCH ?'
+
+        with self._connect() as conn:
+            # Oldest rowid inside the ranking window; None when all matches fit
+            floor = conn.execute(
+                f'SELECT search_fts.rowid {matches} ORDER BY search_fts.rowid DESC LIMIT 1 OFFSET ?',
+                [*type_params, match, self.rank_window - 1]
+            ).fetchone()
+
+            # Rank inside the FTS index first and only then fetch the winners'
+            # documents, so common terms don't load every matching body
+            ranked = f'SELECT search_fts.rowid AS id, bm25(search_fts, ?, ?) AS score {matches}'
+            params = [self.TITLE_WEIGHT, self.BODY_WEIGHT, *type_params, match]
+            if floor:
+                ranked += ' AND search_fts.rowid >= ?'
+                params.append(floor[0])
+            ranked += ' ORDER BY score LIMIT ?'
+            params.append(limit)
+            rows = conn.execute(
+                f'SELECT d.doc_type, d.doc_id, d.title, d.body, top.score FROM ({ranked}) top '
+                'JOIN search_docs d ON d.id = top.id ORDER BY top.score',
+                params
+            ).fetchall()
+
+        pattern = self._highlight_pattern(query)
+        return [{
+            'type': row['doc_type'],
+            'id': int(row['doc_id']) if row['doc_type'] != DOC_TRANSCRIPT else row['doc_id'],
+            'title': row['title'],
+            'snippet': self._snippet(row['body'], pattern),
+            'score': round(row['score'], 4)
+        } for row in rows]
+
+    @staticmethod
+    def _highlight_pattern(query):
+        terms = highlight_terms(query)
+        return re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE) if terms else None
+
+    def _snippet(self, body, pattern):
+        """Window of the original body around the first hit, with hits wrapped in <mark>"""
+        first = pattern.search(body) if pattern else None
+        start = max(0, first.start() - self.SNIPPET_CHARS // 3) if first else 0
+        end = min(len(body), start + self.SNIPPET_CHARS)
+        window = body[start:end]
+
+        parts, position = [], 0
+        if pattern:
+            for hit in pattern.finditer(window):
+                parts.append(html.escape(window[position:hit.start()]))
+                parts.append(f'<mark>{html.escape(hit.group())}</mark>')
+                position = hit.end()
+        parts.append(html.escape(window[position:]))
+
+        snippet = ' '.join(''.join(parts).split())
+        return ('…' if start > 0 else '') + snippet + ('…' if end < len(body) else '')
+
+    def stats(self):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT doc_type, COUNT(*) AS n FROM search_docs GROUP BY doc_type').fetchall()
+        return {row['doc_type']: row['n'] for row in rows}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Process-wide SearchIndex"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex()
+        return _index
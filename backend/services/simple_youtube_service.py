@@ -1,7 +1,8 @@
-import requests
 import re
 import json
 from urllib.parse import parse_qs, urlparse
+from .transcript_store import get_transcript_store
+from .circuit_breaker import http_get
 
 class SimpleYouTubeService:
     @staticmethod
@@ -40,7 +41,7 @@ class SimpleYouTubeService:
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             }
             
-            response = requests.get(video_url, headers=headers, timeout=15)
+            response = http_get('timedtext', video_url, headers=headers, timeout=15)
             
             if response.status_code != 200:
                 return None
@@ -67,7 +68,7 @@ class SimpleYouTubeService:
                         print(f"Found caption URL: {caption_url}")
                         
                         # Get the actual transcript
-                        transcript_response = requests.get(caption_url, headers=headers, timeout=10)
+                        transcript_response = http_get('timedtext', caption_url, headers=headers, timeout=10)
                         
                         if transcript_response.status_code == 200:
                             transcript_text = SimpleYouTubeService._parse_transcript_xml(transcript_response.text)
@@ -88,7 +89,7 @@ class SimpleYouTubeService:
             for endpoint in manual_endpoints:
                 try:
                     print(f"Trying manual endpoint: {endpoint}")
-                    resp = requests.get(endpoint, headers=headers, timeout=8)
+                    resp = http_get('timedtext', endpoint, headers=headers, timeout=8)
                     if resp.status_code == 200 and resp.text.strip():
                         transcript_text = SimpleYouTubeService._parse_transcript_xml(resp.text)
                         if transcript_text and len(transcript_text.strip()) > 20:
@@ -180,16 +181,24 @@ class SimpleYouTubeService:
             video_id = SimpleYouTubeService.extract_video_id(url)
             print(f"SimpleYouTubeService: Processing video {video_id}")
             
+            store = get_transcript_store()
+            cached = store.get(video_id)
+            if cached:
+                return cached
+            
             # Try simple extraction
             transcript = SimpleYouTubeService.get_transcript_simple(video_id)
             
             if transcript and transcript.strip():
-                return {
+                video_info = {
                     'video_id': video_id,
                     'url': url,
                     'transcript': transcript.strip(),
-                    'duration': 0
+                    'duration': 0,
+                    'method': 'simple_timedtext'
                 }
+                store.put(video_id, video_info)
+                return video_info
             
             # If extraction fails, provide helpful guidance
             raise Exception(f"""
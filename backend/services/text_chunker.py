@@ -0,0 +1,201 @@
+import re
+from functools import lru_cache
+from itertools import accumulate
+from config import Config
+
+# CJK ideographs, kana and hangul take roughly one token per character (often more),
+# while Latin text averages about four characters per token.
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_HEADING_PATTERN = re.compile(r'^\s{0,3}(#{1,6}\s|第[一二三四五六七八九十百\d]+[章節部分])')
+_SENTENCE_PATTERN = re.compile(r'[^.!?。！？；;\n]*(?:[.!?。！？；;]+["\'」』）)]*\s*|\n+|$)')
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken encoding for the configured model, or None if it cannot be loaded
+
+    tiktoken downloads the BPE file on first use (set TIKTOKEN_CACHE_DIR to
+    a directory holding it for hosts without that egress). Any failure is
+    logged once and cached, so every later count uses the estimate instead
+    of retrying the download.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        print("tiktoken not installed, falling back to estimated token counts")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(Config.OPENAI_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        print(f"Failed to load tiktoken encoding, falling back to estimated token counts: {e}")
+        return None
+
+
+def count_tokens(text):
+    """Count tokens with the model tokenizer (CJK-aware estimate when it cannot be loaded)"""
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    return int(cjk_chars * 1.5 + (len(text) - cjk_chars) / 4) + 1
+
+
+class TextChunker:
+    """Split text into token-bounded chunks along heading, paragraph and sentence boundaries.
+
+    Used by every LLM entry point so chunk sizes are measured in real tokens
+    rather than characters. Consecutive chunks share up to `overlap_tokens`
+    of trailing paragraphs/sentences so context is not lost at the seams.
+    """
+
+    def __init__(self, max_tokens=None, overlap_tokens=None):
+        self.max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+        self.overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    def needs_chunking(self, text, threshold=None):
+        """Whether text exceeds the single-request token threshold"""
+        return count_tokens(text) > (threshold or Config.CHUNK_THRESHOLD_TOKENS)
+
+    def split(self, text):
+        """Split text into chunks of at most max_tokens tokens"""
+        if not text or not text.strip():
+            return []
+
+        units = []
+        for block in self._split_blocks(text):
+            tokens = count_tokens(block)
+            if tokens <= self.max_tokens:
+                units.append((block, tokens, self._is_heading(block)))
+            else:
+                units.extend((piece, count_tokens(piece), False) for piece in self._split_oversized(block))
+
+        chunks = []
+        current = []
+        current_tokens = 0
+
+        for unit, tokens, is_heading in units:
+            # Close the chunk when the unit doesn't fit, or break early before a heading
+            # once the chunk is reasonably full so sections stay together.
+            starts_section = is_heading and current_tokens > self.max_tokens // 2
+            if current and (current_tokens + tokens > self.max_tokens or starts_section):
+                chunks.append('\n\n'.join(u for u, _ in current))
+                current = self._overlap_tail(current, tokens)
+                current_tokens = sum(t for _, t in current)
+
+            current.append((unit, tokens))
+            current_tokens += tokens
+
+        if current:
+            chunks.append('\n\n'.join(u for u, _ in current))
+
+        return chunks
+
+    def _overlap_tail(self, units, next_tokens):
+        """Trailing units of the previous chunk to repeat at the start of the next one"""
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        tail = []
+        used = 0
+        for unit, tokens in reversed(units):
+            if used + tokens > budget:
+                break
+            tail.insert(0, (unit, tokens))
+            used += tokens
+        return tail
+
+    @staticmethod
+    def _is_heading(block):
+        return bool(_HEADING_PATTERN.match(block))
+
+    @staticmethod
+    def _split_blocks(text):
+        """Paragraph blocks, with every Markdown/chapter heading starting a new block"""
+        blocks = []
+        current = []
+        for line in text.splitlines():
+            if not line.strip():
+                if current:
+                    blocks.append('\n'.join(current))
+                    current = []
+                continue
+            if _HEADING_PATTERN.match(line) and current:
+                blocks.append('\n'.join(current))
+                current = []
+            current.append(line)
+        if current:
+            blocks.append('\n'.join(current))
+
+        # Keep a bare heading attached to the paragraph it introduces
+        merged = []
+        for block in blocks:
+            if merged and '\n' not in merged[-1] and _HEADING_PATTERN.match(merged[-1]):
+                merged[-1] = merged[-1] + '\n\n' + block
+            else:
+                merged.append(block)
+        return merged
+
+    def _split_oversized(self, block):
+        """Break a block that is too large on its own into sentence groups (hard split as a last resort)"""
+        pieces = []
+        current = ''
+        current_tokens = 0
+
+        for sentence in _SENTENCE_PATTERN.findall(block):
+            if not sentence.strip():
+                continue
+            tokens = count_tokens(sentence)
+            if tokens > self.max_tokens:
+                if current:
+                    pieces.append(current.strip())
+                    current, current_tokens = '', 0
+                pieces.extend(self._hard_split(sentence))
+                continue
+            if current and current_tokens + tokens > self.max_tokens:
+                pieces.append(current.strip())
+                current, current_tokens = '', 0
+            current += sentence
+            current_tokens += tokens
+
+        if current.strip():
+            pieces.append(current.strip())
+        return pieces
+
+    def _hard_split(self, text):
+        """Split unpunctuated text at token windows, never inside a multi-byte character
+
+        A window ending in the middle of a character's UTF-8 bytes (common
+        for CJK, where one character can span several tokens) is moved back
+        to the last token boundary that falls between characters, so no
+        window decodes to U+FFFD.
+        """
+        encoding = _get_encoding()
+        if encoding is not None:
+            token_bytes = encoding.decode_tokens_bytes(encoding.encode(text, disallowed_special=()))
+            data = b''.join(token_bytes)
+            offsets = [0, *accumulate(len(piece) for piece in token_bytes)]
+
+            def clean(index):
+                return offsets[index] == len(data) or data[offsets[index]] & 0xC0 != 0x80
+
+            windows = []
+            start = 0
+            while start < len(token_bytes):
+                end = min(start + self.max_tokens, len(token_bytes))
+                while end > start + 1 and not clean(end):
+                    end -= 1
+                # A single character wider than the whole window: take it in one piece
+                while not clean(end):
+                    end += 1
+                windows.append(data[offsets[start]:offsets[end]].decode('utf-8'))
+                start = end
+            return windows
+
+        chars_per_window = max(1, int(len(text) * self.max_tokens / count_tokens(text)))
+        return [text[i:i + chars_per_window] for i in range(0, len(text), chars_per_window)]
@@ -0,0 +1,296 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from config import Config
+
+# Failure classes shared by the negative cache and the circuit breakers
+FAILURE_NO_CAPTIONS = 'no_captions'   # the video has no usable caption track
+FAILURE_UNAVAILABLE = 'unavailable'   # private, removed or region-blocked video
+FAILURE_EXHAUSTED = 'exhausted'       # every extraction strategy failed
+FAILURE_THROTTLED = 'throttled'       # YouTube is rate limiting us
+FAILURE_NETWORK = 'network'           # timeouts, connection errors, 5xx
+FAILURE_ERROR = 'error'
+
+UPSTREAM_FAILURES = (FAILURE_THROTTLED, FAILURE_NETWORK)
+
+
+def classify_failure(error):
+    """Map an extraction exception to a failure class (by exception name and message)"""
+    name = type(error).__name__
+    message = str(error).lower()
+    if name in ('TranscriptsDisabled', 'NoTranscriptFound', 'NoTranscriptAvailable') \
+            or 'could not retrieve a transcript' in message or 'subtitles are disabled' in message:
+        return FAILURE_NO_CAPTIONS
+    if name in ('TooManyRequests', 'RequestBlocked', 'IpBlocked') or '429' in message \
+            or 'too many requests' in message or 'sign in to confirm' in message:
+        return FAILURE_THROTTLED
+    if name in ('VideoUnavailable', 'VideoUnplayable') or 'private video' in message \
+            or 'video unavailable' in message or 'has been removed' in message:
+        return FAILURE_UNAVAILABLE
+    if name in ('ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout', 'TimeoutError') \
+            or 'timed out' in message or 'connection' in message or 'http error 5' in message:
+        return FAILURE_NETWORK
+    return FAILURE_ERROR
+
+
+def is_upstream_failure(error):
+    """Whether an exception reflects the upstream's health rather than the specific video"""
+    return classify_failure(error) in UPSTREAM_FAILURES
+
+
+class TranscriptStore:
+    """Shared transcript cache for every YouTube service.
+
+    Entries are keyed by (video_id, language, method) and stored as
+    zlib-compressed JSON in SQLite, so writes are atomic and a lookup is a
+    single indexed read. Expired and least-recently-used entries are evicted
+    a small batch at a time on each write instead of scanning the whole
+    store.
+    """
+
+    EVICTION_BATCH = 50
+
+    def __init__(self, db_path=None, ttl_seconds=None, max_bytes=None, negative_ttl_seconds=None):
+        self.db_path = db_path or Config.TRANSCRIPT_DB_PATH
+        self.ttl_seconds = ttl_seconds or Config.TRANSCRIPT_TTL_SECONDS
+        self.max_bytes = max_bytes or Config.TRANSCRIPT_MAX_BYTES
+        self.negative_ttl_seconds = negative_ttl_seconds or Config.TRANSCRIPT_NEGATIVE_TTL_SECONDS
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    id INTEGER PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    language TEXT NOT NULL DEFAULT '',
+                    method TEXT NOT NULL,
+                    title TEXT,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    UNIQUE (video_id, language, method)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_transcripts_created_at ON transcripts (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_transcripts_last_access ON transcripts (last_access)')
+            # Running total so size-based eviction never needs a full-table SUM
+            conn.execute('CREATE TABLE IF NOT EXISTS transcript_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)')
+            conn.execute(
+                'INSERT OR IGNORE INTO transcript_stats (id, total_bytes) '
+                'SELECT 1, COALESCE(SUM(size), 0) FROM transcripts'
+            )
+            # Which extraction strategy last worked for a video, so repeat lookups skip dead ends
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_hints (
+                    video_id TEXT PRIMARY KEY,
+                    strategy TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Short-lived negative results so a failing video doesn't replay the whole cascade
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_failures (
+                    video_id TEXT NOT NULL,
+                    failure_class TEXT NOT NULL,
+                    message TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, failure_class)
+                )
+            """)
+
+    # =====================================================
+    # LOOKUP / STORE
+    # =====================================================
+
+    def get(self, video_id, language=None, method=None):
+        """Most recent unexpired transcript for a video, optionally narrowed by language and method"""
+        query = 'SELECT id, data FROM transcripts WHERE video_id = ? AND created_at > ?'
+        params = [video_id, time.time() - self.ttl_seconds]
+        if language is not None:
+            query += ' AND language = ?'
+            params.append(language)
+        if method is not None:
+            query += ' AND method = ?'
+            params.append(method)
+        query += ' ORDER BY created_at DESC LIMIT 1'
+
+        with self._connect() as conn:
+            row = conn.execute(query, params).fetchone()
+            if not row:
+                return None
+            conn.execute('UPDATE transcripts SET last_access = ? WHERE id = ?', (time.time(), row['id']))
+
+        result = json.loads(zlib.decompress(row['data']).decode('utf-8'))
+        result['cached'] = True
+        return result
+
+    def put(self, video_id, result, language='', method=None):
+        """Store a transcript result dict (atomic insert-or-replace)"""
+        method = method or result.get('method', 'unknown')
+        result = {k: v for k, v in result.items() if k != 'cached'}
+        data = zlib.compress(json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+
+        with self._connect() as conn:
+            old = conn.execute(
+                'SELECT size FROM transcripts WHERE video_id = ? AND language = ? AND method = ?',
+                (video_id, language or '', method)
+            ).fetchone()
+            conn.execute(
+                """INSERT INTO transcripts (video_id, language, method, title, data, size, created_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (video_id, language, method) DO UPDATE SET
+                       title = excluded.title, data = excluded.data, size = excluded.size,
+                       created_at = excluded.created_at, last_access = excluded.last_access""",
+                (video_id, language or '', method, result.get('title'), data, len(data), now, now)
+            )
+            self._add_bytes(conn, len(data) - (old['size'] if old else 0))
+            self._evict(conn, now)
+
+    def changed_since(self, created_at=0.0, row_id=0, limit=200):
+        """Entries written after the (created_at, id) watermark, oldest first
+        
+        Returns [{'id', 'video_id', 'title', 'created_at', 'result'}]; pass the
+        last entry's created_at and id back in to continue.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, video_id, title, data, created_at FROM transcripts '
+                'WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?',
+                (created_at, row_id, limit)
+            ).fetchall()
+        return [{
+            'id': row['id'],
+            'video_id': row['video_id'],
+            'title': row['title'],
+            'created_at': row['created_at'],
+            'result': json.loads(zlib.decompress(row['data']).decode('utf-8'))
+        } for row in rows]
+
+    def delete_older_than(self, seconds):
+        """Remove entries created more than `seconds` ago; returns the number removed"""
+        cutoff = time.time() - seconds
+        with self._connect() as conn:
+            conn.execute('DELETE FROM transcript_hints WHERE updated_at < ?', (cutoff,))
+            conn.execute('DELETE FROM transcript_failures WHERE expires_at < ?', (time.time(),))
+            return self._delete_where(conn, 'created_at < ?', (cutoff,))
+
+    # =====================================================
+    # STRATEGY HINTS
+    # =====================================================
+
+    def get_hint(self, video_id):
+        """Name of the strategy that last succeeded for this video, if still fresh"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT strategy FROM transcript_hints WHERE video_id = ? AND updated_at > ?',
+                (video_id, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row['strategy'] if row else None
+
+    def set_hint(self, video_id, strategy):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO transcript_hints (video_id, strategy, updated_at) VALUES (?, ?, ?)',
+                (video_id, strategy, time.time())
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM transcripts').fetchone()[0]
+            total = conn.execute('SELECT total_bytes FROM transcript_stats WHERE id = 1').fetchone()[0]
+        return {'entries': count, 'bytes': total}
+
+    # =====================================================
+    # NEGATIVE CACHE
+    # =====================================================
+
+    def get_failures(self, video_id):
+        """Unexpired {failure_class: message} recorded for a video"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT failure_class, message FROM transcript_failures WHERE video_id = ? AND expires_at > ?',
+                (video_id, time.time())
+            ).fetchall()
+        return {row['failure_class']: row['message'] for row in rows}
+
+    def put_failure(self, video_id, failure_class, message=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO transcript_failures (video_id, failure_class, message, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (video_id, failure_class, (message or '')[:500], now + self.negative_ttl_seconds)
+            )
+            conn.execute('DELETE FROM transcript_failures WHERE expires_at < ?', (now,))
+
+    def clear_failures(self, video_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM transcript_failures WHERE video_id = ?', (video_id,))
+
+    # =====================================================
+    # EVICTION
+    # =====================================================
+
+    @staticmethod
+    def _add_bytes(conn, delta):
+        conn.execute('UPDATE transcript_stats SET total_bytes = total_bytes + ? WHERE id = 1', (delta,))
+
+    def _delete_where(self, conn, condition, params, limit=None):
+        """Delete matching rows (oldest first, optionally bounded) and keep the byte total in sync"""
+        select = f'SELECT id, size FROM transcripts WHERE {condition} ORDER BY created_at'
+        if limit:
+            select += f' LIMIT {int(limit)}'
+        victims = conn.execute(select, params).fetchall()
+        if victims:
+            conn.executemany('DELETE FROM transcripts WHERE id = ?', [(row['id'],) for row in victims])
+            self._add_bytes(conn, -sum(row['size'] for row in victims))
+        return len(victims)
+
+    def _evict(self, conn, now):
+        """Incremental eviction: one bounded batch of expired rows, then LRU rows while over budget"""
+        self._delete_where(conn, 'created_at < ?', (now - self.ttl_seconds,), limit=self.EVICTION_BATCH)
+
+        excess = conn.execute('SELECT total_bytes FROM transcript_stats WHERE id = 1').fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+
+        victims = []
+        for row in conn.execute(
+            f'SELECT id, size FROM transcripts ORDER BY last_access LIMIT {self.EVICTION_BATCH}'
+        ):
+            victims.append(row)
+            excess -= row['size']
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM transcripts WHERE id = ?', [(row['id'],) for row in victims])
+        self._add_bytes(conn, -sum(row['size'] for row in victims))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store():
+    """Process-wide TranscriptStore shared by all YouTube services"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore()
+        return _store
@@ -6,12 +6,15 @@ import re
 import json
 from datetime import datetime
 from config import Config
+from .transcript_store import get_transcript_store, is_upstream_failure
+from .circuit_breaker import get_breaker
+from .audio_segmenter import transcribe_long_audio
 
 class YouTubeAudioService:
     def __init__(self):
         openai.api_key = Config.OPENAI_API_KEY
-        self.cache_dir = "cache"
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self.store = get_transcript_store()
+        self.cache_dir = "cache"  # legacy per-video JSON cache, migrated into the store on lookup
         
     def extract_video_id(self, url):
         """Extract video ID from YouTube URL"""
@@ -35,26 +38,41 @@ class YouTubeAudioService:
     
     def get_cached_transcript(self, video_id):
         """Check if transcript is already cached"""
+        cached = self.store.get(video_id)
+        if cached:
+            print(f"Using cached transcript for {video_id}")
+            return cached
+        
+        # Import a transcript left in the old one-file-per-video cache;
+        # the file is only removed once the store holds it
         cache_file = os.path.join(self.cache_dir, f"{video_id}.json")
+        if not os.path.exists(cache_file):
+            return None
         
-        if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Failed to read legacy cache for {video_id}: {e}")
+            return None
+        
+        try:
+            self.store.put(video_id, data)
+        except Exception as e:
+            print(f"Failed to migrate legacy cache for {video_id}: {e}")
+        else:
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    print(f"Using cached transcript for {video_id}")
-                    return data
-            except:
-                # If cache file is corrupted, delete it
                 os.remove(cache_file)
+            except OSError as e:
+                print(f"Failed to remove legacy cache file {cache_file}: {e}")
         
-        return None
+        print(f"Using cached transcript for {video_id}")
+        return data
     
     def save_to_cache(self, video_id, data):
         """Save transcript to cache"""
         try:
-            cache_file = os.path.join(self.cache_dir, f"{video_id}.json")
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.store.put(video_id, data)
         except Exception as e:
             print(f"Failed to save cache: {e}")
     
@@ -69,7 +87,7 @@ class YouTubeAudioService:
             }
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+                info = get_breaker('yt_dlp').call(ydl.extract_info, url, download=False, is_failure=is_upstream_failure)
                 return {
                     'title': info.get('title', 'Unknown Video'),
                     'duration': info.get('duration', 0),
@@ -115,7 +133,9 @@ class YouTubeAudioService:
             print(f"Downloading audio from: {youtube_url}")
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=True)
+                info = get_breaker('yt_dlp').call(
+                    ydl.extract_info, youtube_url, download=True, is_failure=is_upstream_failure
+                )
                 
                 video_title = info.get('title', 'Unknown')
                 duration = info.get('duration', 0)
@@ -168,7 +188,7 @@ class YouTubeAudioService:
             print(f"Transcribing audio ({file_size_mb:.1f}MB) using Whisper...")
             
             # Whisper API has a 25MB limit
-            if file_size_mb > 25:
+            if file_size_mb > Config.WHISPER_MAX_UPLOAD_MB:
                 return self.transcribe_large_audio(audio_path, video_title)
             
             with open(audio_path, "rb") as audio_file:
@@ -192,50 +212,11 @@ class YouTubeAudioService:
                 raise Exception(f"Failed to transcribe audio: {str(e)}")
     
     def transcribe_large_audio(self, audio_path, video_title="Video"):
-        """Handle large audio files by splitting them"""
+        """Handle large audio files by splitting them on silences and transcribing segments in parallel"""
         try:
-            from pydub import AudioSegment
-            
-            print("Audio file is large, splitting into chunks...")
-            
-            # Load audio
-            audio = AudioSegment.from_file(audio_path)
-            
-            # Split into 8-minute chunks (8 * 60 * 1000 ms) to stay well under 25MB
-            chunk_length = 8 * 60 * 1000
-            chunks = []
-            temp_dir = os.path.dirname(audio_path)
-            
-            for i in range(0, len(audio), chunk_length):
-                chunk = audio[i:i + chunk_length]
-                chunk_path = os.path.join(temp_dir, f"chunk_{i//1000}.mp3")
-                chunk.export(chunk_path, format="mp3", bitrate="96k")
-                chunks.append(chunk_path)
-            
-            # Transcribe each chunk
-            full_transcript = ""
-            for i, chunk_path in enumerate(chunks):
-                print(f"Transcribing chunk {i+1}/{len(chunks)}...")
-                
-                with open(chunk_path, "rb") as audio_file:
-                    chunk_transcript = openai.Audio.transcribe(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="text"
-                    )
-                
-                full_transcript += chunk_transcript + " "
-                
-                # Clean up chunk file
-                try:
-                    os.remove(chunk_path)
-                except:
-                    pass
-            
-            return full_transcript.strip()
-            
-        except ImportError:
-            raise Exception("pydub is required for large audio files. Please install it: pip install pydub")
+            print("Audio file is large, splitting into segments...")
+            result = transcribe_long_audio(audio_path, os.path.dirname(audio_path))
+            return result['transcript']
         except Exception as e:
             raise Exception(f"Failed to process large audio file: {str(e)}")
     
@@ -289,16 +270,10 @@ class YouTubeAudioService:
             raise Exception(f"YouTube audio processing failed: {str(e)}")
     
     def cleanup_cache(self, days_old=7):
-        """Clean up old cache files"""
+        """Clean up old cache entries"""
         try:
-            import time
-            cutoff_time = time.time() - (days_old * 24 * 60 * 60)
-            
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(self.cache_dir, filename)
-                    if os.path.getmtime(file_path) < cutoff_time:
-                        os.remove(file_path)
-                        print(f"Cleaned up old cache: {filename}")
+            removed = self.store.delete_older_than(days_old * 24 * 60 * 60)
+            if removed:
+                print(f"Cleaned up {removed} old cached transcript(s)")
         except Exception as e:
             print(f"Cache cleanup failed: {e}")
\ No newline at end of file
@@ -1,20 +1,26 @@
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import TextFormatter
 import re
-import requests
 import json
 import os
 import tempfile
+import xml.etree.ElementTree as ET
 import yt_dlp
 import openai
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add backend directory to path for imports
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 from config import Config
+from .transcript_store import (
+    get_transcript_store, classify_failure, is_upstream_failure,
+    FAILURE_NO_CAPTIONS, FAILURE_UNAVAILABLE, FAILURE_EXHAUSTED, UPSTREAM_FAILURES
+)
+from .circuit_breaker import get_breaker, http_get, CircuitBreaker, CircuitOpenError
+from .audio_segmenter import transcribe_long_audio
 
 class YouTubeService:
     @staticmethod
@@ -36,62 +42,62 @@ class YouTubeService:
         
         raise ValueError("Invalid YouTube URL format")
     
+    @staticmethod
+    def _raise_for_upstream(response):
+        """Turn a throttled or failing response into an exception classify_failure maps to an upstream failure"""
+        if response.status_code == 429 or response.status_code >= 500:
+            raise Exception(f"HTTP Error {response.status_code}")
+
     @staticmethod
     def get_transcript_alternative(video_id):
-        """Alternative method to get transcript using direct YouTube API approach"""
-        try:
-            # Try to get transcript from YouTube's internal API (like browser does)
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            # Get video page to extract necessary tokens
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            response = requests.get(video_url, headers=headers)
-            
-            if response.status_code == 200:
-                # Look for transcript data in the page
-                content = response.text
-                
-                # Extract timedtext tracks (simplified approach)
-                if '"captionTracks"' in content:
-                    # Find caption tracks in the page
-                    import re
-                    caption_pattern = r'"captionTracks":\s*\[(.*?)\]'
-                    caption_match = re.search(caption_pattern, content)
-                    
-                    if caption_match:
-                        try:
-                            # Extract the first available caption URL
-                            url_pattern = r'"baseUrl":"([^"]+)"'
-                            url_match = re.search(url_pattern, caption_match.group(1))
-                            
-                            if url_match:
-                                caption_url = url_match.group(1).replace('\\u0026', '&')
-                                
-                                # Get the actual transcript
-                                transcript_response = requests.get(caption_url, headers=headers)
-                                
-                                if transcript_response.status_code == 200:
-                                    # Parse XML transcript
-                                    import xml.etree.ElementTree as ET
-                                    root = ET.fromstring(transcript_response.content)
-                                    
-                                    transcript_text = ""
-                                    for text_elem in root.findall('.//text'):
-                                        if text_elem.text:
-                                            transcript_text += text_elem.text + " "
-                                    
-                                    return transcript_text.strip()
-                        except Exception as e:
-                            print(f"Alternative method failed: {e}")
-                            pass
-            
+        """Alternative method to get transcript using direct YouTube API approach
+        
+        Returns None when the page has no usable caption track. An open
+        circuit, a throttled or failing response and network errors are
+        raised, so they are classified as upstream failures rather than
+        remembered as a video without captions.
+        """
+        # Try to get transcript from YouTube's internal API (like browser does)
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        
+        # Get video page to extract necessary tokens
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        response = http_get('timedtext', video_url, headers=headers, timeout=15)
+        YouTubeService._raise_for_upstream(response)
+        if response.status_code != 200:
             return None
-            
-        except Exception as e:
-            print(f"Alternative transcript method error: {e}")
+        
+        # Find caption tracks in the page (simplified approach)
+        caption_match = re.search(r'"captionTracks":\s*\[(.*?)\]', response.text)
+        if not caption_match:
+            return None
+        
+        # Extract the first available caption URL
+        url_match = re.search(r'"baseUrl":"([^"]+)"', caption_match.group(1))
+        if not url_match:
             return None
+        caption_url = url_match.group(1).replace('\\u0026', '&')
+        
+        # Get the actual transcript
+        transcript_response = http_get('timedtext', caption_url, headers=headers, timeout=15)
+        YouTubeService._raise_for_upstream(transcript_response)
+        if transcript_response.status_code != 200:
+            return None
+        
+        try:
+            root = ET.fromstring(transcript_response.content)
+        except ET.ParseError as e:
+            print(f"Alternative method failed: {e}")
+            return None
+        
+        transcript_text = ""
+        for text_elem in root.findall('.//text'):
+            if text_elem.text:
+                transcript_text += text_elem.text + " "
+        
+        return transcript_text.strip()
 
     @staticmethod
     def get_transcript_hybrid(url):
@@ -147,19 +153,21 @@ class YouTubeService:
                 ]
                 
                 info = None
+                breaker = get_breaker('yt_dlp')
                 for fmt in formats_to_try:
                     try:
                         ydl_opts['format'] = fmt
                         print(f"Trying format: {fmt}")
                         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            # Add a small delay to avoid rate limiting
-                            time.sleep(1)
-                            info = ydl.extract_info(url, download=True)
+                            info = breaker.call(ydl.extract_info, url, download=True, is_failure=is_upstream_failure)
                             break
+                    except CircuitOpenError:
+                        raise
                     except Exception as e:
                         print(f"Format {fmt} failed: {str(e)[:100]}...")
-                        # Add delay before trying next format
-                        time.sleep(2)
+                        # Throttling or a dead video won't be fixed by another format: fail fast
+                        if classify_failure(e) in UPSTREAM_FAILURES + (FAILURE_UNAVAILABLE,):
+                            raise
                         continue
                 
                 if not info:
@@ -184,8 +192,24 @@ class YouTubeService:
                 file_size_mb = os.path.getsize(audio_file) / (1024 * 1024)
                 print(f"File size: {file_size_mb:.2f} MB")
                 
-                if file_size_mb > 25:
-                    raise Exception(f"File too large: {file_size_mb:.2f} MB (max 25MB)")
+                if file_size_mb > Config.WHISPER_MAX_UPLOAD_MB:
+                    # Too large for a single Whisper upload: split on silences and transcribe in parallel
+                    print("Audio exceeds the Whisper upload limit, transcribing in segments...")
+                    result = transcribe_long_audio(audio_file, temp_dir)
+                    if not result['transcript']:
+                        raise Exception("Empty transcript received")
+                    
+                    print(f"Transcription complete: {len(result['transcript'])} characters")
+                    
+                    return {
+                        'video_id': video_id,
+                        'url': url,
+                        'title': title,
+                        'duration': duration,
+                        'transcript': result['transcript'],
+                        'segments': result['segments'],
+                        'method': 'hybrid_audio_whisper_segmented'
+                    }
                 
                 # Transcribe using OpenAI Whisper
                 print("Transcribing with OpenAI Whisper...")
@@ -234,92 +258,18 @@ class YouTubeService:
             print(f"Hybrid transcription failed: {str(e)}")
             raise e
 
-    @staticmethod
-    def get_transcript(url):
-        """Get transcript from YouTube video - Hybrid approach with improved audio extraction"""
-        try:
-            video_id = YouTubeService.extract_video_id(url)
-            print(f"Processing YouTube video: {video_id}")
-            
-            # Method 1: Try youtube-transcript-api first (faster and more reliable)
-            print("Method 1: Trying youtube-transcript-api...")
-            try:
-                transcript_data = None
-                
-                # Try different approaches to get transcript
-                approaches = [
-                    # First try without language specification (auto-detect)
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id),
-                    # Try common English variants
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['en']),
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['en-US']),
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['en-GB']),
-                    # Try Chinese variants
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['zh']),
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['zh-CN']),
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['zh-TW']),
-                    # Try with multiple languages
-                    lambda: YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'en-US', 'en-GB', 'zh', 'zh-CN', 'zh-TW']),
-                ]
-                
-                for i, approach in enumerate(approaches):
-                    try:
-                        transcript_data = approach()
-                        print(f"Method 1 approach {i+1} succeeded")
-                        break
-                    except Exception as e:
-                        print(f"Method 1 approach {i+1} failed: {str(e)[:100]}...")
-                        continue
-                
-                if transcript_data:
-                    formatter = TextFormatter()
-                    transcript_text = formatter.format_transcript(transcript_data)
-                    total_duration = sum([item.get('duration', 0) for item in transcript_data])
-                    
-                    if transcript_text.strip():
-                        video_info = {
-                            'video_id': video_id,
-                            'url': url,
-                            'transcript': transcript_text,
-                            'duration': total_duration,
-                            'method': 'transcript_api'
-                        }
-                        print(f"Method 1 Success: {len(transcript_text)} characters")
-                        return video_info
-                        
-            except Exception as e:
-                print(f"Method 1 failed: {str(e)}")
-            
-            # Method 2: Use improved hybrid audio extraction
-            print("Method 2: Trying improved audio extraction with OpenAI Whisper...")
-            try:
-                result = YouTubeService.get_transcript_hybrid(url)
-                if result and result.get('transcript', '').strip():
-                    print(f"Method 2 Success: {len(result['transcript'])} characters")
-                    return result
-            except Exception as e:
-                print(f"Method 2 (Hybrid Audio) failed: {str(e)}")
-                # Continue to other methods
-            
-
-            
-            # Method 3: Try alternative browser-like approach
-            print("Method 3: Trying alternative browser approach...")
-            alt_transcript = YouTubeService.get_transcript_alternative(video_id)
-            
-            if alt_transcript and alt_transcript.strip():
-                video_info = {
-                    'video_id': video_id,
-                    'url': url,
-                    'transcript': alt_transcript,
-                    'duration': 0,
-                    'method': 'browser_scraping'
-                }
-                print(f"Method 3 Success: {len(alt_transcript)} characters")
-                return video_info
-            
-            # Method 4: Ask user to copy transcript manually
-            raise Exception("""
+    # Caption strategies are cheap (a few HTTP requests) and are raced against each other;
+    # the yt-dlp + Whisper audio path is slow and only runs once they have all failed.
+    CAPTION_STRATEGIES = ('transcript_api', 'browser_scraping')
+    AUDIO_STRATEGY = 'hybrid_audio_whisper'
+    # Circuit breaker guarding the upstream each strategy depends on
+    STRATEGY_UPSTREAMS = {
+        'transcript_api': 'transcript_api',
+        'browser_scraping': 'timedtext',
+        'hybrid_audio_whisper': 'yt_dlp'
+    }
+    
+    MANUAL_TRANSCRIPT_MESSAGE = """
 Unable to automatically extract transcript. Try these alternatives:
 
 1. Use a video with clear captions/subtitles
@@ -333,7 +283,168 @@ Recommended test videos with transcripts:
 - https://www.youtube.com/watch?v=dQw4w9WgXcQ (Rick Roll - has auto captions)
 - Any TED-Ed video
 - Educational channels like Crash Course
-            """)
+            """
+    
+    @staticmethod
+    def _select_track(transcript_list, languages):
+        """Pick the best caption track locally: manual before auto-generated, then by language preference"""
+        def rank(track):
+            code = track.language_code
+            if code in languages:
+                language_rank = languages.index(code)
+            else:
+                bases = [language.split('-')[0] for language in languages]
+                base = code.split('-')[0]
+                language_rank = len(languages) + (bases.index(base) if base in bases else len(bases))
+            return (track.is_generated, language_rank)
+        
+        tracks = list(transcript_list)
+        return min(tracks, key=rank) if tracks else None
+    
+    @staticmethod
+    def _strategy_transcript_api(video_id, url):
+        """List the caption tracks once and fetch only the best one"""
+        breaker = get_breaker('transcript_api')
+        transcript_list = breaker.call(YouTubeTranscriptApi.list_transcripts, video_id, is_failure=is_upstream_failure)
+        track = YouTubeService._select_track(transcript_list, Config.TRANSCRIPT_LANGUAGES)
+        if not track:
+            return None
+        
+        transcript_data = breaker.call(track.fetch, is_failure=is_upstream_failure)
+        transcript_text = TextFormatter().format_transcript(transcript_data)
+        if not transcript_text.strip():
+            return None
+        
+        return {
+            'video_id': video_id,
+            'url': url,
+            'transcript': transcript_text,
+            'duration': sum(item.get('duration', 0) for item in transcript_data),
+            'language': track.language_code,
+            'method': 'transcript_api'
+        }
+    
+    @staticmethod
+    def _strategy_browser_scraping(video_id, url):
+        transcript_text = YouTubeService.get_transcript_alternative(video_id)
+        if not transcript_text or not transcript_text.strip():
+            return None
+        
+        return {
+            'video_id': video_id,
+            'url': url,
+            'transcript': transcript_text,
+            'duration': 0,
+            'method': 'browser_scraping'
+        }
+    
+    @staticmethod
+    def _strategy_hybrid_audio_whisper(video_id, url):
+        return YouTubeService.get_transcript_hybrid(url)
+    
+    @staticmethod
+    def _run_strategies(names, video_id, url, failures, concurrent=True):
+        """Run strategies (concurrently or in order) and return (name, result) for the first success.
+        
+        Strategies whose upstream circuit is open are skipped; the failure class
+        of every strategy that did run is recorded in `failures`.
+        """
+        runnable = []
+        for name in names:
+            if get_breaker(YouTubeService.STRATEGY_UPSTREAMS[name]).snapshot()['state'] == CircuitBreaker.OPEN:
+                print(f"Strategy {name} skipped: circuit open")
+                failures[name] = 'circuit_open'
+            else:
+                runnable.append(name)
+        if not runnable:
+            return None, None
+        
+        executor = ThreadPoolExecutor(max_workers=len(runnable) if concurrent else 1)
+        futures = {
+            executor.submit(getattr(YouTubeService, f'_strategy_{name}'), video_id, url): name
+            for name in runnable
+        }
+        try:
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except CircuitOpenError as e:
+                    print(f"Strategy {name} skipped: {e}")
+                    failures[name] = 'circuit_open'
+                    continue
+                except Exception as e:
+                    print(f"Strategy {name} failed: {str(e)[:100]}")
+                    failures[name] = classify_failure(e)
+                    continue
+                if result and result.get('transcript', '').strip():
+                    print(f"Strategy {name} succeeded: {len(result['transcript'])} characters")
+                    return name, result
+                print(f"Strategy {name} found no transcript")
+                failures[name] = FAILURE_NO_CAPTIONS
+            return None, None
+        finally:
+            # First success wins: drop strategies that have not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _strategy_plan(hint, skip_captions=False):
+        """Ordered stages of strategies, starting with whatever worked last time for this video"""
+        captions = list(YouTubeService.CAPTION_STRATEGIES)
+        audio = [YouTubeService.AUDIO_STRATEGY]
+        if skip_captions:
+            return [audio]
+        if hint in captions:
+            return [[hint], [name for name in captions if name != hint], audio]
+        if hint == YouTubeService.AUDIO_STRATEGY:
+            return [audio, captions]
+        return [captions, audio]
+    
+    @staticmethod
+    def get_transcript(url):
+        """Get transcript from YouTube video - caption strategies first, Whisper audio extraction as fallback"""
+        try:
+            video_id = YouTubeService.extract_video_id(url)
+            print(f"Processing YouTube video: {video_id}")
+            
+            # Reuse a transcript already fetched by any method
+            store = get_transcript_store()
+            cached = store.get(video_id)
+            if cached:
+                print(f"Using cached transcript for {video_id} ({cached.get('method')})")
+                return cached
+            
+            # Recent negative results short-circuit the cascade
+            known_failures = store.get_failures(video_id)
+            if FAILURE_UNAVAILABLE in known_failures:
+                raise Exception("Video is unavailable or has been removed")
+            if FAILURE_EXHAUSTED in known_failures:
+                raise Exception(YouTubeService.MANUAL_TRANSCRIPT_MESSAGE)
+            
+            hint = store.get_hint(video_id)
+            failures = {}
+            plan = YouTubeService._strategy_plan(hint, skip_captions=FAILURE_NO_CAPTIONS in known_failures)
+            for names in plan:
+                name, result = YouTubeService._run_strategies(
+                    names, video_id, url, failures, concurrent=Config.TRANSCRIPT_RACE_STRATEGIES
+                )
+                if result:
+                    store.put(video_id, result, language=result.get('language', ''))
+                    if name != hint:
+                        store.set_hint(video_id, name)
+                    return result
+                if FAILURE_UNAVAILABLE in failures.values():
+                    store.put_failure(video_id, FAILURE_UNAVAILABLE)
+                    raise Exception("Video is unavailable or has been removed")
+            
+            # Only remember failures that are about this video, not a YouTube outage
+            if failures.get('transcript_api') == FAILURE_NO_CAPTIONS:
+                store.put_failure(video_id, FAILURE_NO_CAPTIONS)
+            if failures and not any(cls in UPSTREAM_FAILURES or cls == 'circuit_open' for cls in failures.values()):
+                store.put_failure(video_id, FAILURE_EXHAUSTED)
+            
+            # Every strategy failed: ask user to copy transcript manually
+            raise Exception(YouTubeService.MANUAL_TRANSCRIPT_MESSAGE)
             
         except ValueError as e:
             raise Exception(str(e))
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Config needs an API key at import, and every store defaults to a file in the
+# working directory; keep both away from a developer's real setup
+_state_dir = tempfile.mkdtemp(prefix='nexlearn-tests-')
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_state_dir, 'nexlearn.db')}"
+for name, filename in (('LLM_CACHE_DB_PATH', 'llm_cache.db'), ('TRANSCRIPT_DB_PATH', 'transcripts.db'),
+                       ('SEARCH_DB_PATH', 'search.db'), ('JOB_DB_PATH', 'jobs.db'),
+                       ('PDF_CACHE_DB_PATH', 'pdf_cache.db')):
+    os.environ[name] = os.path.join(_state_dir, filename)
+
+
+@pytest.fixture
+def db(tmp_path):
+    """DatabaseService on a fresh SQLite file"""
+    from services.database_service import DatabaseService
+    service = DatabaseService(f"sqlite:///{tmp_path / 'test.db'}")
+    yield service
+    service.engine.dispose()
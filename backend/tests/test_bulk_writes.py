@@ -0,0 +1,75 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from models import Flashcard, DeckCard, Review, CardState
+from services.database_service import DatabaseService
+
+ROWS = 120
+
+
+def snapshot(db):
+    with db.get_session() as session:
+        return {
+            'flashcards': session.scalars(select(Flashcard.front).order_by(Flashcard.id)).all(),
+            'deck links': session.scalar(select(func.count(DeckCard.id))),
+            'reviews': session.scalar(select(func.count(Review.id))),
+            'card state': session.execute(
+                select(CardState.card_id, CardState.reps, CardState.lapses, CardState.due_at).order_by(CardState.card_id)
+            ).all(),
+        }
+
+
+def test_bulk_paths_write_the_same_rows_as_per_row_calls(tmp_path):
+    random.seed(42)
+    cards = [{'front': f'Question {i}?', 'back': f'Answer {i}', 'difficulty': random.randint(1, 5)}
+             for i in range(ROWS)]
+    now = datetime.utcnow()
+    reviews = [{'card_id': random.randint(1, ROWS), 'rating': random.randint(1, 4),
+                'review_time_ms': random.randint(500, 20000), 'reviewed_at': now - timedelta(minutes=ROWS - i)}
+               for i in range(ROWS)]
+
+    row_db = DatabaseService(f"sqlite:///{tmp_path / 'per_row.db'}")
+    bulk_db = DatabaseService(f"sqlite:///{tmp_path / 'bulk.db'}")
+    for db in (row_db, bulk_db):
+        db.save_note('Note', 'content')
+        db.create_deck('Deck')
+
+    card_ids = [row_db.save_flashcard(1, card['front'], card['back'], ai_generated=True) for card in cards]
+    for card_id in card_ids:
+        row_db.add_card_to_deck(1, card_id)
+    for review in reviews:
+        row_db.record_review(review['card_id'], review['rating'], review_time_ms=review['review_time_ms'],
+                             reviewed_at=review['reviewed_at'])
+
+    bulk_ids = []
+    for i in range(0, ROWS, 25):
+        bulk_ids += bulk_db.save_flashcards_bulk(1, cards[i:i + 25], ai_generated=True)
+        bulk_db.add_cards_to_deck_bulk(1, bulk_ids[i:i + 25])
+    for i in range(0, ROWS, 25):
+        bulk_db.record_reviews_bulk(reviews[i:i + 25])
+
+    assert bulk_ids == list(range(1, ROWS + 1))
+    assert bulk_db.add_cards_to_deck_bulk(1, bulk_ids) == 0
+    assert snapshot(row_db) == snapshot(bulk_db)
+
+
+def test_record_reviews_bulk_rejects_unknown_cards(db):
+    card_ids = db.save_flashcards_bulk(None, [{'front': 'Q', 'back': 'A'}])
+
+    with pytest.raises(ValueError, match='998, 999'):
+        db.record_reviews_bulk([{'card_id': card_ids[0], 'rating': 3},
+                                {'card_id': 999, 'rating': 3}, {'card_id': 998, 'rating': 1}])
+
+    assert snapshot(db)['reviews'] == 0
+    assert snapshot(db)['card state'] == []
+    assert db.record_reviews_bulk([{'card_id': card_ids[0], 'rating': 3}]) == 1
+
+
+def test_record_reviews_bulk_rejects_invalid_ratings(db):
+    card_ids = db.save_flashcards_bulk(None, [{'front': 'Q', 'back': 'A'}])
+
+    with pytest.raises(ValueError):
+        db.record_reviews_bulk([{'card_id': card_ids[0], 'rating': 5}])
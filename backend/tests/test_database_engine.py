@@ -0,0 +1,14 @@
+from sqlalchemy import text
+
+from config import Config
+from services.database_service import create_db_engine
+
+
+def test_sqlite_connections_use_the_production_profile(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'engine.db'}")
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == Config.DB_BUSY_TIMEOUT_MS
+    finally:
+        engine.dispose()
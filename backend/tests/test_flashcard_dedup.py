@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from config import Config
+from services.minhash import shingles
+
+USER_ID = 1
+CARDS = 2000
+QUERIES = 50
+HAN = [chr(code) for code in range(0x4E00, 0x4E00 + 800)]
+WORDS = ['gradient', 'matrix', 'entropy', 'vector', 'kernel', 'bayes', 'prior', 'tensor', 'loss', 'norm',
+         'eigen', 'descent', 'margin', 'sample', 'variance', 'bias', 'layer', 'softmax', 'sigmoid', 'graph']
+# Margin around the threshold left to MinHash estimation error
+MARGIN = 0.1
+
+
+def phrase(length):
+    return ''.join(random.choices(HAN, k=length))
+
+
+def make_card():
+    term = random.choice(WORDS) + ' ' + random.choice(WORDS)
+    return {
+        'front': f'什麼是{phrase(4)}（{term}）？',
+        'back': f'{phrase(random.randint(20, 40))}，例如 {term} {random.choice(WORDS)}。{phrase(random.randint(10, 30))}'
+    }
+
+
+def edit(card):
+    """The same card as another generation might phrase it"""
+    back = list(card['back'])
+    for _ in range(random.randint(0, 3)):
+        back[random.randrange(len(back))] = random.choice(HAN)
+    return {
+        'front': random.choice(['請問', '']) + card['front'].replace('？', '?').replace('（', ' (').replace('）', ')'),
+        'back': ''.join(back).replace('，', ', ').upper()
+    }
+
+
+def jaccard(a, b):
+    a = shingles(f"{a['front']}\n{a['back']}")
+    b = shingles(f"{b['front']}\n{b['back']}")
+    return len(a & b) / len(a | b)
+
+
+@pytest.fixture
+def deck(db):
+    """(db, corpus, card ids) with CARDS generated cards saved for USER_ID"""
+    random.seed(42)
+    corpus = [make_card() for _ in range(CARDS)]
+    card_ids = []
+    for i in range(0, CARDS, 500):
+        card_ids += db.save_flashcards_bulk(None, corpus[i:i + 500], ai_generated=True, user_id=USER_ID)
+    return db, corpus, card_ids
+
+
+def test_edited_copies_are_found(deck):
+    db, corpus, card_ids = deck
+    threshold = Config.DEDUP_THRESHOLD
+    sources = random.sample(range(CARDS), QUERIES)
+    edited = [edit(corpus[i]) for i in sources]
+
+    matches = db.find_duplicate_flashcards(edited, user_id=USER_ID)
+
+    missed = [i for i, query, match in zip(sources, edited, matches)
+              if match is None and jaccard(corpus[i], query) >= threshold + MARGIN]
+    false = [match['card_id'] for query, match in zip(edited, matches)
+             if match is not None and jaccard(corpus[card_ids.index(match['card_id'])], query) < threshold - MARGIN]
+    assert len(missed) <= QUERIES * 0.05
+    assert false == []
+
+
+def test_unrelated_cards_are_not_reported(deck):
+    db, corpus, card_ids = deck
+    fresh = [make_card() for _ in range(QUERIES)]
+
+    matches = db.find_duplicate_flashcards(fresh, user_id=USER_ID)
+
+    assert not [match for query, match in zip(fresh, matches) if match is not None and
+                jaccard(corpus[card_ids.index(match['card_id'])], query) < Config.DEDUP_THRESHOLD - MARGIN]
+
+
+def test_save_skips_saved_and_in_batch_duplicates(deck):
+    db, corpus, card_ids = deck
+    batch = [corpus[0], edit(corpus[1]), make_card()]
+    batch.append(edit(batch[2]))
+
+    saved = db.save_flashcards_deduplicated(None, batch, ai_generated=True, user_id=USER_ID)
+
+    skipped = {duplicate['index']: duplicate['card_id'] for duplicate in saved['duplicates']}
+    assert len(saved['card_ids']) == 1
+    assert skipped == {0: card_ids[0], 1: card_ids[1], 3: saved['card_ids'][0]}
@@ -0,0 +1,123 @@
+import random
+import sqlite3
+from collections import defaultdict, deque
+
+import pytest
+
+from services.graph_service import GraphService, RELATION_PREREQUISITE
+
+USER_ID = 1
+NODES = 500
+EDGES = 2000
+LAYERS = 12
+LAST_LAYER = list(range(NODES * (LAYERS - 1) // LAYERS + 2, NODES + 1))
+
+
+def seed(db_path):
+    """Nodes in LAYERS layers; prerequisite edges only point to later layers, so they form a DAG"""
+    layer = {node_id: (node_id - 1) * LAYERS // NODES for node_id in range(1, NODES + 1)}
+    by_layer = defaultdict(list)
+    for node_id, depth in layer.items():
+        by_layer[depth].append(node_id)
+
+    edges = set()
+    while len(edges) < EDGES * 0.6:
+        target = random.randint(1, NODES)
+        if layer[target]:
+            source = random.choice(by_layer[random.randrange(max(0, layer[target] - 2), layer[target])])
+            edges.add((source, target, RELATION_PREREQUISITE))
+    while len(edges) < EDGES:
+        source, target = random.randint(1, NODES), random.randint(1, NODES)
+        if source != target:
+            edges.add((source, target, 'related_to'))
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO users (id, email) VALUES (?, ?)', (USER_ID, 'test@example.com'))
+    conn.executemany('INSERT INTO knowledge_nodes (id, user_id, label) VALUES (?, ?, ?)',
+                     [(node_id, USER_ID, f'concept {node_id}') for node_id in range(1, NODES + 1)])
+    conn.executemany('INSERT INTO knowledge_edges (user_id, source_node_id, target_node_id, relation) '
+                     'VALUES (?, ?, ?, ?)', [(USER_ID, *edge) for edge in edges])
+    conn.commit()
+    conn.close()
+    return sorted(edges)
+
+
+def reference_distances(adjacency, start, max_depth=None):
+    """{node: hops} by a per-node Python BFS"""
+    distance = {start: 0}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if max_depth is not None and distance[node] >= max_depth:
+            continue
+        for neighbour in adjacency[node]:
+            if neighbour not in distance:
+                distance[neighbour] = distance[node] + 1
+                queue.append(neighbour)
+    return distance
+
+
+@pytest.fixture
+def graph(db):
+    """(GraphService, undirected adjacency, prerequisites of each node) over a seeded graph"""
+    random.seed(42)
+    edges = seed(db.engine.url.database)
+    both, prerequisites_of = defaultdict(list), defaultdict(list)
+    for source, target, relation in edges:
+        both[source].append(target)
+        both[target].append(source)
+        if relation == RELATION_PREREQUISITE:
+            prerequisites_of[target].append(source)
+    return GraphService(db, sync_seconds=3600), both, prerequisites_of
+
+
+def test_prerequisites_are_the_ancestors_in_level_order(graph):
+    graphs, _, prerequisites_of = graph
+    for node_id in random.sample(LAST_LAYER, 10):
+        result = graphs.prerequisites(node_id, user_id=USER_ID)
+
+        level = {node['id']: node['level'] for node in result['order']}
+        assert not result['cyclic']
+        assert set(level) == set(reference_distances(prerequisites_of, node_id)) - {node_id}
+        assert all(level[source] < level[target] for target in level for source in prerequisites_of[target])
+
+
+def test_neighborhood_matches_a_breadth_first_search(graph):
+    graphs, both, _ = graph
+    for node_id in random.sample(range(1, NODES + 1), 10):
+        result = graphs.neighborhood(node_id, hops=2, user_id=USER_ID)
+
+        expected = reference_distances(both, node_id, max_depth=2)
+        del expected[node_id]
+        assert {node['id']: node['distance'] for node in result} == expected
+
+
+def test_shortest_path_is_a_shortest_walk_over_edges(graph):
+    graphs, both, _ = graph
+    for _ in range(10):
+        node_id, other = random.choice(LAST_LAYER), random.randint(1, NODES)
+        result = graphs.shortest_path(node_id, other, user_id=USER_ID)
+
+        expected = reference_distances(both, node_id).get(other)
+        if expected is None:
+            assert result is None
+            continue
+        assert len(result) - 1 == expected
+        assert result[0]['id'] == node_id and result[-1]['id'] == other
+        assert all(b['id'] in both[a['id']] for a, b in zip(result, result[1:]))
+
+
+def test_added_edges_are_visible_without_a_reload(graph):
+    graphs, _, _ = graph
+    graphs.get_graph(USER_ID)
+    loads = graphs.stats()['loads']
+
+    node_ids = graphs.add_nodes(['new concept A', 'new concept B'], user_id=USER_ID)
+    graphs.add_edges([
+        {'source_node_id': node_ids[0], 'target_node_id': node_ids[1], 'relation': RELATION_PREREQUISITE},
+        {'source_node_id': LAST_LAYER[0], 'target_node_id': node_ids[0], 'relation': RELATION_PREREQUISITE},
+    ], user_id=USER_ID)
+
+    order = [node['id'] for node in graphs.prerequisites(node_ids[1], user_id=USER_ID)['order']]
+    assert order[-2:] == [LAST_LAYER[0], node_ids[0]]
+    assert graphs.stats()['loads'] == loads
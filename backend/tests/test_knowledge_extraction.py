@@ -0,0 +1,89 @@
+import random
+import zlib
+
+import pytest
+from sqlalchemy import func, select
+
+from models import KnowledgeNode, KnowledgeEdge
+from services.graph_service import GraphService, normalize_label
+from services.knowledge_extraction_service import KnowledgeExtractionService
+
+TOPICS = ['機器學習', '深度學習', '線性代數', '微積分', '機率', '統計', '最佳化', '資料結構']
+TERMS = ['梯度下降', '反向傳播', '矩陣', '特徵值', '導數', '積分', '貝氏定理', '期望值', '變異數', '損失函數',
+         'Gradient Descent', 'Backpropagation', 'Eigenvalue', 'Chain Rule', 'Regularization', 'Overfitting']
+# Same concepts as they come back from different generations
+VARIANTS = {'Gradient Descent': ['gradient descent', 'Gradient  Descent', 'Ｇradient Descent'],
+            '梯度下降': ['梯度下降：', '「梯度下降」']}
+NOTES = 40
+BATCH = 10
+
+
+def spell(term):
+    return random.choice(VARIANTS.get(term, [term]) + [term])
+
+
+def make_note(sections=6):
+    lines = [f'# {random.choice(TOPICS)}筆記', '']
+    for s in range(sections):
+        lines += [f'## {s + 1}. {random.choice(TOPICS)}：第 {s} 節', '']
+        for _ in range(random.randint(2, 4)):
+            a, b = random.sample(TERMS, 2)
+            lines.append(f'- **{spell(a)}** 與 **{spell(b)}** 的關係，例如 **定義：** 說明文字。')
+        lines += ['', f'### {spell(random.choice(TERMS))}', '', f'這段介紹 **{spell(random.choice(TERMS))}**。', '']
+    return '\n'.join(lines)
+
+
+class RecordingLLM:
+    """Stands in for OpenAIService: answers relation requests without the API and counts them"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def classify_concept_relations(self, pairs, language='zh-tw', use_cache=True):
+        self.calls += 1
+        # Deterministic per pair, as a cached response would be
+        return [('a_before_b', 'b_before_a', 'related', 'none')[zlib.crc32(f'{a}|{b}'.encode()) % 4]
+                for a, b, _ in pairs]
+
+
+def counts(db):
+    with db.get_session() as session:
+        return (session.scalar(select(func.count(KnowledgeNode.id))),
+                session.scalar(select(func.count(KnowledgeEdge.id))))
+
+
+@pytest.fixture
+def extracted(db):
+    """(db, llm, extractor, runs) after extracting NOTES notes in runs of BATCH"""
+    random.seed(42)
+    llm = RecordingLLM()
+    extractor = KnowledgeExtractionService(llm, GraphService(db))
+    notes = [make_note() for _ in range(NOTES)]
+    runs = [notes[i:i + BATCH] for i in range(0, NOTES, BATCH)]
+    for batch in runs:
+        extractor.extract(batch)
+    return db, llm, extractor, runs
+
+
+def test_llm_requests_are_capped_per_run(extracted):
+    _, llm, extractor, runs = extracted
+    assert 0 < llm.calls <= len(runs) * extractor.max_calls
+
+
+def test_spelling_variants_become_one_node(extracted):
+    db = extracted[0]
+    with db.get_session() as session:
+        normalized = [normalize_label(label) for label in session.scalars(select(KnowledgeNode.label))]
+
+    assert len(set(normalized)) == len(normalized)
+    assert normalize_label('Gradient Descent') in normalized
+
+
+def test_rerunning_creates_nothing(extracted):
+    db, _, extractor, runs = extracted
+    before = counts(db)
+
+    rerun = extractor.extract(runs[0])
+
+    assert (rerun['nodes_created'], rerun['edges_created']) == (0, 0)
+    assert counts(db) == before
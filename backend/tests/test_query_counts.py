@@ -0,0 +1,85 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from models import Note, Source, Flashcard, Deck, DeckCard, Quiz
+from services.database_service import DatabaseService
+
+# Maximum statements per call, independent of how much data there is
+QUERY_BUDGETS = {
+    'get_decks': 1,
+    'get_notes_list': 1,
+    'get_notes_page': 1,
+    'get_note': 1,
+    'get_flashcards_by_note': 1,
+    'get_quiz': 1,
+}
+SIZES = (10, 200)
+
+
+def seed(db, size):
+    """`size` decks and notes, each note with 3 sources, 10 cards and a quiz"""
+    now = datetime.utcnow()
+    with db.get_session() as session:
+        session.execute(insert(Note), [
+            {'id': i, 'title': f'Note {i}', 'content': 'x' * 300, 'created_at': now - timedelta(minutes=i)}
+            for i in range(1, size + 1)
+        ])
+        session.execute(insert(Source), [
+            {'note_id': i, 'type': 'youtube', 'url': f'https://youtu.be/{i}-{j}'}
+            for i in range(1, size + 1) for j in range(3)
+        ])
+        session.execute(insert(Flashcard), [
+            {'id': (i - 1) * 10 + j + 1, 'note_id': i, 'front': f'Q{i}.{j}', 'back': f'A{i}.{j}'}
+            for i in range(1, size + 1) for j in range(10)
+        ])
+        session.execute(insert(Quiz), [{'id': i, 'note_id': i, 'payload_json': []} for i in range(1, size + 1)])
+        session.execute(insert(Deck), [
+            {'id': i, 'name': f'Deck {i}', 'created_at': now - timedelta(minutes=i)} for i in range(1, size + 1)
+        ])
+        session.execute(insert(DeckCard), [
+            {'deck_id': random.randint(1, size), 'card_id': card_id} for card_id in range(1, size * 10 + 1)
+        ])
+        session.commit()
+
+
+def read_paths(db, size):
+    note_id = random.randint(1, size)
+    cursor = db.get_notes_page(limit=size // 2)['next_cursor']
+    return {
+        'get_decks': lambda: db.get_decks(),
+        'get_notes_list': lambda: db.get_notes_list(limit=50),
+        'get_notes_page': lambda: db.get_notes_page(limit=20, cursor=cursor),
+        'get_note': lambda: db.get_note(note_id),
+        'get_flashcards_by_note': lambda: db.get_flashcards_by_note(note_id),
+        'get_quiz': lambda: db.get_quiz(note_id),
+    }
+
+
+@pytest.fixture(scope='module')
+def statement_counts(tmp_path_factory):
+    """{size: {read path: statements}} for a small and a larger database"""
+    random.seed(7)
+    counts = {}
+    for size in SIZES:
+        db = DatabaseService(f"sqlite:///{tmp_path_factory.mktemp('counts') / f'{size}.db'}")
+        seed(db, size)
+        counts[size] = {}
+        for name, call in read_paths(db, size).items():
+            with db.count_queries() as counter:
+                call()
+            counts[size][name] = counter.count
+        db.engine.dispose()
+    return counts
+
+
+@pytest.mark.parametrize('name', QUERY_BUDGETS)
+def test_read_path_is_within_its_statement_budget(statement_counts, name):
+    assert max(statement_counts[size][name] for size in SIZES) <= QUERY_BUDGETS[name]
+
+
+@pytest.mark.parametrize('name', QUERY_BUDGETS)
+def test_read_path_statements_do_not_grow_with_data(statement_counts, name):
+    assert len({statement_counts[size][name] for size in SIZES}) == 1
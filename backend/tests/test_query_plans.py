@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from models import Base
+from services.database_service import DatabaseService
+
+# (hot read query, index it must use)
+QUERIES = [
+    ('SELECT id, card_id, due_at FROM reviews WHERE user_id = 1 AND due_at <= ? ORDER BY due_at LIMIT 50',
+     'ix_reviews_user_due'),
+    ('SELECT rating, reviewed_at FROM reviews WHERE card_id = 1 ORDER BY reviewed_at DESC',
+     'ix_reviews_card_reviewed'),
+    ('SELECT id, front FROM flashcards WHERE note_id = 1', 'ix_flashcards_note_id'),
+    ('SELECT type, url FROM sources WHERE note_id = 1', 'ix_sources_note_id'),
+    ('SELECT id, title FROM notes ORDER BY created_at DESC, id DESC LIMIT 20', 'ix_notes_created_at_id'),
+    ('SELECT id, title, substr(content, 1, 201) FROM notes WHERE (created_at, id) < (?, 100) '
+     'ORDER BY created_at DESC, id DESC LIMIT 21', 'ix_notes_created_at_id'),
+    ('SELECT id, name FROM decks ORDER BY created_at DESC LIMIT 50', 'ix_decks_created_at'),
+    ('SELECT deck_id FROM deck_cards WHERE card_id = 1', 'ix_deck_cards_card_id'),
+    ('SELECT score FROM quiz_results WHERE quiz_id = 1', 'ix_quiz_results_quiz_id'),
+    ('SELECT target_node_id FROM knowledge_edges WHERE source_node_id = 1', 'ix_knowledge_edges_source_node_id'),
+]
+
+
+@pytest.fixture(scope='module')
+def migrated_db(tmp_path_factory):
+    """A database created without secondary indexes, then migrated by DatabaseService"""
+    db_path = tmp_path_factory.mktemp('plans') / 'legacy.db'
+    engine = create_engine(f'sqlite:///{db_path}')
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex_%'"
+    )]
+    for name in names:
+        conn.execute(f'DROP INDEX {name}')
+    conn.commit()
+    conn.close()
+
+    DatabaseService(f'sqlite:///{db_path}').engine.dispose()
+    return db_path
+
+
+@pytest.mark.parametrize('sql, index', QUERIES, ids=[index for _, index in QUERIES])
+def test_hot_query_uses_its_index(migrated_db, sql, index):
+    conn = sqlite3.connect(migrated_db)
+    params = ('2025-01-01 00:00:00.000000',) * sql.count('?')
+    plan = ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+    conn.close()
+    assert index in plan
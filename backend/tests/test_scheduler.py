@@ -0,0 +1,118 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from models import CardState
+from services.scheduler_service import FSRSScheduler, to_days
+
+NOW = datetime(2025, 6, 1)
+USER_ID = 1
+CARDS = 300
+
+
+@pytest.fixture
+def seeded_db(db):
+    """CARDS cards for USER_ID, each reviewed 1..19 times at growing intervals"""
+    random.seed(42)
+    db_path = db.engine.url.database
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO users (id, email) VALUES (?, ?)', (USER_ID, 'test@example.com'))
+    conn.executemany(
+        'INSERT INTO flashcards (id, user_id, front, back, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(i, USER_ID, f'Q{i}', f'A{i}', NOW, NOW) for i in range(1, CARDS + 1)]
+    )
+    reviews = []
+    for card_id in range(1, CARDS + 1):
+        when = NOW - timedelta(days=random.uniform(30, 365))
+        gap = 1.0
+        for _ in range(random.randint(1, 19)):
+            if when >= NOW:
+                break
+            rating = random.choices((1, 2, 3, 4), weights=(10, 15, 60, 15))[0]
+            reviews.append((card_id, USER_ID, rating, when.strftime('%Y-%m-%d %H:%M:%S.%f')))
+            gap = 1.0 if rating == 1 else gap * random.uniform(1.5, 3.0)
+            when += timedelta(days=gap)
+    conn.executemany('INSERT INTO reviews (card_id, user_id, rating, reviewed_at) VALUES (?, ?, ?, ?)', reviews)
+    conn.commit()
+    conn.close()
+    return db
+
+
+def load_reviews(db):
+    conn = sqlite3.connect(db.engine.url.database)
+    rows = conn.execute('SELECT card_id, reviewed_at, rating FROM reviews ORDER BY card_id, reviewed_at').fetchall()
+    conn.close()
+    cards, reviewed_at, ratings = zip(*rows)
+    return np.array(cards), to_days([datetime.fromisoformat(value) for value in reviewed_at]), np.array(ratings)
+
+
+def loop_replay(scheduler, cards, days, ratings):
+    """One Python iteration per review row: {card_id: (stability, difficulty, due)}"""
+    state = {}
+    for index in np.lexsort((days, cards)):
+        card, day, rating = int(cards[index]), float(days[index]), int(ratings[index])
+        if card not in state:
+            stability = float(scheduler.initial_stability(rating))
+            difficulty = float(scheduler.initial_difficulty(rating))
+        else:
+            stability, difficulty, last = state[card][:3]
+            recall = scheduler.retrievability(max(day - last, 0), stability)
+            stability = float(scheduler.next_stability(difficulty, stability, recall, np.int64(rating)))
+            difficulty = float(scheduler.next_difficulty(difficulty, rating))
+        state[card] = (stability, difficulty, day)
+    return {card: (s, d, day + float(scheduler.interval(s))) for card, (s, d, day) in state.items()}
+
+
+def card_states(db, card_ids):
+    """[(stability, difficulty, reps, lapses, due)] of card_ids, due in epoch days"""
+    with db.get_session() as session:
+        rows = session.execute(
+            select(CardState.stability, CardState.difficulty, CardState.reps, CardState.lapses, CardState.due_at)
+            .where(CardState.card_id.in_(card_ids)).order_by(CardState.card_id)
+        ).all()
+    return np.array([(s, d, reps, lapses, to_days([due])[0]) for s, d, reps, lapses, due in rows])
+
+
+def test_vectorized_replay_matches_a_per_review_loop(seeded_db):
+    scheduler = FSRSScheduler()
+    cards, days, ratings = load_reviews(seeded_db)
+
+    result = scheduler.replay(cards, days, ratings)
+    expected = loop_replay(scheduler, cards, days, ratings)
+
+    assert len(result['card_id']) == len(expected)
+    got = np.column_stack([result['stability'], result['difficulty'], result['due']])
+    want = np.array([expected[int(card)] for card in result['card_id']])
+    np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-9)
+
+
+def test_record_review_steps_card_state_like_a_replay(seeded_db):
+    seeded_db.rebuild_card_state()
+    card_ids = random.sample(range(1, CARDS + 1), 20)
+    for card_id in card_ids:
+        seeded_db.record_review(card_id, 3, user_id=USER_ID, reviewed_at=NOW)
+
+    stepped = card_states(seeded_db, card_ids)
+    seeded_db.reschedule(card_ids=card_ids)
+    replayed = card_states(seeded_db, card_ids)
+
+    assert len(stepped) == len(card_ids)
+    np.testing.assert_allclose(stepped, replayed, rtol=1e-9, atol=1e-9)
+
+
+def test_reviewed_at_offsets_are_converted_to_utc(seeded_db):
+    # 17:00+08:00 is the same moment as 09:00Z
+    seeded_db.record_review(1, 3, user_id=USER_ID, reviewed_at=NOW.strftime('%Y-%m-%dT17:00:00+08:00'))
+    seeded_db.record_review(2, 3, user_id=USER_ID, reviewed_at=NOW.strftime('%Y-%m-%dT09:00:00Z'))
+
+    with seeded_db.get_session() as session:
+        local, utc = (session.get(CardState, card_id).last_review for card_id in (1, 2))
+    assert local == utc == NOW.replace(hour=9)
+
+
+def test_record_review_returns_none_for_unknown_card(db):
+    assert db.record_review(12345, 3) is None
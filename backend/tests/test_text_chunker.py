@@ -0,0 +1,76 @@
+import random
+
+import pytest
+import tiktoken
+
+from services import text_chunker
+from services.text_chunker import TextChunker, count_tokens
+
+COMMON = '的是了我你他在有這個學習筆記測試ひらがなカタカナ한국어'
+# Only their first two bytes merge, so each takes two tokens
+RARE = '鬱龘齉罍贔屭'
+# Left as four single-byte tokens
+SUPPLEMENTARY = '𠀀𩸽'
+ALPHABET = COMMON + RARE + SUPPLEMENTARY
+
+
+def byte_level_encoding():
+    """A small BPE over raw bytes where CJK characters span one to four tokens"""
+    ranks = {bytes([i]): i for i in range(256)}
+    for char in COMMON + RARE:
+        data = char.encode('utf-8')
+        ranks.setdefault(data[:2], len(ranks))
+        if char in COMMON:
+            ranks.setdefault(data, len(ranks))
+    return tiktoken.Encoding(name='test-bytes', pat_str=r'[^\s]+|\s+', mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    encoding = byte_level_encoding()
+    monkeypatch.setattr(text_chunker, '_get_encoding', lambda: encoding)
+    return encoding
+
+
+@pytest.fixture
+def estimated(monkeypatch):
+    monkeypatch.setattr(text_chunker, '_get_encoding', lambda: None)
+
+
+@pytest.fixture
+def unpunctuated():
+    random.seed(42)
+    return ''.join(random.choices(ALPHABET, k=5000))
+
+
+@pytest.mark.parametrize('max_tokens', [1, 3, 7, 64, 512])
+def test_token_windows_never_split_a_character(encoding, unpunctuated, max_tokens):
+    chunks = TextChunker(max_tokens=max_tokens, overlap_tokens=0).split(unpunctuated)
+
+    assert len(chunks) > 1
+    assert not [chunk for chunk in chunks if '�' in chunk]
+    assert ''.join(chunks) == unpunctuated
+    # Only a character wider than the window itself may exceed it
+    assert all(count_tokens(chunk) <= max(max_tokens, 4) for chunk in chunks)
+
+
+@pytest.mark.parametrize('max_tokens', [7, 512])
+def test_estimated_windows_reassemble_the_input(estimated, unpunctuated, max_tokens):
+    chunks = TextChunker(max_tokens=max_tokens, overlap_tokens=0).split(unpunctuated)
+
+    assert len(chunks) > 1
+    assert ''.join(chunks) == unpunctuated
+
+
+def test_encoding_load_failure_falls_back_to_the_estimate(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("cannot download cl100k_base")
+
+    monkeypatch.setattr(tiktoken, 'encoding_for_model', unavailable)
+    monkeypatch.setattr(tiktoken, 'get_encoding', unavailable)
+    text_chunker._get_encoding.cache_clear()
+    try:
+        assert text_chunker._get_encoding() is None
+        assert count_tokens('學習筆記 notes') == int(4 * 1.5 + 6 / 4) + 1
+    finally:
+        text_chunker._get_encoding.cache_clear()
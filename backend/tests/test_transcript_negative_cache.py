@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import transcript_store, youtube_service
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from services.transcript_store import TranscriptStore, FAILURE_NO_CAPTIONS, FAILURE_EXHAUSTED
+from services.youtube_service import YouTubeService
+
+NO_CAPTIONS_PAGE = '<html><script>var ytInitialPlayerResponse = {"videoDetails": {}};</script></html>'
+UPSTREAMS = set(YouTubeService.STRATEGY_UPSTREAMS.values())
+
+
+def respond(status, text=''):
+    def http_get(upstream, url, **kwargs):
+        return SimpleNamespace(status_code=status, text=text, content=text.encode(), url=url)
+    return http_get
+
+
+def refuse(upstream, url, **kwargs):
+    raise CircuitOpenError(f"{upstream} is temporarily unavailable (circuit open)")
+
+
+def audio_failed(url):
+    raise Exception("ffmpeg exited with status 1")
+
+
+@pytest.fixture
+def get_failures(tmp_path, monkeypatch):
+    """Runs get_transcript with the caption API finding no track and the audio path failing,
+    returning the negative-cache entries written for the video"""
+    store = TranscriptStore(str(tmp_path / 'transcripts.db'))
+    monkeypatch.setattr(transcript_store, '_store', store)
+    monkeypatch.setattr(YouTubeService, '_strategy_transcript_api', staticmethod(lambda video_id, url: None))
+    monkeypatch.setattr(YouTubeService, 'get_transcript_hybrid', staticmethod(audio_failed))
+    for name in UPSTREAMS:
+        get_breaker(name).record_success()
+
+    def run(video_id, http_get):
+        monkeypatch.setattr(youtube_service, 'http_get', http_get)
+        with pytest.raises(Exception):
+            YouTubeService.get_transcript(f'https://www.youtube.com/watch?v={video_id}')
+        return set(store.get_failures(video_id))
+
+    yield run
+    for name in UPSTREAMS:
+        get_breaker(name).record_success()
+
+
+def test_open_breakers_write_nothing(get_failures):
+    for name in UPSTREAMS:
+        breaker = get_breaker(name)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        assert breaker.snapshot()['state'] == CircuitBreaker.OPEN
+
+    assert get_failures('openbreaker', respond(200, NO_CAPTIONS_PAGE)) == set()
+
+
+@pytest.mark.parametrize('http_get', [refuse, respond(429), respond(503)], ids=['circuit-open', '429', '503'])
+def test_upstream_trouble_is_not_cached_as_exhausted(get_failures, http_get):
+    assert FAILURE_EXHAUSTED not in get_failures('throttled', http_get)
+
+
+def test_video_without_captions_is_cached(get_failures):
+    assert get_failures('nocaptions', respond(200, NO_CAPTIONS_PAGE)) == {FAILURE_NO_CAPTIONS, FAILURE_EXHAUSTED}